@@ -0,0 +1,32 @@
+"""Which patients a signed-in user may see.
+
+Caretakers see the patients they look after (``patients.caretaker_id``).
+A patient account sees the patient records linked to it
+(``patients.user_id``, set by the caretaker when creating or linking the
+patient); an unlinked patient account sees nothing.
+"""
+from typing import List, Optional
+
+from bson import ObjectId
+
+from .db import patients_col
+
+
+def _owner_filter(user: dict) -> dict:
+    field = "caretaker_id" if user.get("role") == "caretaker" else "user_id"
+    return {field: ObjectId(user["id"])}
+
+
+async def patient_ids(user: dict, requested: Optional[List[str]] = None) -> List[str]:
+    """Ids of the user's patients, narrowed to `requested` when given."""
+    query = _owner_filter(user)
+    if requested:
+        query["_id"] = {"$in": [ObjectId(p) for p in requested if ObjectId.is_valid(p)]}
+    return [str(d["_id"]) async for d in patients_col.find(query, {"_id": 1})]
+
+
+async def can_access(user: dict, patient_id) -> bool:
+    if not ObjectId.is_valid(patient_id):
+        return False
+    found = await patients_col.find_one({"_id": ObjectId(patient_id), **_owner_filter(user)}, {"_id": 1})
+    return found is not None
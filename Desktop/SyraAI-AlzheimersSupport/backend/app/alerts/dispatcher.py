@@ -0,0 +1,259 @@
+"""Asynchronous alert dispatch.
+
+Request handlers call ``alert_dispatcher.submit(alert)``, which stores the
+alert together with an outbox document before returning its id, so an
+acknowledged alert (SOS included) survives a crash. Only delivery is left to
+worker tasks: they take the outbox entry from a bounded in-process queue and
+push it to every configured sink (SMS, email, ...), retrying failures with
+exponential backoff.
+
+Outbox documents are the crash-recovery record: a worker takes a lease on
+an entry by moving its ``next_attempt_at`` into the future, so if the
+process dies mid-delivery, or the queue is full, the sweeper (of this or
+any other worker process) picks the entry up again once the lease runs out.
+"""
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+
+from ..config import settings
+from ..db import alerts_collection, alert_outbox_collection
+from ..realtime.bus import publish_events
+from .sinks import AlertSink, build_sinks
+
+logger = logging.getLogger(__name__)
+
+# How long a worker owns an outbox entry before others may retry it
+LEASE = timedelta(minutes=2)
+# Upper bound on outbox entries one worker delivers concurrently
+DELIVERY_BATCH = 100
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class AlertDispatcher:
+    def __init__(
+        self,
+        queue_size: int = 1000,
+        workers: int = 2,
+        max_attempts: int = 6,
+        backoff_base: float = 5.0,
+        backoff_max: float = 900.0,
+        sink_timeout: float = 10.0,
+        sweep_interval: float = 15.0,
+    ):
+        self.queue_size = queue_size
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.sink_timeout = sink_timeout
+        self.sweep_interval = sweep_interval
+        # None means "build from settings on start"
+        self.sinks: Optional[List[AlertSink]] = None
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._inflight: set = set()
+        self._delivered = 0
+        self._failed = 0
+        self._overflowed = 0
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        if self.running:
+            return
+        if self.sinks is None:
+            self.sinks = build_sinks(settings)
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweeper()))
+
+    async def stop(self) -> None:
+        """Stop workers; queued entries are released for the next sweep."""
+        if not self.running:
+            return
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        queued = []
+        while not self._queue.empty():
+            queued.append(self._queue.get_nowait()["_id"])
+        if queued:
+            # already stored: end their lease instead of waiting for it to run out
+            await alert_outbox_collection.update_many(
+                {"_id": {"$in": queued}, "state": "pending"}, {"$set": {"next_attempt_at": _now()}}
+            )
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize() if self._queue else 0,
+            "queue_size": self.queue_size,
+            "inflight": len(self._inflight),
+            "delivered": self._delivered,
+            "failed": self._failed,
+            "overflowed": self._overflowed,
+        }
+
+    def _entry(self, alert: dict, store_alert: bool) -> dict:
+        now = _now()
+        alert.setdefault("_id", ObjectId())
+        alert.setdefault("created_at", now)
+        alert.setdefault("resolved", False)
+        return {
+            "_id": ObjectId(),
+            "alert_id": alert["_id"],
+            "alert": alert,
+            "store_alert": store_alert,
+            "state": "pending",
+            "attempts": 0,
+            "sinks_done": [],
+            "created_at": now,
+            "next_attempt_at": now + LEASE,
+        }
+
+    async def submit(self, alert: dict) -> ObjectId:
+        """Store a new alert and queue its notification; returns its id."""
+        await self._enqueue([self._entry(alert, store_alert=True)])
+        return alert["_id"]
+
+    async def submit_many(self, alerts: List[dict]) -> List[ObjectId]:
+        """submit() for several alerts, stored with one insert_many."""
+        await self._enqueue([self._entry(alert, store_alert=True) for alert in alerts])
+        return [alert["_id"] for alert in alerts]
+
+    async def notify(self, alert: dict) -> None:
+        """Send a notification about an alert that is already stored."""
+        await self._enqueue([self._entry(alert, store_alert=False)])
+
+    async def _enqueue(self, entries: List[dict]) -> None:
+        if not entries:
+            return
+        if not self.running:
+            # No workers (CLI, tests): the next sweeper delivers
+            for entry in entries:
+                entry["next_attempt_at"] = entry["created_at"]
+        elif not self.sinks:
+            # Nothing to deliver to; the outbox entry is only a record
+            for entry in entries:
+                entry["state"] = "sent"
+        # Stored before the request returns; errors reach the caller
+        await self._persist(entries)
+        if not self.running or not self.sinks:
+            return
+        for entry in entries:
+            try:
+                self._queue.put_nowait(entry)
+            except asyncio.QueueFull:
+                # Back-pressure: never block the request; the sweeper
+                # delivers the stored entry once its lease runs out
+                self._overflowed += 1
+
+    async def _persist(self, entries: List[dict]) -> None:
+        alerts = [e["alert"] for e in entries if e["store_alert"]]
+        if alerts:
+            try:
+                await alerts_collection.insert_many(alerts, ordered=False)
+            except BulkWriteError as exc:
+                # Duplicate _id means the alert was stored by an earlier attempt
+                if any(err["code"] != 11000 for err in exc.details.get("writeErrors", [])):
+                    raise
+            await publish_events("alert", alerts)
+        await alert_outbox_collection.insert_many(entries, ordered=False)
+
+    async def _worker(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < DELIVERY_BATCH and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                await asyncio.gather(*(self._deliver(entry) for entry in batch))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Every queued entry is stored: the sweeper retries it once its lease expires
+                logger.exception("Alert worker failed on a batch of %d", len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _deliver(self, entry: dict) -> None:
+        self._inflight.add(entry["_id"])
+        try:
+            done = list(entry["sinks_done"])
+            errors = {}
+            for sink in self.sinks:
+                if sink.name in done:
+                    continue
+                try:
+                    await asyncio.wait_for(sink.send(entry["alert"]), self.sink_timeout)
+                    done.append(sink.name)
+                except Exception as exc:
+                    errors[sink.name] = repr(exc)
+
+            update = {"sinks_done": done, "last_attempt_at": _now()}
+            if not errors:
+                update["state"] = "sent"
+                self._delivered += 1
+            else:
+                attempts = entry["attempts"] + 1
+                update["attempts"] = attempts
+                update["errors"] = errors
+                if attempts >= self.max_attempts:
+                    update["state"] = "failed"
+                    self._failed += 1
+                    logger.error("Giving up on alert %s: %s", entry["alert_id"], errors)
+                else:
+                    delay = min(self.backoff_base * 2 ** (attempts - 1), self.backoff_max)
+                    update["next_attempt_at"] = _now() + timedelta(seconds=delay * random.uniform(0.8, 1.2))
+            await alert_outbox_collection.update_one({"_id": entry["_id"]}, {"$set": update})
+        finally:
+            self._inflight.discard(entry["_id"])
+
+    async def _claim(self) -> Optional[dict]:
+        now = _now()
+        return await alert_outbox_collection.find_one_and_update(
+            {
+                "state": "pending",
+                "next_attempt_at": {"$lte": now},
+                "_id": {"$nin": list(self._inflight)},
+            },
+            {"$set": {"next_attempt_at": now + LEASE}},
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _sweeper(self) -> None:
+        while True:
+            try:
+                while self.sinks and self._queue.qsize() < self.queue_size // 2:
+                    entry = await self._claim()
+                    if entry is None:
+                        break
+                    self._queue.put_nowait(entry)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Alert outbox sweep failed")
+            await asyncio.sleep(self.sweep_interval)
+
+
+alert_dispatcher = AlertDispatcher(
+    queue_size=settings.ALERT_QUEUE_SIZE,
+    workers=settings.ALERT_WORKERS,
+    max_attempts=settings.ALERT_MAX_ATTEMPTS,
+    sink_timeout=settings.ALERT_SINK_TIMEOUT_SECONDS,
+)
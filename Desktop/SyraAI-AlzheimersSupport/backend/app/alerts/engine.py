@@ -0,0 +1,248 @@
+"""Stateful alerting for conditions that persist over many readings.
+
+A condition such as "outside the safe zone" is reported on every ping while
+it lasts. Instead of one alert per ping, the engine keeps per patient and
+alert type state (clear -> open -> clear) and stores one alert document per
+episode:
+
+* clear -> open: insert an alert with state "open" and notify caretakers
+* still open: count the observation; every ``escalation_interval`` update the
+  episode and send a reminder notification
+* open -> clear: close the episode (state "closed", resolved) and notify
+
+Open episodes are reloaded from the alerts collection the first time a
+patient is seen, so a restart does not re-alert. Only open episodes are held
+for good; keys known to be clear sit in a bounded TTL cache and are looked
+up again once evicted, and a key's lock lives only while it is in use. A unique partial index on
+open episodes (app/indexes.py) keeps two worker processes from opening the
+same episode twice.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
+
+from .. import patient_state
+from ..config import settings
+from ..db import alerts_collection
+from ..realtime.bus import publish_event
+from ..utils.cache import TTLCache
+from .dispatcher import alert_dispatcher
+
+# Notification text when an episode of the given alert type ends
+CLEARED_MESSAGES = {
+    "geofence_breach": "Patient returned to the safe zone",
+    "unusual_speed": "Patient is moving at a normal speed again",
+    "wandering": "Patient is no longer wandering",
+    "wandering_pattern": "Patient's movement matches their routine again",
+}
+
+
+class Episode:
+    __slots__ = ("alert_id", "opened_at", "last_seen_at", "last_notified_at", "escalations", "observations")
+
+    def __init__(self, alert_id, opened_at, last_seen_at=None, last_notified_at=None, escalations=0, observations=1):
+        self.alert_id = alert_id
+        self.opened_at = opened_at
+        self.last_seen_at = last_seen_at or opened_at
+        self.last_notified_at = last_notified_at or opened_at
+        self.escalations = escalations
+        self.observations = observations
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "Episode":
+        return cls(
+            doc["_id"],
+            _aware(doc["created_at"]),
+            _aware(doc.get("last_seen_at")),
+            _aware(doc.get("last_notified_at")),
+            doc.get("escalations", 0),
+            doc.get("observations", 1),
+        )
+
+
+def _aware(dt: Optional[datetime]) -> Optional[datetime]:
+    # Mongo hands back naive UTC datetimes
+    if dt is not None and dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+class AlertEngine:
+    def __init__(self, escalation_interval: timedelta):
+        self.escalation_interval = escalation_interval
+        self._open: Dict[Tuple[str, str], Episode] = {}
+        # keys with no open episode, as last seen by this process
+        self._clear = TTLCache(settings.ALERT_STATE_CACHE_SIZE, settings.ALERT_STATE_CACHE_TTL_SECONDS)
+        # key -> [lock, holders and waiters]; dropped when the count reaches 0
+        self._locks: Dict[Tuple[str, str], List] = {}
+
+    @asynccontextmanager
+    async def _locked(self, key: Tuple[str, str]) -> AsyncIterator[None]:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    def open_episode(self, patient_id: str, kind: str) -> Optional[Episode]:
+        return self._open.get((patient_id, kind))
+
+    async def _load(self, key: Tuple[str, str]) -> None:
+        patient_id, kind = key
+        doc = await alerts_collection.find_one(
+            {"patient_id": ObjectId(patient_id), "type": kind, "state": "open"}
+        )
+        if doc:
+            self._open[key] = Episode.from_doc(doc)
+        else:
+            self._clear.set(key, True)
+
+    async def observe(
+        self,
+        patient_id: str,
+        kind: str,
+        active: bool,
+        message: str = "",
+        details: Optional[dict] = None,
+        now: Optional[datetime] = None,
+    ) -> Optional[ObjectId]:
+        """Feed one observation of a condition; returns the open episode's alert id."""
+        key = (patient_id, kind)
+        now = now or datetime.now(timezone.utc)
+        async with self._locked(key):
+            if key not in self._open and key not in self._clear:
+                await self._load(key)
+            episode = self._open.get(key)
+
+            if active and episode is None:
+                episode = await self._start(key, message, details, now)
+            elif active:
+                episode.last_seen_at = now
+                episode.observations += 1
+                if now - episode.last_notified_at >= self.escalation_interval:
+                    await self._escalate(key, episode, message, details, now)
+                    episode = self._open.get(key)
+            elif episode is not None:
+                await self._close(key, episode, now)
+                episode = None
+        return episode.alert_id if episode else None
+
+    async def _start(self, key, message, details, now) -> Episode:
+        patient_id, kind = key
+        doc = {
+            "patient_id": ObjectId(patient_id),
+            "type": kind,
+            "message": message,
+            "details": details or {},
+            "created_at": now,
+            "last_seen_at": now,
+            "last_notified_at": now,
+            "state": "open",
+            "resolved": False,
+            "escalations": 0,
+            "observations": 1,
+        }
+        try:
+            await alerts_collection.insert_one(doc)
+        except DuplicateKeyError:
+            # Another worker process opened this episode first
+            await self._load(key)
+            if key in self._open:
+                return self._open[key]
+            raise
+        episode = Episode(doc["_id"], now)
+        self._open[key] = episode
+        self._clear.pop(key)
+        await patient_state.add_open_alerts({doc["patient_id"]: 1})
+        await publish_event("alert", doc)
+        await alert_dispatcher.notify(
+            {"_id": doc["_id"], "patient_id": doc["patient_id"], "type": kind, "message": message}
+        )
+        return episode
+
+    async def _escalate(self, key, episode: Episode, message, details, now) -> None:
+        patient_id, kind = key
+        episode.escalations += 1
+        episode.last_notified_at = now
+        result = await alerts_collection.update_one(
+            {"_id": episode.alert_id, "state": "open"},
+            {
+                "$set": {
+                    "message": message,
+                    "details": details or {},
+                    "last_seen_at": now,
+                    "last_notified_at": now,
+                    "escalations": episode.escalations,
+                    "observations": episode.observations,
+                }
+            },
+        )
+        if not result.matched_count:
+            # Closed by another worker process: forget it, the next
+            # observation opens a new episode if the condition persists
+            del self._open[key]
+            return
+        await publish_event(
+            "alert",
+            {
+                "_id": episode.alert_id,
+                "patient_id": ObjectId(patient_id),
+                "type": kind,
+                "state": "open",
+                "message": message,
+                "details": details or {},
+                "last_seen_at": now,
+                "escalations": episode.escalations,
+                "observations": episode.observations,
+            },
+        )
+        minutes = int((now - episode.opened_at).total_seconds() // 60)
+        await alert_dispatcher.notify(
+            {
+                "_id": episode.alert_id,
+                "patient_id": ObjectId(patient_id),
+                "type": kind,
+                "message": f"{message} (ongoing for {minutes} min)",
+            }
+        )
+
+    async def _close(self, key, episode: Episode, now) -> None:
+        patient_id, kind = key
+        del self._open[key]
+        self._clear.set(key, True)
+        closed = {
+            "state": "closed",
+            "resolved": True,
+            "closed_at": now,
+            "last_seen_at": episode.last_seen_at,
+            "observations": episode.observations,
+        }
+        result = await alerts_collection.update_one(
+            {"_id": episode.alert_id, "state": "open"}, {"$set": closed}
+        )
+        if not result.modified_count:
+            return  # already closed by another worker process
+        await patient_state.add_open_alerts({ObjectId(patient_id): -1})
+        await publish_event("alert", {"_id": episode.alert_id, "patient_id": ObjectId(patient_id), "type": kind, **closed})
+        minutes = int((now - episode.opened_at).total_seconds() // 60)
+        await alert_dispatcher.notify(
+            {
+                "_id": episode.alert_id,
+                "patient_id": ObjectId(patient_id),
+                "type": f"{kind}_cleared",
+                "message": f"{CLEARED_MESSAGES.get(kind, 'Condition cleared')} after {minutes} min",
+            }
+        )
+
+
+alert_engine = AlertEngine(escalation_interval=timedelta(minutes=settings.ALERT_ESCALATION_MINUTES))
@@ -0,0 +1,141 @@
+"""Notification sinks used by the alert dispatcher.
+
+A sink delivers one alert somewhere (SMS, email, ...) and raises on failure;
+the dispatcher takes care of retries. Blocking client libraries are run in
+a thread so they never stall the event loop.
+"""
+import asyncio
+import logging
+import smtplib
+from email.message import EmailMessage
+from typing import List
+
+import requests
+
+from ..config import Settings
+
+logger = logging.getLogger(__name__)
+
+
+def format_alert(alert: dict) -> str:
+    return f"[Sara] {alert['type']}: {alert['message']}"
+
+
+class AlertSink:
+    name = "sink"
+
+    async def send(self, alert: dict) -> None:
+        raise NotImplementedError
+
+
+class TwilioSink(AlertSink):
+    """Send the alert as an SMS through the Twilio REST API."""
+
+    name = "twilio"
+    API_URL = "https://api.twilio.com/2010-04-01/Accounts/{sid}/Messages.json"
+
+    def __init__(self, sid: str, token: str, from_number: str, to_number: str, timeout: float = 10.0):
+        self.sid = sid
+        self.token = token
+        self.from_number = from_number
+        self.to_number = to_number
+        self.timeout = timeout
+
+    def _post(self, body: str) -> None:
+        resp = requests.post(
+            self.API_URL.format(sid=self.sid),
+            data={"From": self.from_number, "To": self.to_number, "Body": body},
+            auth=(self.sid, self.token),
+            timeout=self.timeout,
+        )
+        resp.raise_for_status()
+
+    async def send(self, alert: dict) -> None:
+        await asyncio.to_thread(self._post, format_alert(alert))
+
+
+class EmailSink(AlertSink):
+    """Email the alert; without an SMTP host it only logs (demo mode)."""
+
+    name = "email"
+
+    def __init__(
+        self,
+        to_addr: str,
+        from_addr: str,
+        host: str | None = None,
+        port: int = 587,
+        username: str | None = None,
+        password: str | None = None,
+        timeout: float = 10.0,
+    ):
+        self.to_addr = to_addr
+        self.from_addr = from_addr
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+
+    def _send(self, msg: EmailMessage) -> None:
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password or "")
+            smtp.send_message(msg)
+
+    async def send(self, alert: dict) -> None:
+        if not self.host:
+            logger.info("Alert email to %s: %s", self.to_addr, format_alert(alert))
+            return
+        msg = EmailMessage()
+        msg["Subject"] = f"Sara alert: {alert['type']}"
+        msg["From"] = self.from_addr
+        msg["To"] = self.to_addr
+        msg.set_content(format_alert(alert))
+        await asyncio.to_thread(self._send, msg)
+
+
+class FakeSink(AlertSink):
+    """In-memory sink for tests; fails the first `fail_times` sends."""
+
+    name = "fake"
+
+    def __init__(self, fail_times: int = 0):
+        self.fail_times = fail_times
+        self.sent: List[dict] = []
+        self.attempts = 0
+
+    async def send(self, alert: dict) -> None:
+        self.attempts += 1
+        if self.attempts <= self.fail_times:
+            raise RuntimeError("fake sink failure")
+        self.sent.append(alert)
+
+
+def build_sinks(settings: Settings) -> List[AlertSink]:
+    """Sinks enabled by the TWILIO_* / ALERT_EMAIL_* / SMTP_* settings."""
+    sinks: List[AlertSink] = []
+    if settings.TWILIO_SID and settings.TWILIO_TOKEN and settings.TWILIO_FROM and settings.ALERT_SMS_TO:
+        sinks.append(
+            TwilioSink(
+                settings.TWILIO_SID,
+                settings.TWILIO_TOKEN,
+                settings.TWILIO_FROM,
+                settings.ALERT_SMS_TO,
+                timeout=settings.ALERT_SINK_TIMEOUT_SECONDS,
+            )
+        )
+    if settings.ALERT_EMAIL_TO:
+        sinks.append(
+            EmailSink(
+                settings.ALERT_EMAIL_TO,
+                settings.ALERT_EMAIL_FROM or settings.ALERT_EMAIL_TO,
+                host=settings.SMTP_HOST,
+                port=settings.SMTP_PORT,
+                username=settings.SMTP_USERNAME,
+                password=settings.SMTP_PASSWORD,
+                timeout=settings.ALERT_SINK_TIMEOUT_SECONDS,
+            )
+        )
+    return sinks
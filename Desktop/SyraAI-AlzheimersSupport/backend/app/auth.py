@@ -1,22 +1,103 @@
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+import asyncio
 from jose import jwt, JWTError
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from .config import settings
 from .db import users_col
+from .utils.cache import TTLCache
 from bson import ObjectId
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
+# Authenticated users by token "sub", so most requests skip the users lookup.
+# Anything that changes a user's role or password must call invalidate_principal.
+_principals = TTLCache(maxsize=settings.AUTH_CACHE_SIZE, ttl=settings.AUTH_CACHE_TTL_SECONDS)
+
+
+def invalidate_principal(user_id: str) -> None:
+    _principals.pop(str(user_id))
+
+
+def clear_principal_cache() -> None:
+    _principals.clear()
+
+
 def hash_password(pw: str) -> str:
     return pwd_context.hash(pw[:72])
 
 def verify_password(pw: str, hashed: str) -> bool:
     return pwd_context.verify(pw[:72], hashed)
 
+
+class HashingPool:
+    """Small dedicated thread pool for bcrypt.
+
+    bcrypt takes 100ms+ of CPU per call; run inline it would stall every
+    other request on the event loop. Calls beyond max_pending are rejected
+    with 503 instead of queueing without bound.
+    """
+
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending = 0
+        self._peak_pending = 0
+        self._completed = 0
+        self._rejected = 0
+
+    async def run(self, fn, *args):
+        if self._pending >= self.max_pending:
+            self._rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server busy, try again",
+                headers={"Retry-After": "1"},
+            )
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        self._pending += 1
+        self._peak_pending = max(self._peak_pending, self._pending)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self._pending -= 1
+            self._completed += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "pending": self._pending,
+            "queued": max(0, self._pending - self.workers),
+            "peak_pending": self._peak_pending,
+            "completed": self._completed,
+            "rejected": self._rejected,
+        }
+
+    def shutdown(self) -> None:
+        # The next run() starts a fresh pool (the app may be started again, e.g. in tests)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+hashing_pool = HashingPool(settings.BCRYPT_WORKERS, settings.BCRYPT_MAX_PENDING)
+
+
+async def hash_password_async(pw: str) -> str:
+    return await hashing_pool.run(hash_password, pw)
+
+
+async def verify_password_async(pw: str, hashed: str) -> bool:
+    return await hashing_pool.run(verify_password, pw, hashed)
+
 def create_access_token(
     data: Dict[str, Any], expires_minutes: int = settings.JWT_EXPIRE_MINUTES
 ) -> str:
@@ -39,11 +120,21 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = await users_col.find_one({"_id": ObjectId(user_id)})
-    if not user:
-        raise credentials_exception
-    user["id"] = str(user["_id"])
-    return user
+
+    if settings.AUTH_TRUST_JWT_ROLE and payload.get("role"):
+        # The role claim is signed by us at login; trusting it for the token
+        # lifetime means role changes only apply to newly issued tokens.
+        return {"_id": ObjectId(user_id), "id": user_id, "role": payload["role"]}
+
+    user = _principals.get(user_id)
+    if user is None:
+        user = await users_col.find_one({"_id": ObjectId(user_id)}, {"password": 0})
+        if not user:
+            raise credentials_exception
+        user["id"] = str(user["_id"])
+        _principals.set(user_id, user)
+    # copy, so a handler modifying its user cannot change the cached one
+    return dict(user)
 
 def require_role(role: str):
     async def _require(user=Depends(get_current_user)):
@@ -0,0 +1,156 @@
+"""Content-addressed storage for family images.
+
+Blobs are stored once per SHA-256 under ``<root>/ab/cd/<hash><ext>``, with
+derived variants (``<hash>_thumb.webp``...) next to the original. A blob is
+referenced by every family_images document carrying its content_hash.
+Deleting an image leaves its blob in place: an upload of the same content
+may be reusing it at that moment. The garbage collector removes blobs that
+have been unreferenced for longer than a grace period, and anything left
+behind by failed uploads; run it periodically (e.g. daily from cron):
+
+    python -m app.blobstore gc [--dry-run]
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import AsyncIterator, Iterator, Tuple
+from uuid import uuid4
+
+from fastapi.concurrency import run_in_threadpool
+
+from .config import settings
+from .db import family_images_collection
+
+# <hash><ext> or <hash>_<variant>.webp
+BLOB_NAME = re.compile(r"^(?P<hash>[0-9a-f]{64})(?:_(?P<variant>[a-z]+))?(?P<ext>\.(?:jpg|png|gif|webp))$")
+
+# Unreferenced blobs younger than this are left alone: their upload may not
+# have recorded its document yet.
+GC_GRACE_SECONDS = 3600
+
+
+class BlobTooLarge(Exception):
+    pass
+
+
+class BlobStore:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.tmp_dir = self.root / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    def path(self, name: str) -> Path:
+        """Filesystem path of a blob or variant file name."""
+        return self.root / name[:2] / name[2:4] / name
+
+    def exists(self, name: str) -> bool:
+        return self.path(name).exists()
+
+    async def put_stream(self, chunks: AsyncIterator[bytes], ext: str, max_bytes: int) -> Tuple[str, int]:
+        """Store a stream of bytes under its SHA-256; returns (content_hash, size).
+
+        Hashing and disk writes run in the threadpool so the event loop never
+        blocks, and max_bytes is enforced as data arrives. Content already in
+        the store is not written twice.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = self.tmp_dir / f"upload-{uuid4().hex}"
+        out = await run_in_threadpool(open, tmp_path, "wb")
+
+        def write(chunk: bytes) -> None:
+            digest.update(chunk)
+            out.write(chunk)
+
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise BlobTooLarge(f"larger than {max_bytes} bytes")
+                await run_in_threadpool(write, chunk)
+        except BaseException:
+            await run_in_threadpool(out.close)
+            tmp_path.unlink(missing_ok=True)
+            raise
+        await run_in_threadpool(out.close)
+
+        content_hash = digest.hexdigest()
+        final_path = self.path(content_hash + ext)
+        if size == 0:
+            tmp_path.unlink(missing_ok=True)
+        elif final_path.exists():
+            tmp_path.unlink(missing_ok=True)
+            # reused: restart the GC grace period so it is not collected
+            # before this upload records its reference
+            final_path.touch()
+        else:
+            final_path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, final_path)
+        return content_hash, size
+
+    def iter_blobs(self) -> Iterator[Tuple[str, Path]]:
+        """Yield (content_hash, path) for every stored file, variants included."""
+        for path in self.root.glob("??/??/*"):
+            match = BLOB_NAME.match(path.name)
+            if match:
+                yield match.group("hash"), path
+
+    def delete(self, content_hash: str) -> int:
+        """Remove a blob and its variants; returns the number of files removed."""
+        removed = 0
+        for path in (self.root / content_hash[:2] / content_hash[2:4]).glob(f"{content_hash}*"):
+            path.unlink(missing_ok=True)
+            removed += 1
+        return removed
+
+
+family_blobs = BlobStore(settings.BLOB_STORE_DIR)
+
+
+async def blob_refcount(content_hash: str) -> int:
+    return await family_images_collection.count_documents({"content_hash": content_hash})
+
+
+async def collect_garbage(dry_run: bool = False, grace_seconds: int = GC_GRACE_SECONDS) -> list:
+    """Delete blobs no family image references; returns the hashes removed."""
+    cutoff = time.time() - grace_seconds
+    # newest file per hash: a blob goes only when it and all its variants are old
+    newest = {}
+    for content_hash, path in family_blobs.iter_blobs():
+        newest[content_hash] = max(newest.get(content_hash, 0), path.stat().st_mtime)
+    # read the references after the mtimes: an upload reusing a blob touches
+    # it before recording its document
+    referenced = set(await family_images_collection.distinct("content_hash"))
+    orphans = {h for h, mtime in newest.items() if h not in referenced and mtime < cutoff}
+    if not dry_run:
+        for content_hash in orphans:
+            family_blobs.delete(content_hash)
+    # leftovers of interrupted uploads
+    for path in family_blobs.tmp_dir.glob("upload-*"):
+        if path.stat().st_mtime < cutoff and not dry_run:
+            path.unlink(missing_ok=True)
+    return sorted(orphans)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Family image blob store maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    gc = sub.add_parser("gc", help="delete unreferenced blobs")
+    gc.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args(argv)
+
+    removed = asyncio.run(collect_garbage(dry_run=args.dry_run))
+    verb = "Would remove" if args.dry_run else "Removed"
+    print(f"{verb} {len(removed)} orphaned blob(s)")
+    for content_hash in removed:
+        print(f"  {content_hash}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
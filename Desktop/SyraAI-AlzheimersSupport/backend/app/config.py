@@ -13,6 +13,96 @@ class Settings(BaseSettings):
     TWILIO_TOKEN: str | None = None
     TWILIO_FROM: str | None = None
     ALERT_EMAIL_TO: str | None = None
+    ALERT_SMS_TO: str | None = None
+    ALERT_EMAIL_FROM: str | None = None
+    SMTP_HOST: str | None = None
+    SMTP_PORT: int = 587
+    SMTP_USERNAME: str | None = None
+    SMTP_PASSWORD: str | None = None
+
+    # Alert dispatch queue (see app/alerts/dispatcher.py)
+    ALERT_QUEUE_SIZE: int = 1000
+    ALERT_WORKERS: int = 2
+    ALERT_MAX_ATTEMPTS: int = 6
+    ALERT_SINK_TIMEOUT_SECONDS: float = 10.0
+    # Reminder notifications while an alert episode stays open
+    ALERT_ESCALATION_MINUTES: int = 15
+    # Per-process memory of (patient, alert type) pairs with no open episode
+    ALERT_STATE_CACHE_SIZE: int = 100000
+    ALERT_STATE_CACHE_TTL_SECONDS: int = 3600
+
+    # Create missing MongoDB indexes when the app starts (see app/indexes.py)
+    CREATE_INDEXES_ON_STARTUP: bool = True
+
+    # Store locations and vitals as MongoDB time-series collections (see
+    # app/timeseries.py); a retention of 0 days keeps samples forever
+    TIMESERIES_COLLECTIONS: bool = False
+    LOCATIONS_RETENTION_DAYS: int = 0
+    VITALS_RETENTION_DAYS: int = 0
+    # Vitals rollups (see app/rollups.py): write interval and how long the
+    # minute rollups are kept (0 = forever; hour and day rollups are kept forever)
+    ROLLUP_FLUSH_SECONDS: float = 5.0
+    ROLLUP_MINUTE_RETENTION_DAYS: int = 30
+    # Per-patient vital baselines (see app/ml/baselines.py): how far from the
+    # baseline a reading must be, and how many in a row, before alerting
+    VITAL_BASELINE_Z: float = 3.0
+    VITAL_ALERT_CONSECUTIVE: int = 3
+    VITAL_CHECKPOINT_SECONDS: float = 60.0
+
+    # Reminder push (see app/reminders/scheduler.py): how far ahead reminders
+    # are held in memory, and how late a missed reminder may still be sent
+    REMINDER_SCHEDULER: bool = True
+    REMINDER_LOOKAHEAD_MINUTES: int = 10
+    REMINDER_MISSED_GRACE_MINUTES: int = 15
+    REMINDER_FIRES_RETENTION_DAYS: int = 30  # 0 keeps them forever
+    # Occurrences of repeating reminders listed by /reminders/due by default
+    REMINDER_DUE_WINDOW_HOURS: int = 24
+
+    # Authenticated user cache (see app/auth.py). With AUTH_TRUST_JWT_ROLE the
+    # role claim in the token is used and the users collection is not read.
+    AUTH_CACHE_TTL_SECONDS: int = 60
+    AUTH_CACHE_SIZE: int = 10000
+    AUTH_TRUST_JWT_ROLE: bool = False
+
+    # Password hashing: bcrypt cost factor and the thread pool it runs in
+    BCRYPT_ROUNDS: int = 12
+    BCRYPT_WORKERS: int = 4
+    BCRYPT_MAX_PENDING: int = 200
+
+    # Largest family image accepted, in bytes
+    MAX_IMAGE_BYTES: int = 10 * 1024 * 1024
+    # Content-addressed family image store (see app/blobstore.py)
+    BLOB_STORE_DIR: str = str(Path(__file__).resolve().parent.parent / "data" / "blobs")
+
+    # Live dashboard channel: per-connection event backlog and keepalive period
+    LIVE_QUEUE_SIZE: int = 256
+    LIVE_HEARTBEAT_SECONDS: float = 25.0
+    # How live events reach every worker: memory (single process),
+    # change_stream (replica set), polling (standalone) or auto
+    EVENT_BUS: str = "memory"
+    EVENT_BUS_POLL_SECONDS: float = 1.0
+    # How long published events stay in the events collection
+    EVENT_RETENTION_SECONDS: int = 3600
+
+    # Location anomaly detection (see app/ml/anomaly.py)
+    ANOMALY_DETECTION: bool = True
+    ANOMALY_MAX_SPEED_KMH: float = 12.0
+    # Fast pings in a row before a speed is reported as unusual
+    ANOMALY_SPEED_CONSECUTIVE: int = 2
+    ANOMALY_CHECKPOINT_SECONDS: float = 60.0
+    # Per-patient IsolationForest models (see app/ml/training.py); pings
+    # scoring below the threshold count as an unusual movement pattern
+    ML_WANDERING_MODEL: bool = False
+    ML_WANDERING_THRESHOLD: float = -0.1
+    MODEL_DIR: str = str(Path(__file__).resolve().parent.parent / "data" / "models")
+    ML_MODEL_CACHE_SIZE: int = 1000
+    ML_MODEL_CACHE_TTL_SECONDS: int = 600
+
+    # Per-process cache of patient safe zones used by location pings
+    GEOFENCE_CACHE_TTL_SECONDS: int = 300
+    GEOFENCE_CACHE_SIZE: int = 10000
+    # Per-caretaker cache of GET /patients/overview; 0 disables it
+    OVERVIEW_CACHE_TTL_SECONDS: int = 5
 
     class Config:
         # Absolute path to ensure .env is found no matter where uvicorn runs
@@ -8,12 +8,21 @@ db = client[settings.DB_NAME]
 users_col = db["users"]
 patients_col = db["patients"]
 reminders_col = db["reminders"]
+reminder_fires_collection = db["reminder_fires"]
+reminder_acks_collection = db["reminder_acks"]
 moods_col = db["moods"]
 locations_col = db["locations"]
 alerts_collection = db["alerts"]
+alert_outbox_collection = db["alert_outbox"]
 comfort_collection = db["comfort_messages"]
 family_images_collection = db["family_images"]
 family_messages_collection = db["family_messages"]
 logs_collection = db["daily_logs"]
 devices_collection = db["devices"]
 vitals_collection = db["vitals"]
+vitals_rollups_collection = db["vitals_rollups"]
+vital_baselines_collection = db["vital_baselines"]
+patient_state_collection = db["patient_state"]
+anomaly_state_collection = db["anomaly_state"]
+anomaly_models_collection = db["anomaly_models"]
+events_collection = db["events"]
@@ -0,0 +1,62 @@
+from typing import NamedTuple, Optional
+from bson import ObjectId
+
+from .config import settings
+from .db import patients_col
+from .utils.cache import TTLCache
+from .utils.geo import haversine_m, equirectangular_m
+
+# Points closer than this fraction of the radius (by the equirectangular
+# approximation) are inside without needing the exact haversine distance.
+FAST_INSIDE_FRACTION = 0.9
+
+
+class Geofence(NamedTuple):
+    lat: float
+    lng: float
+    radius_m: float
+
+    def outside_by_m(self, lat: float, lng: float) -> Optional[float]:
+        """Metres beyond the safe radius, or None if the point is inside."""
+        if equirectangular_m(self.lat, self.lng, lat, lng) < self.radius_m * FAST_INSIDE_FRACTION:
+            return None
+        dist_m = haversine_m(self.lat, self.lng, lat, lng)
+        if dist_m > self.radius_m:
+            return dist_m - self.radius_m
+        return None
+
+
+class GeofenceCache:
+    """Per-process cache of each patient's safe zone, keyed by patient id.
+
+    Anything that writes safe_center_* / safe_radius_m must call invalidate().
+    Unknown patients are cached too, so a misconfigured device does not cost
+    a lookup per ping.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, patient_id: str) -> Optional[Geofence]:
+        if patient_id in self._cache:
+            return self._cache.get(patient_id)
+        pat = await patients_col.find_one(
+            {"_id": ObjectId(patient_id)},
+            {"safe_center_lat": 1, "safe_center_lng": 1, "safe_radius_m": 1},
+        )
+        fence = None
+        if pat:
+            fence = Geofence(pat["safe_center_lat"], pat["safe_center_lng"], pat["safe_radius_m"])
+        self._cache.set(patient_id, fence)
+        return fence
+
+    def invalidate(self, patient_id: str) -> None:
+        self._cache.pop(patient_id)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+geofence_cache = GeofenceCache(
+    maxsize=settings.GEOFENCE_CACHE_SIZE, ttl=settings.GEOFENCE_CACHE_TTL_SECONDS
+)
@@ -0,0 +1,250 @@
+"""Index declarations for every collection in app/db.py.
+
+Indexes are created idempotently at startup (see app/main.py) and can be
+checked or applied from the command line before a deploy:
+
+    python -m app.indexes            # create missing indexes
+    python -m app.indexes --check    # report only, exit 1 if anything is missing
+    python -m app.indexes --drop-extra
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import PyMongoError
+
+from .config import settings
+from .db import (
+    db,
+    users_col,
+    patients_col,
+    reminders_col,
+    reminder_fires_collection,
+    reminder_acks_collection,
+    moods_col,
+    locations_col,
+    alerts_collection,
+    alert_outbox_collection,
+    comfort_collection,
+    family_images_collection,
+    family_messages_collection,
+    logs_collection,
+    devices_collection,
+    vitals_collection,
+    vitals_rollups_collection,
+    anomaly_models_collection,
+    events_collection,
+)
+
+from .timeseries import AUTOMATIC_INDEX, ensure_timeseries
+
+logger = logging.getLogger(__name__)
+
+
+def _retention(field: str, days: int, name: str, **options) -> List[IndexModel]:
+    """TTL index expiring documents `days` after `field`; none for 0 (keep forever)."""
+    if days <= 0:
+        return []
+    return [IndexModel([(field, ASCENDING)], name=name, expireAfterSeconds=days * 86400, **options)]
+
+
+# collection name -> indexes it should have (besides the implicit _id_)
+INDEXES: Dict[str, List[IndexModel]] = {
+    users_col.name: [
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    patients_col.name: [
+        IndexModel([("caretaker_id", ASCENDING)], name="caretaker_id"),
+        # patient accounts -> their patient records (app/access.py)
+        IndexModel([("user_id", ASCENDING)], name="user_id", sparse=True),
+    ],
+    reminders_col.name: [
+        # due_reminders only ever looks at unacknowledged reminders
+        IndexModel(
+            [("patient_id", ASCENDING), ("when", ASCENDING)],
+            name="patient_when_unacked",
+            partialFilterExpression={"acknowledged": False},
+        ),
+        # reminders the scheduler will still fire (app/reminders/scheduler.py)
+        IndexModel(
+            [("next_at", ASCENDING)],
+            name="next_at",
+            partialFilterExpression={"next_at": {"$type": "date"}},
+        ),
+    ],
+    reminder_acks_collection.name: [
+        # one acknowledgement per occurrence of a repeating reminder
+        IndexModel(
+            [("reminder_id", ASCENDING), ("occurrence", ASCENDING)],
+            name="reminder_occurrence_unique",
+            unique=True,
+        ),
+    ],
+    reminder_fires_collection.name: _retention("fired_at", settings.REMINDER_FIRES_RETENTION_DAYS, "fired_at_ttl"),
+    moods_col.name: [
+        IndexModel([("patient_id", ASCENDING), ("timestamp", DESCENDING)], name="patient_timestamp"),
+    ],
+    locations_col.name: [
+        IndexModel([("patient_id", ASCENDING), ("timestamp", DESCENDING)], name="patient_timestamp"),
+    ],
+    alerts_collection.name: [
+        # Alert feed: keyset pagination over (created_at, _id)
+        IndexModel(
+            [("patient_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+            name="patient_created_at",
+        ),
+        # At most one open episode per patient and alert type (app/alerts/engine.py)
+        IndexModel(
+            [("patient_id", ASCENDING), ("type", ASCENDING)],
+            name="open_episode_unique",
+            unique=True,
+            partialFilterExpression={"state": "open"},
+        ),
+    ],
+    alert_outbox_collection.name: [
+        IndexModel([("state", ASCENDING), ("next_attempt_at", ASCENDING)], name="state_next_attempt"),
+    ],
+    comfort_collection.name: [
+        IndexModel([("patient_id", ASCENDING), ("created_at", DESCENDING)], name="patient_created_at"),
+    ],
+    family_images_collection.name: [
+        IndexModel([("patient_id", ASCENDING), ("created_at", DESCENDING)], name="patient_created_at"),
+        IndexModel([("patient_id", ASCENDING), ("content_hash", ASCENDING)], name="patient_content_hash"),
+        # blob reference counts (app/blobstore.py)
+        IndexModel([("content_hash", ASCENDING)], name="content_hash"),
+    ],
+    family_messages_collection.name: [
+        IndexModel([("patient_id", ASCENDING), ("created_at", DESCENDING)], name="patient_created_at"),
+    ],
+    logs_collection.name: [
+        IndexModel([("patient_id", ASCENDING), ("timestamp", DESCENDING)], name="patient_timestamp"),
+    ],
+    devices_collection.name: [
+        IndexModel([("device_token", ASCENDING)], name="device_token_unique", unique=True),
+        IndexModel([("patient_id", ASCENDING)], name="patient_id"),
+    ],
+    vitals_collection.name: [
+        IndexModel([("patient_id", ASCENDING), ("timestamp", DESCENDING)], name="patient_timestamp"),
+    ],
+    events_collection.name: [
+        # events only matter until every worker has dispatched them (app/realtime/bus.py)
+        IndexModel(
+            [("created_at", ASCENDING)],
+            name="created_at_ttl",
+            expireAfterSeconds=settings.EVENT_RETENTION_SECONDS,
+        ),
+    ],
+    anomaly_models_collection.name: [
+        IndexModel([("patient_id", ASCENDING), ("version", DESCENDING)], name="patient_version", unique=True),
+    ],
+    vitals_rollups_collection.name: [
+        IndexModel(
+            [("patient_id", ASCENDING), ("resolution", ASCENDING), ("start", ASCENDING)],
+            name="patient_resolution_start",
+            unique=True,
+        ),
+        *_retention(
+            "start",
+            settings.ROLLUP_MINUTE_RETENTION_DAYS,
+            "minute_retention",
+            partialFilterExpression={"resolution": "minute"},
+        ),
+    ],
+}
+
+# Options that make two indexes with the same name different
+_SPEC_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+
+def _spec(doc: dict) -> dict:
+    spec = {"key": list(dict(doc["key"]).items())}
+    for opt in _SPEC_OPTIONS:
+        if opt in doc:
+            spec[opt] = doc[opt]
+    return spec
+
+
+async def diff_indexes(database=db) -> Dict[str, Dict[str, List[str]]]:
+    """Compare declared and existing indexes.
+
+    Returns {collection: {"missing": [...], "extra": [...], "changed": [...]}}
+    listing index names, only for collections that differ.
+    """
+    report = {}
+    for coll_name, wanted in INDEXES.items():
+        existing = {}
+        async for idx in database[coll_name].list_indexes():
+            if idx["name"] != "_id_":
+                existing[idx["name"]] = _spec(idx)
+        declared = {m.document["name"]: _spec(m.document) for m in wanted}
+
+        missing = [n for n in declared if n not in existing]
+        # time-series collections index (metaField, timeField) on their own
+        extra = [n for n in existing if n not in declared and n != AUTOMATIC_INDEX]
+        changed = [n for n in declared if n in existing and existing[n] != declared[n]]
+        if missing or extra or changed:
+            report[coll_name] = {"missing": missing, "extra": extra, "changed": changed}
+    return report
+
+
+async def ensure_indexes(database=db, drop_extra: bool = False) -> Dict[str, Dict[str, List[str]]]:
+    """Create every declared index that is missing.
+
+    Safe to call on every startup: create_indexes is a no-op for indexes that
+    already exist with the same spec. Indexes whose spec changed are left
+    alone and reported, since rebuilding them can be slow on big collections.
+    Time-series collections are created first, since creating an index
+    would otherwise create them as regular collections.
+    """
+    await ensure_timeseries(database)
+    report = await diff_indexes(database)
+    for coll_name, diff in report.items():
+        to_create = [m for m in INDEXES[coll_name] if m.document["name"] in diff["missing"]]
+        if to_create:
+            try:
+                await database[coll_name].create_indexes(to_create)
+                logger.info("Created indexes on %s: %s", coll_name, diff["missing"])
+            except PyMongoError as exc:
+                logger.error("Could not create indexes on %s: %s", coll_name, exc)
+        if diff["changed"]:
+            logger.warning(
+                "Indexes on %s differ from their declaration: %s", coll_name, diff["changed"]
+            )
+        if diff["extra"]:
+            if drop_extra:
+                for name in diff["extra"]:
+                    await database[coll_name].drop_index(name)
+                logger.info("Dropped undeclared indexes on %s: %s", coll_name, diff["extra"])
+            else:
+                logger.info("Undeclared indexes on %s: %s", coll_name, diff["extra"])
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Create or check MongoDB indexes")
+    parser.add_argument("--check", action="store_true", help="only report differences")
+    parser.add_argument("--drop-extra", action="store_true", help="drop undeclared indexes")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.check:
+        report = asyncio.run(diff_indexes())
+    else:
+        report = asyncio.run(ensure_indexes(drop_extra=args.drop_extra))
+
+    if not report:
+        print("All indexes up to date")
+    for coll_name, diff in report.items():
+        for kind, names in diff.items():
+            if names:
+                print(f"{coll_name}: {kind} {', '.join(names)}")
+    if args.check and any(d["missing"] or d["changed"] for d in report.values()):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,8 +2,22 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from contextlib import asynccontextmanager
 from pathlib import Path
 
+from app.config import settings
+from app.indexes import ensure_indexes
+from app.timeseries import ensure_timeseries
+from app.alerts.dispatcher import alert_dispatcher
+from app.auth import hashing_pool
+from app.realtime.hub import hub
+from app.realtime.bus import event_bus
+from app.rollups import vitals_rollups
+from app.ml.anomaly import anomaly_engine
+from app.ml.baselines import vital_baselines
+from app.reminders.scheduler import reminder_scheduler
+from app.ml.scoring import wandering_scorer
+
 # ✅ Import all route files from app.routes
 from app.routes import (
     auth,
@@ -19,10 +33,35 @@ from app.routes import (
     assistant,
     devices,
     vitals,
+    live,
 )
 
+# ✅ Startup / shutdown
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.CREATE_INDEXES_ON_STARTUP:
+        await ensure_indexes()
+    else:
+        await ensure_timeseries()
+    await event_bus.start()
+    await alert_dispatcher.start()
+    await vitals_rollups.start()
+    await vital_baselines.start()
+    await anomaly_engine.start()
+    if settings.REMINDER_SCHEDULER:
+        await reminder_scheduler.start()
+    yield
+    await reminder_scheduler.stop()
+    await anomaly_engine.stop()
+    await vital_baselines.stop()
+    await vitals_rollups.stop()
+    await alert_dispatcher.stop()
+    await event_bus.stop()
+    hashing_pool.shutdown()
+
+
 # ✅ Initialize FastAPI app
-app = FastAPI(title="SARA Backend")
+app = FastAPI(title="SARA Backend", lifespan=lifespan)
 
 # ✅ Allow frontend requests (CORS)
 origins = [
@@ -39,6 +78,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # ✅ Static directories (optional)
@@ -56,6 +96,22 @@ templates = Jinja2Templates(directory=TEMPLATE_DIR)
 def health():
     return {"status": "ok"}
 
+
+# ✅ Internal queue depths, for dashboards and load tests
+@app.get("/metrics")
+def metrics():
+    return {
+        "password_hashing": hashing_pool.stats(),
+        "alert_dispatcher": alert_dispatcher.stats(),
+        "live": hub.stats(),
+        "event_bus": event_bus.stats(),
+        "vitals_rollups": vitals_rollups.stats(),
+        "vital_baselines": vital_baselines.stats(),
+        "anomaly": anomaly_engine.stats(),
+        "wandering_model": wandering_scorer.stats(),
+        "reminders": reminder_scheduler.stats(),
+    }
+
 # ✅ Prefix all API routes with /api
 API_PREFIX = "/api"
 
@@ -72,3 +128,4 @@ app.include_router(logs.router, prefix=API_PREFIX)
 app.include_router(assistant.router, prefix=API_PREFIX)
 app.include_router(devices.router, prefix=API_PREFIX)
 app.include_router(vitals.router, prefix=API_PREFIX)
+app.include_router(live.router, prefix=API_PREFIX)
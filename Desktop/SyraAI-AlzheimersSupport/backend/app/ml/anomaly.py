@@ -1,9 +1,55 @@
-from typing import List, Tuple, Optional
-from datetime import datetime
-from .utils import speed_kmh
+"""Online anomaly detection for location pings.
+
+Each patient has a small running state updated in O(1) per ping:
+
+* last position and time
+* EWMA mean/variance of speed, to spot speeds unusual for this patient
+  (and anything above ANOMALY_MAX_SPEED_KMH, e.g. being driven away). A
+  speed only counts as unusual after ANOMALY_SPEED_CONSECUTIVE fast pings
+  in a row that also moved the patient that fast overall, so one bad GPS
+  fix (a jump out and back) is not reported
+* EWMA of the heading as a unit vector; its circular variance is near 0
+  when walking somewhere and near 1 when moving aimlessly
+* how often the patient is on the move at each hour of the day (UTC)
+
+"Wandering" is aimless movement at an hour the patient is normally still.
+States live in memory and are checkpointed to the anomaly_state collection
+every ANOMALY_CHECKPOINT_SECONDS, so a restart keeps the learned baseline.
+"""
+import math
+from datetime import datetime, timezone
+from typing import List, NamedTuple, Optional, Tuple
+
+from ..config import settings
+from ..db import anomaly_state_collection
+from ..utils.geo import haversine_m
+from ..utils.more import speed_kmh
+from .state import StateStore
+
+# Smoothing of the running speed and heading statistics (per ping)
+SPEED_ALPHA = 0.05
+HEADING_ALPHA = 0.1
+# Smoothing of the hour-of-day activity baseline (per ping in that hour)
+HOUR_ALPHA = 0.02
+# Pings further apart than this start a new track: no speed or heading
+MAX_GAP_SECONDS = 15 * 60
+# Movement below this is GPS jitter, not a heading
+MIN_MOVE_M = 5.0
+MOVING_KMH = 1.0
+
+# Unusual speed: this many standard deviations above the patient's mean,
+# once there are enough samples to trust it
+SPEED_Z = 4.0
+MIN_SPEED_SAMPLES = 30
+# Wandering: aimless heading while moving, at an hour with little activity.
+# It ends once the heading steadies or the patient stays still a while.
+WANDER_HEADING_VAR = 0.7
+WANDER_EXIT_HEADING_VAR = 0.5
+WANDER_STILL_SECONDS = 5 * 60
+MIN_HEADING_SAMPLES = 10
+QUIET_HOUR_ACTIVITY = 0.3
+MIN_HOUR_SAMPLES = 20
 
-# Simple heuristic: flag if instantaneous speed exceeds threshold (e.g., 12 km/h walking unlikely) 
-# or if big deviation in short time. Placeholder for IsolationForest / LSTM later.
 
 def simple_anomaly_flag(locations: List[Tuple[float, float, datetime]], speed_threshold_kmh: float = 12.0) -> bool:
     if len(locations) < 2:
@@ -11,3 +57,153 @@ def simple_anomaly_flag(locations: List[Tuple[float, float, datetime]], speed_th
     (lat1, lng1, t1), (lat2, lng2, t2) = locations[-2], locations[-1]
     spd = speed_kmh(lat1, lng1, t1, lat2, lng2, t2)
     return spd is not None and spd > speed_threshold_kmh
+
+
+def _epoch(ts: datetime) -> float:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+class Assessment(NamedTuple):
+    speed_kmh: Optional[float]
+    speed_z: Optional[float]
+    heading_var: Optional[float]
+    hour_activity: Optional[float]
+    dwell_s: float
+    unusual_speed: bool
+    wandering: bool
+
+
+class PatientState:
+    __slots__ = (
+        "lat", "lng", "t",
+        "speed_mean", "speed_var", "speed_n",
+        "heading_cos", "heading_sin", "heading_n",
+        "hour_activity", "hour_n",
+        "last_move_t", "wandering",
+        "speed_streak", "speed_anchor",
+    )
+
+    def __init__(self):
+        self.lat = self.lng = self.t = None
+        self.speed_mean = 0.0
+        self.speed_var = 0.0
+        self.speed_n = 0
+        self.heading_cos = 0.0
+        self.heading_sin = 0.0
+        self.heading_n = 0
+        self.hour_activity = [0.0] * 24
+        self.hour_n = [0] * 24
+        self.last_move_t = None
+        self.wandering = False
+        # fast pings in a row, and where the run started as [lat, lng, t]
+        self.speed_streak = 0
+        self.speed_anchor = None
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "PatientState":
+        state = cls()
+        for name in cls.__slots__:
+            if name in doc:
+                setattr(state, name, doc[name])
+        return state
+
+    def to_doc(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def heading_variance(self) -> Optional[float]:
+        if self.heading_n < MIN_HEADING_SAMPLES:
+            return None
+        return 1.0 - math.hypot(self.heading_cos, self.heading_sin)
+
+    def _too_fast(self, speed: float) -> Tuple[bool, Optional[float]]:
+        """Whether speed breaks the limits, judged against the baseline; and its z-score."""
+        std = math.sqrt(self.speed_var)
+        z = (speed - self.speed_mean) / std if self.speed_n >= MIN_SPEED_SAMPLES and std > 0 else None
+        too_fast = speed > settings.ANOMALY_MAX_SPEED_KMH or (
+            z is not None and z > SPEED_Z and speed > MOVING_KMH
+        )
+        return too_fast, z
+
+    def update(self, lat: float, lng: float, t: float) -> Assessment:
+        """Fold one ping (t in epoch seconds) into the state and assess it."""
+        prev_lat, prev_lng, prev_t = self.lat, self.lng, self.t
+        if prev_t is not None and t <= prev_t:
+            # late or duplicate ping: nothing to learn from it
+            return Assessment(None, None, self.heading_variance(), None, 0.0, False, False)
+        self.lat, self.lng, self.t = lat, lng, t
+        if prev_t is None or t - prev_t > MAX_GAP_SECONDS:
+            self.speed_streak, self.speed_anchor = 0, None
+            return Assessment(None, None, None, None, 0.0, False, False)
+
+        dist = haversine_m(prev_lat, prev_lng, lat, lng)
+        speed = dist / 1000.0 / ((t - prev_t) / 3600.0)
+
+        # Assess against the baseline before folding this ping into it
+        too_fast, z = self._too_fast(speed)
+        unusual_speed = False
+        if not too_fast:
+            self.speed_streak, self.speed_anchor = 0, None
+        else:
+            if not self.speed_streak:
+                self.speed_anchor = [prev_lat, prev_lng, prev_t]
+            self.speed_streak += 1
+            if self.speed_streak >= settings.ANOMALY_SPEED_CONSECUTIVE:
+                # sustained only if the run as a whole covered ground that fast
+                a_lat, a_lng, a_t = self.speed_anchor
+                overall = haversine_m(a_lat, a_lng, lat, lng) / 1000.0 / ((t - a_t) / 3600.0)
+                unusual_speed = self._too_fast(overall)[0]
+                if not unusual_speed:
+                    # a jump out and back: start over from here
+                    self.speed_streak, self.speed_anchor = 0, None
+        delta = speed - self.speed_mean
+        self.speed_mean += SPEED_ALPHA * delta
+        self.speed_var = (1 - SPEED_ALPHA) * (self.speed_var + SPEED_ALPHA * delta * delta)
+        self.speed_n += 1
+
+        moving = speed >= MOVING_KMH and dist >= MIN_MOVE_M
+        if moving:
+            phi1, phi2 = math.radians(prev_lat), math.radians(lat)
+            dl = math.radians(lng - prev_lng)
+            bearing = math.atan2(
+                math.sin(dl) * math.cos(phi2),
+                math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(dl),
+            )
+            self.heading_cos += HEADING_ALPHA * (math.cos(bearing) - self.heading_cos)
+            self.heading_sin += HEADING_ALPHA * (math.sin(bearing) - self.heading_sin)
+            self.heading_n += 1
+
+        hour = int(t // 3600 % 24)
+        activity = self.hour_activity[hour] if self.hour_n[hour] >= MIN_HOUR_SAMPLES else None
+        if moving:
+            self.last_move_t = t
+        dwell = t - self.last_move_t if self.last_move_t is not None else 0.0
+        heading_var = self.heading_variance()
+        if self.wandering:
+            settled = dwell >= WANDER_STILL_SECONDS
+            wandering = not settled and heading_var >= WANDER_EXIT_HEADING_VAR
+        else:
+            wandering = (
+                moving
+                and heading_var is not None
+                and heading_var >= WANDER_HEADING_VAR
+                and (activity is None or activity < QUIET_HOUR_ACTIVITY)
+            )
+        self.wandering = wandering
+        # Wandering must not teach the baseline that this hour is active
+        if not wandering:
+            self.hour_activity[hour] += HOUR_ALPHA * ((1.0 if moving else 0.0) - self.hour_activity[hour])
+            self.hour_n[hour] += 1
+        return Assessment(speed, z, heading_var, activity, dwell, unusual_speed, wandering)
+
+
+class AnomalyEngine(StateStore):
+    state_class = PatientState
+
+    async def observe(self, patient_id: str, lat: float, lng: float, ts: datetime) -> Assessment:
+        state = await self._state(patient_id)
+        return state.update(lat, lng, _epoch(ts))
+
+
+anomaly_engine = AnomalyEngine(anomaly_state_collection, checkpoint_interval=settings.ANOMALY_CHECKPOINT_SECONDS)
@@ -0,0 +1,218 @@
+"""Per-patient vital-sign baselines.
+
+Fixed limits suit nobody exactly: a heart rate of 115 can be ordinary for
+one patient and alarming for another. Each patient keeps running
+statistics, updated in O(1) per reading:
+
+* heart rate by hour of day (UTC): an EWMA mean per hour, plus the EWMA
+  variance of readings around it, so the usual night-time and daytime rates
+  are both normal
+* EWMA mean/variance of body temperature and of SpO2
+
+A reading breaks a rule when it is beyond the hard limits, or beyond the
+population limits and more than VITAL_BASELINE_Z standard deviations from
+the patient's own baseline (until the baseline has enough samples the
+population limits alone apply). A rule raises an alert once it has been
+broken by VITAL_ALERT_CONSECUTIVE readings in a row, so one noisy reading
+from a loose pendant no longer pages anyone. Once a baseline is trusted, a
+reading moves it by at most VITAL_BASELINE_Z standard deviations: otherwise
+the first readings of a sustained jump would widen the variance enough to
+hide the rest of it.
+
+States are checkpointed to the vital_baselines collection every
+VITAL_CHECKPOINT_SECONDS (see app/ml/state.py).
+"""
+import math
+from datetime import datetime, timezone
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+from ..config import settings
+from ..db import vital_baselines_collection
+from .state import StateStore
+
+# Rule order matches VITAL_RULES in app/routes/vitals.py
+RULES = ("high_heart_rate", "low_heart_rate", "high_temp", "low_spo2")
+
+# Population limits: outside them a reading is suspicious unless it is
+# normal for this patient
+MAX_HEART_RATE = 120
+MIN_HEART_RATE = 40
+MAX_TEMP = 38.0
+MIN_SPO2 = 90
+# Hard limits: outside them a reading always breaks its rule
+HARD_MAX_HEART_RATE = 150
+HARD_MIN_HEART_RATE = 35
+HARD_MAX_TEMP = 39.5
+HARD_MIN_SPO2 = 85
+
+# Smoothing per reading (per reading in that hour for the hourly heart rate)
+ALPHA = 0.05
+HOUR_ALPHA = 0.05
+# Samples needed before a baseline is trusted
+MIN_SAMPLES = 50
+MIN_HOUR_SAMPLES = 20
+# Smallest standard deviation assumed, so a very steady baseline does not
+# turn every small change into a large z-score
+MIN_STD_HEART_RATE = 3.0
+MIN_STD_TEMP = 0.2
+MIN_STD_SPO2 = 1.0
+
+
+class Evaluation(NamedTuple):
+    # indices into RULES broken by this reading
+    broken: Tuple[int, ...]
+    # rules whose streak just reached VITAL_ALERT_CONSECUTIVE: alert on these
+    fired: Tuple[int, ...]
+
+
+def _epoch(ts: datetime) -> float:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.timestamp()
+
+
+def _z(value: float, mean: float, var: float, min_std: float) -> float:
+    return (value - mean) / max(math.sqrt(var), min_std)
+
+
+def _clip(delta: float, var: float, min_std: float) -> float:
+    limit = settings.VITAL_BASELINE_Z * max(math.sqrt(var), min_std)
+    return max(-limit, min(limit, delta))
+
+
+def _ewma(mean: float, var: float, value: float, alpha: float, min_std: Optional[float] = None) -> Tuple[float, float]:
+    """EWMA update; with min_std the step is clipped to VITAL_BASELINE_Z deviations."""
+    delta = value - mean
+    if min_std is not None:
+        delta = _clip(delta, var, min_std)
+    return mean + alpha * delta, (1 - alpha) * (var + alpha * delta * delta)
+
+
+class VitalState:
+    __slots__ = (
+        "hr_hour_mean", "hr_hour_n", "hr_var", "hr_n",
+        "temp_mean", "temp_var", "temp_n",
+        "spo2_mean", "spo2_var", "spo2_n",
+        "streaks",
+    )
+
+    def __init__(self):
+        self.hr_hour_mean = [0.0] * 24
+        self.hr_hour_n = [0] * 24
+        self.hr_var = 0.0
+        self.hr_n = 0
+        self.temp_mean = self.temp_var = 0.0
+        self.temp_n = 0
+        self.spo2_mean = self.spo2_var = 0.0
+        self.spo2_n = 0
+        self.streaks = [0] * len(RULES)
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "VitalState":
+        state = cls()
+        for name in cls.__slots__:
+            if name in doc:
+                setattr(state, name, doc[name])
+        return state
+
+    def to_doc(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def update(self, heart_rate: float, body_temp: float, spo2: float, t: float) -> Evaluation:
+        """Assess one reading (t in epoch seconds), then fold it into the baseline."""
+        z_limit = settings.VITAL_BASELINE_Z
+        hour = int(t // 3600 % 24)
+
+        z_hr = z_temp = z_spo2 = None
+        if self.hr_n >= MIN_SAMPLES and self.hr_hour_n[hour] >= MIN_HOUR_SAMPLES:
+            z_hr = _z(heart_rate, self.hr_hour_mean[hour], self.hr_var, MIN_STD_HEART_RATE)
+        if self.temp_n >= MIN_SAMPLES:
+            z_temp = _z(body_temp, self.temp_mean, self.temp_var, MIN_STD_TEMP)
+        if self.spo2_n >= MIN_SAMPLES:
+            z_spo2 = _z(spo2, self.spo2_mean, self.spo2_var, MIN_STD_SPO2)
+
+        hard = (
+            heart_rate > HARD_MAX_HEART_RATE,
+            heart_rate < HARD_MIN_HEART_RATE,
+            body_temp > HARD_MAX_TEMP,
+            spo2 < HARD_MIN_SPO2,
+        )
+        broken = tuple(
+            i
+            for i, rule in enumerate(
+                (
+                    hard[0] or (heart_rate > MAX_HEART_RATE and (z_hr is None or z_hr > z_limit)),
+                    hard[1] or (heart_rate < MIN_HEART_RATE and (z_hr is None or z_hr < -z_limit)),
+                    hard[2] or (body_temp > MAX_TEMP and (z_temp is None or z_temp > z_limit)),
+                    hard[3] or (spo2 < MIN_SPO2 and (z_spo2 is None or z_spo2 < -z_limit)),
+                )
+            )
+            if rule
+        )
+
+        needed = settings.VITAL_ALERT_CONSECUTIVE
+        fired = []
+        for i in range(len(RULES)):
+            self.streaks[i] = self.streaks[i] + 1 if i in broken else 0
+            if self.streaks[i] == needed:
+                fired.append(i)
+
+        # Learn from the reading unless it is beyond the hard limits or part of
+        # an alerting streak against an established baseline: an ongoing
+        # episode must not become the new normal.
+        if not (hard[0] or hard[1] or (z_hr is not None and max(self.streaks[0], self.streaks[1]) >= needed)):
+            if self.hr_hour_n[hour] == 0:
+                self.hr_hour_mean[hour] = heart_rate
+            delta = heart_rate - self.hr_hour_mean[hour]
+            if z_hr is not None:
+                delta = _clip(delta, self.hr_var, MIN_STD_HEART_RATE)
+            self.hr_hour_mean[hour] += HOUR_ALPHA * delta
+            self.hr_hour_n[hour] += 1
+            self.hr_var = (1 - ALPHA) * (self.hr_var + ALPHA * delta * delta)
+            self.hr_n += 1
+        if not (hard[2] or (z_temp is not None and self.streaks[2] >= needed)):
+            if self.temp_n == 0:
+                self.temp_mean = body_temp
+            self.temp_mean, self.temp_var = _ewma(
+                self.temp_mean, self.temp_var, body_temp, ALPHA, MIN_STD_TEMP if z_temp is not None else None
+            )
+            self.temp_n += 1
+        if not (hard[3] or (z_spo2 is not None and self.streaks[3] >= needed)):
+            if self.spo2_n == 0:
+                self.spo2_mean = spo2
+            self.spo2_mean, self.spo2_var = _ewma(
+                self.spo2_mean, self.spo2_var, spo2, ALPHA, MIN_STD_SPO2 if z_spo2 is not None else None
+            )
+            self.spo2_n += 1
+
+        return Evaluation(broken, tuple(fired))
+
+
+class VitalBaselines(StateStore):
+    state_class = VitalState
+
+    async def assess(self, patient_id: str, heart_rate: float, body_temp: float, spo2: float, ts: datetime) -> Evaluation:
+        state = await self._state(patient_id)
+        return state.update(heart_rate, body_temp, spo2, _epoch(ts))
+
+    async def assess_many(self, docs: Iterable[dict]) -> List[Optional[Evaluation]]:
+        """Assess stored reading documents, in timestamp order per patient.
+
+        Returns one Evaluation per document, in the order given.
+        """
+        docs = list(docs)
+        states = {}
+        for doc in docs:
+            pid = str(doc["patient_id"])
+            if pid not in states:
+                states[pid] = await self._state(pid)
+        results: List[Optional[Evaluation]] = [None] * len(docs)
+        for i in sorted(range(len(docs)), key=lambda i: _epoch(docs[i]["timestamp"])):
+            doc = docs[i]
+            results[i] = states[str(doc["patient_id"])].update(
+                doc["heart_rate"], doc["body_temp"], doc["spo2"], _epoch(doc["timestamp"])
+            )
+        return results
+
+
+vital_baselines = VitalBaselines(vital_baselines_collection, checkpoint_interval=settings.VITAL_CHECKPOINT_SECONDS)
@@ -0,0 +1,101 @@
+"""Per-ping feature vectors for the wandering model (app/ml/training.py).
+
+Offline features are computed with NumPy over a whole history; the live
+path builds the same vector for one ping from the online anomaly state, so
+a model trained on history scores live pings consistently.
+"""
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+import numpy as np
+from bson import ObjectId
+
+from ..db import locations_col
+from ..utils import geo_batch
+from ..utils.geo import haversine_m
+from .anomaly import MIN_MOVE_M, MOVING_KMH
+
+FEATURES = ("hour_sin", "hour_cos", "distance_from_center_m", "speed_kmh", "dwell_s")
+
+# Longest dwell counted; beyond a few hours "stayed put" is all that matters
+MAX_DWELL_S = 6 * 3600.0
+# Pings further apart than this do not form a speed
+MAX_GAP_S = 15 * 60.0
+
+EPOCH = datetime(1970, 1, 1)
+
+
+def ping_features(
+    lat: float, lng: float, ts: datetime, center: Tuple[float, float], speed_kmh: Optional[float], dwell_s: float
+) -> np.ndarray:
+    """Feature row for one live ping, matching build_features."""
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    seconds = (ts - EPOCH) / timedelta(seconds=1)
+    angle = 2 * math.pi * (seconds % 86400) / 86400
+    return np.array(
+        [
+            math.sin(angle),
+            math.cos(angle),
+            haversine_m(center[0], center[1], lat, lng),
+            speed_kmh or 0.0,
+            min(dwell_s, MAX_DWELL_S),
+        ]
+    )
+
+
+def build_features(lat, lng, seconds, center: Tuple[float, float]) -> np.ndarray:
+    """Feature matrix (one row per ping) for a time-ordered history.
+
+    seconds are epoch seconds. Speed and movement follow the online engine
+    (app/ml/anomaly.py): a ping is moving when it is at least MOVING_KMH
+    and MIN_MOVE_M from the previous one; dwell is the time since the last
+    moving ping.
+    """
+    lat = np.asarray(lat, dtype=float)
+    lng = np.asarray(lng, dtype=float)
+    t = np.asarray(seconds, dtype=float)
+    n = len(t)
+
+    angle = 2 * np.pi * (t % 86400) / 86400
+    distance = geo_batch.distance_to_center_m(lat, lng, *center)
+
+    speed = np.zeros(n)
+    moving = np.zeros(n, dtype=bool)
+    if n > 1:
+        step = geo_batch.consecutive_distances_m(lat, lng)
+        dt = np.diff(t)
+        kmh = geo_batch.speed_kmh(lat, lng, t)
+        valid = (dt > 0) & (dt <= MAX_GAP_S)
+        speed[1:] = np.where(valid, kmh, 0.0)
+        moving[1:] = valid & (speed[1:] >= MOVING_KMH) & (step >= MIN_MOVE_M)
+
+    # time since the most recent moving ping (or the first ping)
+    last_move = np.where(moving, np.arange(n), 0)
+    np.maximum.accumulate(last_move, out=last_move)
+    dwell = np.minimum(t - t[last_move], MAX_DWELL_S)
+
+    return np.column_stack((np.sin(angle), np.cos(angle), distance, speed, dwell))
+
+
+async def patient_history(patient_id: str, since: datetime, limit: int = 500_000) -> Tuple[np.ndarray, ...]:
+    """(lat, lng, epoch seconds) arrays of a patient's pings since `since`.
+
+    Streams the cursor in batches; only the three columns are kept.
+    """
+    lat, lng, t = [], [], []
+    cursor = (
+        locations_col.find(
+            {"patient_id": ObjectId(patient_id), "timestamp": {"$gte": since}},
+            {"_id": 0, "lat": 1, "lng": 1, "timestamp": 1},
+        )
+        .sort("timestamp", 1)
+        .limit(limit)
+        .batch_size(10_000)
+    )
+    async for d in cursor:
+        lat.append(d["lat"])
+        lng.append(d["lng"])
+        t.append((d["timestamp"] - EPOCH) / timedelta(seconds=1))
+    return np.array(lat), np.array(lng), np.array(t)
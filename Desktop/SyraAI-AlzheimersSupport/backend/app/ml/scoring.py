@@ -0,0 +1,164 @@
+"""Serving the wandering models trained by app/ml/training.py.
+
+Models are loaded lazily, per patient, into a bounded LRU cache. Entries
+expire after ML_MODEL_CACHE_TTL_SECONDS, so a newly trained version is
+picked up within that time.
+
+Pings are scored in micro-batches: rows queued within ``max_delay`` seconds
+(or until ``max_batch`` rows) go to the threadpool in one hop, each
+patient's rows in one ``decision_function`` call, so sklearn's per-call
+overhead is paid per batch rather than per ping.
+
+Scoring is best effort: a model that cannot be loaded or scored is logged
+and the ping is treated as having no model, never failed.
+"""
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import joblib
+import numpy as np
+import sklearn
+
+from ..config import settings
+from ..utils.cache import TTLCache
+from .training import latest_model
+
+logger = logging.getLogger(__name__)
+
+
+class ModelCache:
+    def __init__(self, maxsize: int, ttl: float):
+        # patient id -> (version, model); (None, None) when there is no usable model
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.loads = 0
+
+    async def get(self, patient_id: str):
+        if patient_id in self._cache:
+            return self._cache.get(patient_id)[1]
+        lock = self._locks.setdefault(patient_id, asyncio.Lock())
+        async with lock:
+            if patient_id not in self._cache:
+                self._cache.set(patient_id, await self._load(patient_id))
+        self._locks.pop(patient_id, None)
+        return self._cache.get(patient_id, (None, None))[1]
+
+    async def _load(self, patient_id: str) -> Tuple[Optional[int], object]:
+        meta = await latest_model(patient_id)
+        if meta is None:
+            return None, None
+        if meta.get("sklearn_version") != sklearn.__version__:
+            logger.warning(
+                "Model %s v%s was trained with scikit-learn %s; retrain it",
+                patient_id, meta["version"], meta.get("sklearn_version"),
+            )
+            return None, None
+        try:
+            model = await asyncio.to_thread(joblib.load, meta["path"])
+        except Exception:
+            logger.exception("Could not load model %s", meta["path"])
+            return None, None
+        self.loads += 1
+        return meta["version"], model
+
+    def invalidate(self, patient_id: str) -> None:
+        self._cache.pop(patient_id)
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+
+class WanderingScorer:
+    def __init__(self, models: ModelCache, max_batch: int = 256, max_delay: float = 0.01):
+        self.models = models
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._pending: List[Tuple[str, object, np.ndarray, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # running batches, referenced until done so they are not collected
+        self._tasks: set = set()
+        self._batches = 0
+        self._scored = 0
+        self._failed = 0
+
+    async def score(self, patient_id: str, row: np.ndarray) -> Optional[float]:
+        """IsolationForest decision score (negative = anomalous), or None without a usable model."""
+        try:
+            model = await self.models.get(patient_id)
+        except Exception:
+            self._failed += 1
+            logger.exception("Could not load the wandering model for patient %s", patient_id)
+            return None
+        if model is None:
+            return None
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((patient_id, model, row, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._flush)
+        try:
+            return await future
+        except Exception:
+            return None  # logged once for the whole batch by _run
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._done)
+
+    def _done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Wandering scoring batch failed", exc_info=task.exception())
+
+    async def _run(self, batch: list) -> None:
+        groups: Dict[str, list] = {}
+        for item in batch:
+            groups.setdefault(item[0], []).append(item)
+
+        def decide():
+            return {
+                pid: items[0][1].decision_function(np.vstack([item[2] for item in items]))
+                for pid, items in groups.items()
+            }
+
+        try:
+            scores = await asyncio.to_thread(decide)
+            self._batches += 1
+            self._scored += len(batch)
+            for pid, items in groups.items():
+                for (*_, future), value in zip(items, scores[pid]):
+                    if not future.done():
+                        future.set_result(float(value))
+        except asyncio.CancelledError:
+            for *_, future in batch:
+                future.cancel()
+            raise
+        except Exception as exc:
+            self._failed += len(batch)
+            logger.exception("Could not score a batch of %d ping(s)", len(batch))
+            for *_, future in batch:
+                if not future.done():
+                    future.set_exception(exc)
+
+    def stats(self) -> dict:
+        return {
+            "models_cached": len(self.models),
+            "model_loads": self.models.loads,
+            "batches": self._batches,
+            "scored": self._scored,
+            "failed": self._failed,
+        }
+
+
+wandering_scorer = WanderingScorer(
+    ModelCache(maxsize=settings.ML_MODEL_CACHE_SIZE, ttl=settings.ML_MODEL_CACHE_TTL_SECONDS)
+)
@@ -0,0 +1,72 @@
+"""Per-patient model state kept in memory and checkpointed to MongoDB.
+
+The online detectors (app/ml/anomaly.py, app/ml/baselines.py) update a small
+state object per patient on every reading. States are loaded from their
+collection the first time a patient is seen and the ones that changed are
+written back in one unordered bulk every ``checkpoint_interval`` seconds, so
+a restart keeps what was learned without a write per reading.
+"""
+import asyncio
+import logging
+from typing import Dict, Optional
+
+from bson import ObjectId
+from pymongo import ReplaceOne
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore:
+    # the state class; it provides from_doc(doc) and to_doc()
+    state_class = None
+
+    def __init__(self, collection, checkpoint_interval: float = 60.0):
+        self.collection = collection
+        self.checkpoint_interval = checkpoint_interval
+        self._states: Dict[str, object] = {}
+        self._dirty: set = set()
+        self._task: Optional[asyncio.Task] = None
+
+    async def _state(self, patient_id: str):
+        """The patient's state, marked for the next checkpoint."""
+        state = self._states.get(patient_id)
+        if state is None:
+            doc = await self.collection.find_one({"_id": ObjectId(patient_id)})
+            loaded = self.state_class.from_doc(doc) if doc else self.state_class()
+            # a concurrent reading may have loaded it meanwhile
+            state = self._states.setdefault(patient_id, loaded)
+        self._dirty.add(patient_id)
+        return state
+
+    async def checkpoint(self) -> None:
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        ops = [
+            ReplaceOne({"_id": ObjectId(pid)}, self._states[pid].to_doc(), upsert=True)
+            for pid in dirty
+        ]
+        try:
+            await self.collection.bulk_write(ops, ordered=False)
+        except Exception:
+            self._dirty |= dirty
+            logger.exception("Could not checkpoint %d %s state(s)", len(ops), self.collection.name)
+
+    async def _checkpointer(self) -> None:
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            await self.checkpoint()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._checkpointer())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.checkpoint()
+
+    def stats(self) -> dict:
+        return {"patients": len(self._states), "dirty": len(self._dirty), "running": self._task is not None}
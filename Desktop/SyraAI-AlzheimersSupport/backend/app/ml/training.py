@@ -0,0 +1,133 @@
+"""Offline training of per-patient IsolationForest wandering models.
+
+For every patient with a safe zone and enough recent pings, the location
+history is turned into feature rows (app/ml/features.py) and an
+IsolationForest is fitted in a process pool, so training many patients uses
+every core and never touches the API's event loop. Each model is written to
+MODEL_DIR/<patient_id>/v<version>.joblib and described by a document in the
+anomaly_models collection; the newest version is the one scoring uses.
+
+    python -m app.ml.training [--days 30] [--patient <id>] [--workers 4]
+"""
+import argparse
+import asyncio
+import io
+import logging
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+import joblib
+import numpy as np
+import sklearn
+from bson import ObjectId
+from pymongo import DESCENDING
+
+from ..config import settings
+from ..db import anomaly_models_collection, patients_col
+from .features import FEATURES, build_features, patient_history
+
+logger = logging.getLogger(__name__)
+
+# Fewer pings than this do not describe a routine
+MIN_SAMPLES = 500
+N_ESTIMATORS = 100
+
+
+def fit_model(features: np.ndarray, seed: int = 0) -> bytes:
+    """Fit an IsolationForest; returns it joblib-serialized.
+
+    Runs in a worker process, so it takes and returns plain picklable data.
+    """
+    from sklearn.ensemble import IsolationForest
+
+    model = IsolationForest(n_estimators=N_ESTIMATORS, contamination="auto", random_state=seed)
+    model.fit(features)
+    buf = io.BytesIO()
+    joblib.dump(model, buf, compress=3)
+    return buf.getvalue()
+
+
+def model_path(patient_id: str, version: int) -> Path:
+    return Path(settings.MODEL_DIR) / patient_id / f"v{version}.joblib"
+
+
+async def latest_model(patient_id: str) -> Optional[dict]:
+    return await anomaly_models_collection.find_one(
+        {"patient_id": ObjectId(patient_id)}, sort=[("version", DESCENDING)]
+    )
+
+
+async def _save(patient_id: str, blob: bytes, samples: int, since: datetime) -> dict:
+    previous = await latest_model(patient_id)
+    version = previous["version"] + 1 if previous else 1
+    path = model_path(patient_id, version)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    await asyncio.to_thread(path.write_bytes, blob)
+    doc = {
+        "patient_id": ObjectId(patient_id),
+        "version": version,
+        "path": str(path),
+        "features": list(FEATURES),
+        "samples": samples,
+        "trained_from": since,
+        "trained_at": datetime.utcnow(),
+        "sklearn_version": sklearn.__version__,
+    }
+    await anomaly_models_collection.insert_one(doc)
+    return doc
+
+
+async def train_all(
+    days: int = 30,
+    patient_id: Optional[str] = None,
+    workers: int = 4,
+    min_samples: int = MIN_SAMPLES,
+) -> list:
+    """Train a new model version per eligible patient; returns their metadata."""
+    since = datetime.utcnow() - timedelta(days=days)
+    query = {"safe_center_lat": {"$ne": None}, "safe_center_lng": {"$ne": None}}
+    if patient_id:
+        query["_id"] = ObjectId(patient_id)
+
+    loop = asyncio.get_running_loop()
+    # Bounds feature matrices held in memory while waiting for a worker
+    slots = asyncio.Semaphore(workers * 2)
+    trained = []
+
+    async def train_one(pool, patient: dict) -> None:
+        pid = str(patient["_id"])
+        async with slots:
+            lat, lng, t = await patient_history(pid, since)
+            if len(t) < min_samples:
+                logger.info("Skipping %s: %d ping(s)", pid, len(t))
+                return
+            features = build_features(lat, lng, t, (patient["safe_center_lat"], patient["safe_center_lng"]))
+            blob = await loop.run_in_executor(pool, fit_model, features)
+        trained.append(await _save(pid, blob, len(t), since))
+        logger.info("Trained %s v%d on %d ping(s)", pid, trained[-1]["version"], len(t))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        cursor = patients_col.find(query, {"safe_center_lat": 1, "safe_center_lng": 1})
+        await asyncio.gather(*[train_one(pool, p) async for p in cursor])
+    return trained
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Train wandering models")
+    parser.add_argument("--days", type=int, default=30, help="history to train on")
+    parser.add_argument("--patient", help="only this patient")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--min-samples", type=int, default=MIN_SAMPLES)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    trained = asyncio.run(train_all(args.days, args.patient, args.workers, args.min_samples))
+    print(f"Trained {len(trained)} model(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
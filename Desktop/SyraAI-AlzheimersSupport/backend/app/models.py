@@ -1,7 +1,6 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List, Literal
+from typing import Annotated, Optional, List, Literal
 from datetime import datetime
-from bson import ObjectId
 
 
 Role = Literal["patient", "caretaker"]
@@ -33,6 +32,11 @@ class PatientCreate(BaseModel):
     safe_center_lat: float
     safe_center_lng: float
     safe_radius_m: float = 150.0
+    user_id: Optional[str] = None  # the patient's own account (role "patient"), if any
+
+
+class PatientLink(BaseModel):
+    user_id: str
 
 
 class PatientPublic(BaseModel):
@@ -42,13 +46,25 @@ class PatientPublic(BaseModel):
     safe_center_lat: float
     safe_center_lng: float
     safe_radius_m: float
+    user_id: Optional[str] = None
+
+
+class RecurrenceRule(BaseModel):
+    # see app/reminders/recurrence.py
+    freq: Literal["daily", "weekly"]
+    interval: int = Field(1, ge=1)
+    byweekday: Optional[List[Annotated[int, Field(ge=0, le=6)]]] = None  # 0 = Monday; weekly only
+    until: Optional[datetime] = None
+    count: Optional[int] = Field(None, ge=1)
+    exdates: List[datetime] = []  # skipped occurrences
 
 
 class ReminderCreate(BaseModel):
     patient_id: str
     title: str
-    when: datetime
+    when: datetime  # first occurrence of a repeating reminder
     notes: Optional[str] = None
+    repeat: Optional[RecurrenceRule] = None
 
 
 class ReminderPublic(BaseModel):
@@ -58,6 +74,36 @@ class ReminderPublic(BaseModel):
     when: datetime
     notes: Optional[str] = None
     acknowledged: bool = False
+    repeat: Optional[RecurrenceRule] = None
+    occurrence: Optional[datetime] = None  # the occurrence due, for repeating reminders
+
+
+class ReminderBatchItem(BaseModel):
+    index: int  # position in the request
+    id: Optional[str] = None  # set when created
+    error: Optional[str] = None
+
+
+class ReminderBatchResult(BaseModel):
+    received: int
+    created: int
+    results: List[ReminderBatchItem]
+
+
+class ReminderAckBatch(BaseModel):
+    ids: List[str]
+
+
+class ReminderAckItem(BaseModel):
+    id: str
+    ok: bool
+    occurrence: Optional[datetime] = None  # acknowledged occurrence of a repeating reminder
+    error: Optional[str] = None
+
+
+class ReminderAckResult(BaseModel):
+    acknowledged: int
+    results: List[ReminderAckItem]
 
 
 class MoodCreate(BaseModel):
@@ -83,21 +129,16 @@ class LocationPing(BaseModel):
 
 
 class AlertPublic(BaseModel):
-    {
-        "_id": ObjectId,
-        "patient_id": ObjectId,
-        "type": Literal["geofence_breach", "vital_spike"],
-        "subtype": Literal["heart_rate", "body_temp", "spo2", "location"],  # optional
-        "message": "High heart rate detected: 132 bpm",
-        "details": {
-            "heart_rate": 132,
-            "body_temp": 37.8,
-            "spo2": 94,
-            "distance_exceeded": 150,
-        },
-        "created_at": datetime,
-        "resolved": bool,
-    }
+    id: str
+    patient_id: str
+    type: str  # geofence_breach, vital_spike, vital_drop, sos, ...
+    subtype: Optional[str] = None  # heart_rate, body_temp, spo2, location
+    message: str
+    details: Optional[dict] = None  # e.g. {"heart_rate": 132} or {"distance_exceeded": 150}
+    created_at: datetime
+    resolved: bool = False
+    state: Optional[Literal["open", "closed"]] = None  # episode alerts only
+    closed_at: Optional[datetime] = None
 
 
 # =========================
@@ -131,6 +172,8 @@ class FamilyImagePublic(BaseModel):
     uploaded_by: str
     image_url: str
     caption: Optional[str] = None
+    content_hash: Optional[str] = None
+    variants: dict[str, str] = {}  # e.g. {"thumb": url, "medium": url}, filled in after upload
     created_at: datetime
 
 
@@ -201,3 +244,83 @@ class VitalPublic(BaseModel):
     body_temp: float
     spo2: int
     timestamp: datetime
+
+
+class VitalBatchResult(BaseModel):
+    received: int
+    inserted: int
+    alerts: int
+
+
+class VitalStats(BaseModel):
+    min: float
+    max: float
+    mean: float
+    last: float
+
+
+class VitalBucket(BaseModel):
+    start: datetime
+    count: int
+    heart_rate: VitalStats
+    body_temp: VitalStats
+    spo2: VitalStats
+
+
+class VitalSummaryStats(BaseModel):
+    min: float
+    max: float
+    mean: float
+    std: float
+
+
+class VitalRollup(BaseModel):
+    start: datetime
+    resolution: Literal["minute", "hour", "day"]
+    count: int
+    heart_rate: VitalSummaryStats
+    body_temp: VitalSummaryStats
+    spo2: VitalSummaryStats
+
+
+# =========================
+# Caretaker Overview Models
+# =========================
+class OverviewLocation(BaseModel):
+    lat: float
+    lng: float
+    timestamp: datetime
+
+
+class OverviewVitals(BaseModel):
+    heart_rate: int
+    body_temp: float
+    spo2: int
+    timestamp: datetime
+
+
+class OverviewMood(BaseModel):
+    mood: str
+    timestamp: datetime
+
+
+class OverviewAlert(BaseModel):
+    type: str
+    message: str
+    created_at: datetime
+
+
+class OverviewReminder(BaseModel):
+    id: str
+    title: str
+    when: datetime
+
+
+class PatientOverview(PatientPublic):
+    location: Optional[OverviewLocation] = None
+    vitals: Optional[OverviewVitals] = None
+    mood: Optional[OverviewMood] = None
+    open_alerts: int = 0  # open alert episodes (geofence, speed, wandering, ...)
+    latest_alert: Optional[OverviewAlert] = None  # newest open episode
+    due_reminders: int = 0
+    reminders: List[OverviewReminder] = []  # oldest due first, at most OVERVIEW_REMINDERS
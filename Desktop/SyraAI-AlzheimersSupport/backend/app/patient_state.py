@@ -0,0 +1,229 @@
+"""Latest state per patient, maintained as data is written.
+
+One patient_state document per patient (``_id`` = patient id) holds the
+newest location, vitals, mood, comfort message and family message, plus
+the number of open alert episodes (app/alerts/engine.py; one-off alerts
+such as SOS are never resolved and not counted). Write paths call ``record`` after
+storing the source document, so "latest" reads are a primary-key fetch
+instead of a sorted find_one against an ever-growing collection.
+
+An entry is only replaced by a newer one: the update filter matches while
+the stored time is older (or missing); otherwise the upsert collides with
+the existing ``_id`` and is dropped. Late or replayed writes therefore never
+move the state backwards, whichever worker process handles them.
+
+Reads fall back to the source collections for anything not recorded yet
+and store what they find; a section with no history at all is stored as
+None, so the next read does not search again. To backfill everything from history at once:
+
+    python -m app.patient_state rebuild [--patient <id>]
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from .db import (
+    alerts_collection,
+    comfort_collection,
+    family_messages_collection,
+    locations_col,
+    moods_col,
+    patient_state_collection,
+    vitals_collection,
+)
+
+# section -> (source collection, time field, fields kept besides the source _id)
+SECTIONS = {
+    "location": (locations_col, "timestamp", ("lat", "lng", "timestamp")),
+    "vitals": (vitals_collection, "timestamp", ("heart_rate", "body_temp", "spo2", "timestamp")),
+    "mood": (moods_col, "timestamp", ("mood", "note", "timestamp")),
+    "comfort": (comfort_collection, "created_at", ("message", "created_by", "created_at")),
+    "family_message": (family_messages_collection, "created_at", ("from_user", "message", "created_at")),
+}
+
+
+def _naive(dt: datetime) -> datetime:
+    # stored as naive UTC, like MongoDB hands dates back
+    if dt.tzinfo is not None:
+        return dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def _entry(section: str, doc: dict) -> dict:
+    _, time_field, fields = SECTIONS[section]
+    entry = {"id": doc["_id"], **{f: doc.get(f) for f in fields}}
+    entry[time_field] = _naive(entry[time_field])
+    return entry
+
+
+def _guarded(section: str, patient_id: ObjectId, entry: dict) -> tuple:
+    """(filter, update) setting `section` to entry unless the stored one is newer."""
+    time_field = SECTIONS[section][1]
+    return (
+        {
+            "_id": patient_id,
+            # missing or recorded as None, or older
+            "$or": [{section: None}, {f"{section}.{time_field}": {"$not": {"$gte": entry[time_field]}}}],
+        },
+        {"$set": {section: entry}},
+    )
+
+
+def _update(section: str, patient_id: ObjectId, entry: dict) -> UpdateOne:
+    return UpdateOne(*_guarded(section, patient_id, entry), upsert=True)
+
+
+def _none(section: str, patient_id: ObjectId) -> UpdateOne:
+    """Record that the patient has no `section` yet, unless one was recorded meanwhile."""
+    return UpdateOne({"_id": patient_id, section: {"$exists": False}}, {"$set": {section: None}}, upsert=True)
+
+
+async def _write(ops: List[UpdateOne]) -> None:
+    if not ops:
+        return
+    try:
+        await patient_state_collection.bulk_write(ops, ordered=False)
+    except BulkWriteError as exc:
+        # a duplicate _id means the stored entry is at least as new
+        if any(err["code"] != 11000 for err in exc.details.get("writeErrors", [])):
+            raise
+
+
+async def record(section: str, doc: dict) -> None:
+    """Make a just-stored document its patient's latest `section` unless a newer one is."""
+    try:
+        await patient_state_collection.update_one(
+            *_guarded(section, doc["patient_id"], _entry(section, doc)), upsert=True
+        )
+    except DuplicateKeyError:
+        pass
+
+
+async def record_many(section: str, docs: Iterable[dict]) -> None:
+    """record() for many documents, in one bulk write (newest per patient)."""
+    time_field = SECTIONS[section][1]
+    newest: Dict[ObjectId, dict] = {}
+    for doc in docs:
+        entry = _entry(section, doc)
+        current = newest.get(doc["patient_id"])
+        if current is None or entry[time_field] >= current[time_field]:
+            newest[doc["patient_id"]] = entry
+    await _write([_update(section, pid, entry) for pid, entry in newest.items()])
+
+
+async def add_open_alerts(deltas: Dict[ObjectId, int]) -> None:
+    """Adjust open-episode counts, e.g. {patient_id: +1} when an episode opens."""
+    ops = [
+        UpdateOne({"_id": pid}, {"$inc": {"open_alerts": delta}}, upsert=True)
+        for pid, delta in deltas.items()
+        if delta
+    ]
+    if ops:
+        await patient_state_collection.bulk_write(ops, ordered=False)
+
+
+async def _latest_from_history(section: str, ids: Optional[List[ObjectId]]) -> Dict[ObjectId, dict]:
+    """Newest source document per patient (all patients when ids is None).
+
+    The sort matches the (patient_id, time desc) indexes, so the server can
+    jump to each patient's newest document instead of grouping all of them.
+    """
+    collection, time_field, fields = SECTIONS[section]
+    match = {"patient_id": {"$in": ids}} if ids is not None else {}
+    pipeline = [
+        {"$match": match},
+        {"$sort": {"patient_id": 1, time_field: -1}},
+        {"$group": {"_id": "$patient_id", "doc_id": {"$first": "$_id"}, **{f: {"$first": f"${f}"} for f in fields}}},
+    ]
+    found = {}
+    async for d in collection.aggregate(pipeline):
+        pid = d.pop("_id")
+        d["_id"] = d.pop("doc_id")
+        found[pid] = _entry(section, d)
+    return found
+
+
+async def latest(patient_id: str, section: str) -> Optional[dict]:
+    """The patient's latest `section` entry ({"id": source _id, ...fields}), or None."""
+    return (await latest_many([ObjectId(patient_id)], (section,))).get(ObjectId(patient_id), {}).get(section)
+
+
+async def latest_many(ids: List[ObjectId], sections: Iterable[str]) -> Dict[ObjectId, dict]:
+    """{patient_id: {section: entry or None}} for the given patients, in one fetch.
+
+    Sections not recorded yet are read from history and stored, as None
+    for patients with no history.
+    """
+    sections = tuple(sections)
+    states = {
+        d.pop("_id"): d
+        async for d in patient_state_collection.find({"_id": {"$in": ids}}, {s: 1 for s in sections})
+    }
+    for section in sections:
+        missing = [pid for pid in ids if section not in states.get(pid, {})]
+        if not missing:
+            continue
+        found = await _latest_from_history(section, missing)
+        await _write([_update(section, pid, found[pid]) if pid in found else _none(section, pid) for pid in missing])
+        for pid in missing:
+            states.setdefault(pid, {})[section] = found.get(pid)
+    return states
+
+
+async def rebuild(patient_id: Optional[ObjectId] = None) -> Dict[str, int]:
+    """Recompute states from history; returns patients updated per section.
+
+    Latest entries only ever move forward, so this is safe while the API is
+    writing. Open-alert counts are recounted and overwritten: run it when few
+    alerts are being raised or closed.
+    """
+    ids = [patient_id] if patient_id else None
+    counts = {}
+    for section in SECTIONS:
+        found = await _latest_from_history(section, ids)
+        await _write([_update(section, pid, entry) for pid, entry in found.items()])
+        counts[section] = len(found)
+
+    match = {"state": "open"}
+    if patient_id:
+        match["patient_id"] = patient_id
+    open_alerts = {
+        d["_id"]: d["count"]
+        async for d in alerts_collection.aggregate(
+            [{"$match": match}, {"$group": {"_id": "$patient_id", "count": {"$sum": 1}}}]
+        )
+    }
+    reset = {"open_alerts": {"$ne": 0}}
+    if patient_id:
+        reset["_id"] = patient_id
+    await patient_state_collection.update_many(reset, {"$set": {"open_alerts": 0}})
+    ops = [UpdateOne({"_id": pid}, {"$set": {"open_alerts": n}}, upsert=True) for pid, n in open_alerts.items()]
+    if ops:
+        await patient_state_collection.bulk_write(ops, ordered=False)
+    counts["open_alerts"] = len(ops)
+    return counts
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Maintain per-patient latest state")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rb = sub.add_parser("rebuild", help="recompute latest state from history")
+    rb.add_argument("--patient", help="only this patient")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    counts = asyncio.run(rebuild(ObjectId(args.patient) if args.patient else None))
+    for section, n in counts.items():
+        print(f"{section}: {n} patient(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
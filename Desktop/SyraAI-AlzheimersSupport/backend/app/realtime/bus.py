@@ -0,0 +1,261 @@
+"""Event bus feeding real-time consumers (the live dashboard hub, ...).
+
+Writers call ``await publish_event(kind, doc)`` (or ``publish_events`` for
+several documents) after a write; what is published is decided there, the
+same way in every mode. What happens next depends on EVENT_BUS:
+
+* ``memory``: the event is dispatched to local subscribers right away. Only
+  this worker process sees it; fine for a single worker and for tests.
+* ``change_stream``: the event is inserted into the ``events`` collection
+  and every worker dispatches what it sees on that collection's change
+  stream, so an alert written by one worker reaches dashboards connected
+  to any other. Needs a replica set or sharded cluster.
+* ``polling``: like change_stream, but every worker tails the ``events``
+  collection by _id every EVENT_BUS_POLL_SECONDS. Works on a standalone
+  server.
+* ``auto``: change streams when the deployment supports them, else polling.
+
+Events expire from the collection after EVENT_RETENTION_SECONDS (a TTL
+index, app/indexes.py); they are only needed until every worker saw them.
+"""
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterable, List
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure, PyMongoError
+
+from ..config import settings
+from ..db import events_collection
+from .hub import hub, to_event
+
+logger = logging.getLogger(__name__)
+
+# change stream resume token is too old to resume from
+CHANGE_STREAM_HISTORY_LOST = 286
+
+Handler = Callable[[dict], None]
+
+
+class EventBus:
+    mode = "base"
+
+    def __init__(self):
+        self._handlers: List[Handler] = []
+        self._dispatched = 0
+
+    def subscribe(self, handler: Handler) -> Handler:
+        """Call handler(event) for every event; must not block."""
+        self._handlers.append(handler)
+        return handler
+
+    def unsubscribe(self, handler: Handler) -> None:
+        if handler in self._handlers:
+            self._handlers.remove(handler)
+
+    async def publish(self, kind: str, docs: List[dict]) -> None:
+        raise NotImplementedError
+
+    def _dispatch(self, kind: str, doc: dict) -> None:
+        event = to_event(kind, doc)
+        self._dispatched += 1
+        for handler in list(self._handlers):
+            try:
+                handler(event)
+            except Exception:
+                logger.exception("Event handler %r failed", handler)
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"mode": self.mode, "handlers": len(self._handlers), "dispatched": self._dispatched}
+
+
+class InMemoryEventBus(EventBus):
+    mode = "memory"
+
+    async def publish(self, kind: str, docs: List[dict]) -> None:
+        for doc in docs:
+            self._dispatch(kind, doc)
+
+
+class PollingEventBus(EventBus):
+    """Tails the events collection by _id for events from any worker.
+
+    ObjectIds from different clients are only roughly ordered, so each poll
+    looks back `lookback` before the newest id seen and skips ids it has
+    already dispatched.
+    """
+
+    mode = "polling"
+
+    def __init__(
+        self,
+        collection=events_collection,
+        interval: float = 1.0,
+        lookback: timedelta = timedelta(seconds=5),
+        batch_size: int = 1000,
+    ):
+        super().__init__()
+        self.collection = collection
+        self.interval = interval
+        self.lookback = lookback
+        self.batch_size = batch_size
+        self._tasks: List[asyncio.Task] = []
+        self._seen_order: deque = deque(maxlen=50_000)
+        self._seen: set = set()
+        self._publish_failed = 0
+
+    async def publish(self, kind: str, docs: List[dict]) -> None:
+        if not docs:
+            return
+        now = datetime.now(timezone.utc)
+        events = [{"kind": kind, "patient_id": doc.get("patient_id"), "doc": doc, "created_at": now} for doc in docs]
+        try:
+            await self.collection.insert_many(events, ordered=False)
+        except PyMongoError:
+            # The write being announced is already stored; dashboards
+            # catch up from the REST API
+            self._publish_failed += len(events)
+            logger.exception("Could not publish %d %s event(s)", len(events), kind)
+
+    async def start(self) -> None:
+        if not self._tasks:
+            self._tasks.append(asyncio.create_task(self._poll_loop()))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {**super().stats(), "publish_failed": self._publish_failed}
+
+    def _remember(self, _id: ObjectId) -> None:
+        if len(self._seen_order) == self._seen_order.maxlen:
+            self._seen.discard(self._seen_order[0])
+        self._seen_order.append(_id)
+        self._seen.add(_id)
+
+    def _dispatch_event(self, event: dict) -> None:
+        self._dispatch(event["kind"], event["doc"])
+
+    async def _poll_once(self, since: datetime) -> datetime:
+        """Dispatch events not seen yet; returns the new `since` position.
+
+        Positions are naive UTC datetimes, as ObjectId generation times.
+        """
+        query = {"_id": {"$gt": ObjectId.from_datetime(since - self.lookback)}}
+        newest = since
+        # Keyset pages: the next page starts after the last event returned,
+        # seen or not, so a burst larger than one page within the look-back
+        # window cannot pin every poll to the same page
+        while True:
+            cursor = self.collection.find(query).sort("_id", 1).limit(self.batch_size)
+            returned = 0
+            async for event in cursor:
+                returned += 1
+                query = {"_id": {"$gt": event["_id"]}}
+                if event["_id"] in self._seen:
+                    continue
+                self._remember(event["_id"])
+                newest = max(newest, event["_id"].generation_time.replace(tzinfo=None))
+                self._dispatch_event(event)
+            if returned < self.batch_size:
+                return newest
+
+    async def _poll_loop(self) -> None:
+        since = datetime.now(timezone.utc).replace(tzinfo=None)
+        while True:
+            try:
+                since = await self._poll_once(since)
+            except asyncio.CancelledError:
+                raise
+            except PyMongoError:
+                logger.exception("Event bus poll failed")
+            await asyncio.sleep(self.interval)
+
+
+class ChangeStreamEventBus(PollingEventBus):
+    """Dispatches events inserted into the events collection, from its change stream.
+
+    The stream is reopened after errors from the last resume token, so
+    transient failovers lose no events. With fallback=True a deployment
+    without change streams (standalone mongod) uses polling instead.
+    """
+
+    mode = "change_stream"
+
+    def __init__(self, collection=events_collection, fallback: bool = False, **kwargs):
+        super().__init__(collection, **kwargs)
+        self.fallback = fallback
+        self._resume_token = None
+
+    async def _supports_change_streams(self) -> bool:
+        hello = await self.collection.database.client.admin.command("hello")
+        return "setName" in hello or hello.get("msg") == "isdbgrid"
+
+    async def start(self) -> None:
+        if self._tasks:
+            return
+        if not await self._supports_change_streams():
+            if not self.fallback:
+                raise RuntimeError("EVENT_BUS=change_stream needs a replica set or sharded cluster")
+            logger.info("Change streams unavailable, event bus falls back to polling")
+            self.mode = "polling"
+            await super().start()
+            return
+        self._tasks.append(asyncio.create_task(self._watch_loop()))
+
+    async def _watch_loop(self) -> None:
+        while True:
+            try:
+                async with self.collection.watch(
+                    [{"$match": {"operationType": "insert"}}], resume_after=self._resume_token
+                ) as stream:
+                    async for change in stream:
+                        self._resume_token = stream.resume_token
+                        self._dispatch_event(change["fullDocument"])
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as exc:
+                if exc.code == CHANGE_STREAM_HISTORY_LOST:
+                    logger.warning("Change stream history lost, restarting from now")
+                    self._resume_token = None
+                else:
+                    logger.exception("Change stream failed")
+                await asyncio.sleep(1)
+            except PyMongoError:
+                logger.exception("Change stream failed")
+                await asyncio.sleep(1)
+
+
+def create_event_bus(mode: str) -> EventBus:
+    if mode == "memory":
+        return InMemoryEventBus()
+    if mode == "polling":
+        return PollingEventBus(interval=settings.EVENT_BUS_POLL_SECONDS)
+    if mode in ("change_stream", "auto"):
+        return ChangeStreamEventBus(fallback=mode == "auto", interval=settings.EVENT_BUS_POLL_SECONDS)
+    raise ValueError(f"Unknown EVENT_BUS mode: {mode}")
+
+
+event_bus = create_event_bus(settings.EVENT_BUS)
+event_bus.subscribe(hub.publish)
+
+
+async def publish_event(kind: str, doc: dict) -> None:
+    """Announce a document the caller has just written."""
+    await event_bus.publish(kind, [doc])
+
+
+async def publish_events(kind: str, docs: Iterable[dict]) -> None:
+    """Announce several written documents of one kind (one insert when shared)."""
+    await event_bus.publish(kind, list(docs))
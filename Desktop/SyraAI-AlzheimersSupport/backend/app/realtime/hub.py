@@ -0,0 +1,96 @@
+"""In-process fan-out of patient events to live dashboard connections.
+
+The event bus (app.realtime.bus) hands every event to ``hub.publish``;
+each subscription watching that patient gets it on its own bounded queue.
+A client that cannot keep up never slows the publisher: when its queue is
+full the backlog is discarded and replaced by a single ``resync`` event,
+telling the client to re-fetch current state over the REST API.
+"""
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional, Set
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+from ..config import settings
+
+# Event kinds sent to clients
+KINDS = ("location", "vitals", "alert", "mood", "reminder")
+
+
+def to_event(kind: str, doc: dict) -> dict:
+    """JSON-ready event for a stored document (ObjectIds become strings)."""
+    data = jsonable_encoder(doc, custom_encoder={ObjectId: str})
+    if "_id" in data:
+        data["id"] = data.pop("_id")
+    return {
+        "type": kind,
+        "patient_id": data.get("patient_id"),
+        "data": data,
+        "at": datetime.now(timezone.utc).isoformat(),
+    }
+
+
+class Subscription:
+    def __init__(self, patient_ids: Iterable[str], maxsize: int):
+        self.patient_ids: Set[str] = set(patient_ids)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def offer(self, event: dict) -> None:
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            dropped = self.queue.qsize()
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.dropped += dropped
+            self.queue.put_nowait({"type": "resync", "dropped": dropped})
+            self.queue.put_nowait(event)
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[dict]:
+        """Next event, or None if nothing arrived within timeout seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Hub:
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._subs: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._published = 0
+
+    def subscribe(self, patient_ids: Iterable[str]) -> Subscription:
+        sub = Subscription(patient_ids, self.queue_size)
+        for pid in sub.patient_ids:
+            self._subs[pid].add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        for pid in sub.patient_ids:
+            subs = self._subs.get(pid)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[pid]
+
+    def publish(self, event: dict) -> None:
+        self._published += 1
+        for sub in self._subs.get(event.get("patient_id"), ()):
+            sub.offer(event)
+
+    def stats(self) -> dict:
+        subs = {s for group in self._subs.values() for s in group}
+        return {
+            "subscriptions": len(subs),
+            "patients_watched": len(self._subs),
+            "published": self._published,
+            "dropped": sum(s.dropped for s in subs),
+        }
+
+
+hub = Hub(queue_size=settings.LIVE_QUEUE_SIZE)
@@ -0,0 +1,61 @@
+"""Which reminders are due, shared by /reminders/due and the patients overview.
+
+One-off reminders are due from their time until acknowledged. A repeating
+reminder is due once per occurrence since `since` that has not been
+acknowledged in reminder_acks; occurrences are expanded from the rule
+(app/reminders/recurrence.py), never stored.
+"""
+from datetime import datetime
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+from ..db import reminder_acks_collection, reminders_col
+from .recurrence import aware, occurrences
+
+# Most occurrences of one repeating reminder listed as due
+MAX_DUE_OCCURRENCES = 100
+
+Due = Tuple[dict, Optional[datetime]]
+
+
+async def due_reminders(
+    patient_ids: List[ObjectId], since: datetime, now: datetime
+) -> Dict[ObjectId, List[Due]]:
+    """{patient_id: [(reminder, occurrence)]}, oldest first.
+
+    `occurrence` is None for one-off reminders. Two queries whatever the
+    number of patients: the reminders, then the acks of the repeating ones.
+    """
+    since, now = aware(since), aware(now)
+    one_off: List[Due] = []
+    repeating: List[dict] = []
+    async for d in reminders_col.find(
+        {"patient_id": {"$in": patient_ids}, "when": {"$lte": now}, "acknowledged": False}
+    ):
+        if d.get("repeat"):
+            repeating.append(d)
+        else:
+            one_off.append((d, None))
+
+    expanded: List[Due] = []
+    if repeating:
+        acked = {
+            (a["reminder_id"], aware(a["occurrence"]))
+            async for a in reminder_acks_collection.find(
+                {"reminder_id": {"$in": [d["_id"] for d in repeating]}, "occurrence": {"$gte": since, "$lte": now}},
+                {"reminder_id": 1, "occurrence": 1},
+            )
+        }
+        for d in repeating:
+            for occurrence in islice(occurrences(d["repeat"], d["when"], since), MAX_DUE_OCCURRENCES):
+                if occurrence > now:
+                    break
+                if (d["_id"], occurrence) not in acked:
+                    expanded.append((d, occurrence))
+
+    due: Dict[ObjectId, List[Due]] = {}
+    for d, occurrence in sorted(one_off + expanded, key=lambda item: item[1] or aware(item[0]["when"])):
+        due.setdefault(d["patient_id"], []).append((d, occurrence))
+    return due
@@ -0,0 +1,100 @@
+"""Recurrence rules for reminders.
+
+A repeating reminder is stored once, with its first occurrence in ``when``
+and a rule in ``repeat`` (a subset of iCalendar RRULE):
+
+* ``freq``: "daily" or "weekly", every ``interval`` days or weeks
+* ``byweekday``: for weekly rules, the weekdays it falls on (0 = Monday);
+  by default the weekday of the first occurrence
+* ``until`` (inclusive) and/or ``count``: when the series ends
+* ``exdates``: occurrences that are skipped (they still count towards
+  ``count``, as in RRULE)
+
+Occurrences are never stored; they are computed on demand for the window
+being looked at, jumping straight to it rather than walking the series from
+its start. They are computed in UTC, so a daily reminder fires at the same
+UTC time every day.
+"""
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Iterator, Optional
+
+STEP = {"daily": timedelta(days=1), "weekly": timedelta(weeks=1)}
+
+
+def aware(dt: Optional[datetime]) -> Optional[datetime]:
+    # MongoDB hands back naive UTC datetimes
+    if dt is not None and dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def stored(dt: datetime) -> datetime:
+    # BSON dates have millisecond precision; compare with what was stored
+    dt = aware(dt)
+    return dt.replace(microsecond=dt.microsecond // 1000 * 1000)
+
+
+def occurrences(rule: dict, start: datetime, since: Optional[datetime] = None) -> Iterator[datetime]:
+    """Occurrences of `rule` first occurring at `start`, from `since` on, in order.
+
+    Unbounded for rules without until/count: consumers stop at the end of
+    their window.
+    """
+    start = stored(start)
+    since = max(aware(since), start) if since is not None else start
+    period = STEP[rule["freq"]] * rule.get("interval", 1)
+    until = aware(rule.get("until"))
+    count = rule.get("count")
+    exdates = {stored(d) for d in rule.get("exdates") or ()}
+
+    days = rule.get("byweekday") if rule["freq"] == "weekly" else None
+    if days:
+        # one block per period, starting on the Monday of start's week
+        week0 = start - timedelta(days=start.weekday())
+        offsets = [timedelta(days=d) for d in sorted(set(days))]
+        in_first = sum(1 for off in offsets if week0 + off >= start)
+    else:
+        week0, offsets, in_first = start, [timedelta(0)], 1
+
+    # jump to the block containing `since`; n counts the occurrences before it
+    block = max(0, math.floor((since - week0) / period))
+    n = in_first + (block - 1) * len(offsets) if block else 0
+    while True:
+        base = week0 + period * block
+        for off in offsets:
+            occurrence = base + off
+            if occurrence < start:
+                continue
+            if (count is not None and n >= count) or (until is not None and occurrence > until):
+                return
+            n += 1
+            if occurrence >= since and occurrence not in exdates:
+                yield occurrence
+        block += 1
+
+
+def next_occurrence(rule: dict, start: datetime, after: datetime) -> Optional[datetime]:
+    """First occurrence strictly after `after`, or None when the series has ended."""
+    after = aware(after)
+    for occurrence in occurrences(rule, start, after):
+        if occurrence > after:
+            return occurrence
+    return None
+
+
+def previous_occurrence(rule: dict, start: datetime, at: datetime) -> Optional[datetime]:
+    """Latest occurrence at or before `at` within the last two periods, if any."""
+    at = aware(at)
+    period = STEP[rule["freq"]] * rule.get("interval", 1)
+    latest = None
+    for occurrence in occurrences(rule, start, at - 2 * period):
+        if occurrence > at:
+            break
+        latest = occurrence
+    return latest
+
+
+def is_occurrence(rule: dict, start: datetime, at: datetime) -> bool:
+    at = stored(at)
+    return next(occurrences(rule, start, at), None) == at
@@ -0,0 +1,179 @@
+"""Fires reminders at their time instead of waiting for devices to poll.
+
+Every reminder document carries ``next_at``, the next time it should fire
+(None once it never will again). The scheduler keeps the reminders due
+within REMINDER_LOOKAHEAD_MINUTES in a heap ordered by ``next_at`` and
+sleeps until the earliest one, or until a newly created reminder is due
+sooner. The window is reloaded from the reminders collection every half
+look-ahead, so reminders created by other workers, and anything missed
+while the server was down, are picked up again after a restart.
+
+Firing claims the occurrence with a conditional update on ``next_at``: when
+several workers schedule the same reminder only one of them fires it.
+The firing worker stores a reminder_fires document and publishes a
+"reminder" event, which reaches the patient's devices over /live (with any
+EVENT_BUS mode). A repeating reminder then moves ``next_at`` on to its next
+occurrence (app/reminders/recurrence.py); occurrences acknowledged ahead of
+time are not pushed. Occurrences missed by more than
+REMINDER_MISSED_GRACE_MINUTES are skipped rather than pushed late.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+
+from ..config import settings
+from ..db import reminder_acks_collection, reminder_fires_collection, reminders_col
+from ..realtime.bus import publish_event
+from .recurrence import aware, next_occurrence, stored
+
+logger = logging.getLogger(__name__)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class ReminderScheduler:
+    def __init__(self, lookahead: timedelta, grace: timedelta):
+        self.lookahead = lookahead
+        self.grace = grace
+        self._heap: List[Tuple[datetime, int, ObjectId]] = []
+        # reminder id -> the fire time it is scheduled for; heap entries that
+        # no longer match are stale and skipped
+        self._scheduled: Dict[ObjectId, datetime] = {}
+        self._seq = itertools.count()
+        self._loaded_until: Optional[datetime] = None
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._fired = 0
+        self._skipped = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def schedule(self, reminder_id: ObjectId, at: Optional[datetime]) -> None:
+        """(Re)schedule a reminder written by this worker; None unschedules it."""
+        if at is None:
+            self._scheduled.pop(reminder_id, None)
+            return
+        at = stored(at)
+        # beyond the loaded window the next reload picks it up
+        if self._loaded_until is None or at > self._loaded_until:
+            return
+        if self._scheduled.get(reminder_id) == at:
+            return
+        self._scheduled[reminder_id] = at
+        heapq.heappush(self._heap, (at, next(self._seq), reminder_id))
+        if self._heap[0][2] == reminder_id:
+            self._wake.set()
+
+    async def _reload(self, now: datetime) -> None:
+        horizon = now + self.lookahead
+        cursor = reminders_col.find({"next_at": {"$lte": horizon}}, {"next_at": 1})
+        self._loaded_until = horizon
+        async for d in cursor:
+            self.schedule(d["_id"], d["next_at"])
+
+    async def _fire(self, reminder_id: ObjectId, at: datetime, now: datetime) -> None:
+        doc = await reminders_col.find_one({"_id": reminder_id})
+        if doc is None or aware(doc.get("next_at")) != at:
+            return  # deleted or rescheduled meanwhile
+        rule = doc.get("repeat")
+        claim = {"_id": reminder_id, "next_at": doc["next_at"]}
+
+        if rule:
+            following = next_occurrence(rule, doc["when"], max(at, now - self.grace))
+            update = {"next_at": following, "last_fired_at": at}
+        else:
+            following = None
+            update = {"next_at": None, "last_fired_at": at}
+            if doc.get("acknowledged"):
+                # acknowledged ahead of time: nothing to remind about
+                await reminders_col.update_one(claim, {"$set": {"next_at": None}})
+                return
+            claim["acknowledged"] = False
+
+        result = await reminders_col.update_one(claim, {"$set": update})
+        if not result.modified_count:
+            return  # another worker fired it
+        self.schedule(reminder_id, following)
+
+        if now - at > self.grace or (
+            rule and await reminder_acks_collection.find_one({"reminder_id": reminder_id, "occurrence": at})
+        ):
+            self._skipped += 1
+            return
+        fire = {
+            "reminder_id": reminder_id,
+            "patient_id": doc["patient_id"],
+            "title": doc["title"],
+            "notes": doc.get("notes"),
+            "occurrence": at,
+            "fired_at": now,
+        }
+        await reminder_fires_collection.insert_one(fire)
+        await publish_event("reminder", fire)
+        self._fired += 1
+
+    async def _run(self) -> None:
+        next_reload = _now()
+        while True:
+            self._wake.clear()
+            now = _now()
+            if now >= next_reload:
+                try:
+                    await self._reload(now)
+                except Exception:
+                    logger.exception("Could not load upcoming reminders")
+                next_reload = now + self.lookahead / 2
+
+            while self._heap and self._heap[0][0] <= now:
+                at, _, reminder_id = heapq.heappop(self._heap)
+                if self._scheduled.get(reminder_id) != at:
+                    continue
+                del self._scheduled[reminder_id]
+                try:
+                    await self._fire(reminder_id, at, now)
+                except Exception:
+                    # still stored with this next_at: the next reload retries it
+                    logger.exception("Could not fire reminder %s", reminder_id)
+
+            wake_at = min(self._heap[0][0], next_reload) if self._heap else next_reload
+            try:
+                await asyncio.wait_for(self._wake.wait(), max((wake_at - _now()).total_seconds(), 0))
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._wake = asyncio.Event()  # bound to the running loop
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._heap.clear()
+        self._scheduled.clear()
+        self._loaded_until = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "scheduled": len(self._scheduled),
+            "fired": self._fired,
+            "skipped": self._skipped,
+        }
+
+
+reminder_scheduler = ReminderScheduler(
+    lookahead=timedelta(minutes=settings.REMINDER_LOOKAHEAD_MINUTES),
+    grace=timedelta(minutes=settings.REMINDER_MISSED_GRACE_MINUTES),
+)
@@ -0,0 +1,251 @@
+"""Per-patient vitals rollups maintained as readings arrive.
+
+Every stored reading is folded into one minute, one hour and one day
+document per patient holding count, sum, sum of squares, min and max of
+each vital, so summaries over weeks read a few hundred documents instead
+of every raw sample.
+
+Readings are accumulated in memory and written every ROLLUP_FLUSH_SECONDS
+as one unordered bulk of ``$inc``/``$min``/``$max`` upserts; a burst of
+readings for one patient costs three updates, not three per reading.
+Buckets a flush could not write are merged back and retried on the next
+one, up to FLUSH_RETRIES times. Rollups lost to a crash between flushes (or written before this existed)
+are recomputed from the raw readings with:
+
+    python -m app.rollups rebuild [--days 30] [--patient <id>]
+"""
+import argparse
+import asyncio
+import logging
+import math
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from .config import settings
+from .db import vitals_collection, vitals_rollups_collection
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("heart_rate", "body_temp", "spo2")
+# resolution -> bucket length in seconds
+RESOLUTIONS: Dict[str, int] = {"minute": 60, "hour": 3600, "day": 86400}
+
+EPOCH = datetime(1970, 1, 1)
+
+# Failed flushes in a row after which the unwritten buckets are dropped
+# (rebuild recovers them) rather than held in memory indefinitely
+FLUSH_RETRIES = 5
+
+Key = Tuple[ObjectId, str, datetime]
+
+
+def bucket_start(ts: datetime, seconds: int) -> datetime:
+    """Start of the epoch-aligned bucket containing ts, as naive UTC."""
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    offset = int((ts - EPOCH).total_seconds()) // seconds * seconds
+    return EPOCH + timedelta(seconds=offset)
+
+
+def summarize(doc: dict) -> dict:
+    """min/max/mean/std of each vital from a rollup document."""
+    count = doc["count"]
+    out = {"start": doc["start"], "resolution": doc["resolution"], "count": count}
+    for field in FIELDS:
+        stats = doc[field]
+        mean = stats["sum"] / count
+        variance = max(stats["sumsq"] / count - mean * mean, 0.0)
+        out[field] = {
+            "min": stats["min"],
+            "max": stats["max"],
+            "mean": mean,
+            "std": math.sqrt(variance),
+        }
+    return out
+
+
+class RollupBuffer:
+    def __init__(self, collection=vitals_rollups_collection, flush_interval: float = 5.0):
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self._pending: Dict[Key, dict] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._flushes = 0
+        self._written = 0
+        self._failed_flushes = 0
+        self._dropped = 0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def _bucket(self, key: Key) -> dict:
+        acc = self._pending.get(key)
+        if acc is None:
+            acc = self._pending[key] = {"count": 0}
+            for field in FIELDS:
+                acc[field] = {"sum": 0.0, "sumsq": 0.0, "min": math.inf, "max": -math.inf}
+        return acc
+
+    def _merge(self, key: Key, other: dict) -> None:
+        """Fold an unwritten bucket back into the pending ones."""
+        acc = self._bucket(key)
+        acc["count"] += other["count"]
+        for field in FIELDS:
+            stats, more = acc[field], other[field]
+            stats["sum"] += more["sum"]
+            stats["sumsq"] += more["sumsq"]
+            stats["min"] = min(stats["min"], more["min"])
+            stats["max"] = max(stats["max"], more["max"])
+
+    def _fold(self, doc: dict) -> None:
+        for resolution, seconds in RESOLUTIONS.items():
+            acc = self._bucket((doc["patient_id"], resolution, bucket_start(doc["timestamp"], seconds)))
+            acc["count"] += 1
+            for field in FIELDS:
+                value = doc[field]
+                stats = acc[field]
+                stats["sum"] += value
+                stats["sumsq"] += value * value
+                stats["min"] = min(stats["min"], value)
+                stats["max"] = max(stats["max"], value)
+
+    async def add(self, docs: Iterable[dict]) -> None:
+        """Fold stored readings into the rollups."""
+        for doc in docs:
+            self._fold(doc)
+        if not self.running:
+            # No flusher (CLI, tests): write straight away
+            await self.flush()
+
+    def _ops(self, pending: Dict[Key, dict]) -> List[UpdateOne]:
+        ops = []
+        for (patient_id, resolution, start), acc in pending.items():
+            inc = {"count": acc["count"]}
+            low, high = {}, {}
+            for field in FIELDS:
+                stats = acc[field]
+                inc[f"{field}.sum"] = stats["sum"]
+                inc[f"{field}.sumsq"] = stats["sumsq"]
+                low[f"{field}.min"] = stats["min"]
+                high[f"{field}.max"] = stats["max"]
+            ops.append(
+                UpdateOne(
+                    {"patient_id": patient_id, "resolution": resolution, "start": start},
+                    {"$inc": inc, "$min": low, "$max": high},
+                    upsert=True,
+                )
+            )
+        return ops
+
+    async def flush(self) -> None:
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        keys = list(pending)
+        try:
+            await self.collection.bulk_write(self._ops(pending), ordered=False)
+        except BulkWriteError as exc:
+            # Unordered: everything but the reported ops was applied
+            failed = [keys[err["index"]] for err in exc.details.get("writeErrors", [])]
+            self._written += len(keys) - len(failed)
+            self._retry({key: pending[key] for key in failed})
+            return
+        except Exception:
+            self._retry(pending)
+            return
+        self._flushes += 1
+        self._failed_flushes = 0
+        self._written += len(pending)
+
+    def _retry(self, failed: Dict[Key, dict]) -> None:
+        self._failed_flushes += 1
+        if self._failed_flushes > FLUSH_RETRIES:
+            # Rebuild from raw readings recovers these; keep serving
+            logger.exception("Dropping %d vitals rollup(s) after %d failed writes", len(failed), FLUSH_RETRIES + 1)
+            self._dropped += len(failed)
+            self._failed_flushes = 0
+            return
+        logger.exception("Could not write %d vitals rollup(s), retrying", len(failed))
+        for key, acc in failed.items():
+            self._merge(key, acc)
+
+    async def _flusher(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._flusher())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "pending": len(self._pending),
+            "flushes": self._flushes,
+            "written": self._written,
+            "dropped": self._dropped,
+        }
+
+
+vitals_rollups = RollupBuffer(flush_interval=settings.ROLLUP_FLUSH_SECONDS)
+
+
+async def rebuild(since: datetime, patient_id: Optional[ObjectId] = None, batch_size: int = 10000) -> int:
+    """Recompute rollups from raw readings from the start of since's day on.
+
+    Returns the number of readings replayed. Run it while the affected
+    patients are not sending readings, or the newest buckets may count a
+    reading twice.
+    """
+    since = bucket_start(since, RESOLUTIONS["day"])
+    query = {"start": {"$gte": since}}
+    if patient_id:
+        query["patient_id"] = patient_id
+    await vitals_rollups_collection.delete_many(query)
+
+    buffer = RollupBuffer()
+    raw = {"timestamp": {"$gte": since}}
+    if patient_id:
+        raw["patient_id"] = patient_id
+    projection = {"_id": 0, "patient_id": 1, "timestamp": 1, **{field: 1 for field in FIELDS}}
+    replayed = 0
+    async for doc in vitals_collection.find(raw, projection):
+        buffer._fold(doc)
+        replayed += 1
+        if replayed % batch_size == 0:
+            await buffer.flush()
+    await buffer.flush()
+    return replayed
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Vitals rollup maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rb = sub.add_parser("rebuild", help="recompute rollups from raw readings")
+    rb.add_argument("--days", type=int, default=30, help="how far back to rebuild")
+    rb.add_argument("--patient", type=ObjectId, help="only this patient")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    since = datetime.utcnow() - timedelta(days=args.days)
+    replayed = asyncio.run(rebuild(since, args.patient))
+    print(f"Rebuilt rollups from {replayed} reading(s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,7 +2,7 @@ from fastapi import APIRouter, HTTPException, Depends
 from pydantic import EmailStr
 from bson import ObjectId
 from ..db import users_col
-from ..auth import hash_password, verify_password, create_access_token
+from ..auth import hash_password_async, verify_password_async, create_access_token
 from ..models import UserCreate, TokenResponse, UserPublic
 
 router = APIRouter(prefix="/auth", tags=["auth"])
@@ -22,7 +22,7 @@ async def register(user: UserCreate):
         raise HTTPException(400, "Email already registered")
     doc = {
         "email": user.email,
-        "password": hash_password(user.password),
+        "password": await hash_password_async(user.password),
         "name": user.name,
         "role": user.role,
     }
@@ -38,7 +38,7 @@ async def register(user: UserCreate):
 @router.post("/login", response_model=TokenResponse)
 async def login(credentials: LoginRequest):
     user = await users_col.find_one({"email": credentials.email})
-    if not user or not verify_password(credentials.password, user["password"]):
+    if not user or not await verify_password_async(credentials.password, user["password"]):
         raise HTTPException(401, "Invalid credentials")
 
     token = create_access_token({"sub": str(user["_id"]), "role": user["role"]})
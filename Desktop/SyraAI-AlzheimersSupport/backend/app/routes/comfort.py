@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from datetime import datetime
 from bson import ObjectId
 from app.db import comfort_collection
+from app import patient_state
 from app.models import ComfortMessageCreate, ComfortMessagePublic
 from app.auth import get_current_user, require_role
 
@@ -19,6 +20,7 @@ async def add_message(
         "created_at": datetime.utcnow(),
     }
     result = await comfort_collection.insert_one(doc)
+    await patient_state.record("comfort", doc)
     return ComfortMessagePublic(
         id=str(result.inserted_id),
         patient_id=data.patient_id,
@@ -30,14 +32,12 @@ async def add_message(
 
 @router.get("/{patient_id}", response_model=ComfortMessagePublic)
 async def get_latest_message(patient_id: str, current_user=Depends(get_current_user)):
-    msg = await comfort_collection.find_one(
-        {"patient_id": ObjectId(patient_id)}, sort=[("created_at", -1)]
-    )
+    msg = await patient_state.latest(patient_id, "comfort")
     if not msg:
         raise HTTPException(status_code=404, detail="No comforting message found")
     return ComfortMessagePublic(
-        id=str(msg["_id"]),
-        patient_id=str(msg["patient_id"]),
+        id=str(msg["id"]),
+        patient_id=patient_id,
         message=msg["message"],
         created_by=str(msg["created_by"]),
         created_at=msg["created_at"],
@@ -1,64 +1,221 @@
-from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    UploadFile,
+    File,
+    Form,
+    Depends,
+    HTTPException,
+    Request,
+    Response,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
 from datetime import datetime
 from bson import ObjectId
-import os, shutil
+from pathlib import Path
+from typing import AsyncIterator
+import logging
+from app.config import settings
+from app.access import can_access
 from app.db import family_images_collection
 from app.models import FamilyImagePublic
 from app.auth import get_current_user, require_role
+from app.blobstore import BLOB_NAME, BlobTooLarge, family_blobs
+from app.utils.images import make_variants
 
 router = APIRouter(prefix="/family", tags=["Family Images"])
+logger = logging.getLogger(__name__)
 
-UPLOAD_DIR = "static/family_images"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# Blobs are content-addressed, so a URL always names the same bytes
+BLOB_URL = "/api/family/blobs"
+BLOB_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+CHUNK_SIZE = 1024 * 1024
+EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+}
+
+
+def _extension(content_type: str | None, filename: str | None = None) -> str:
+    suffix = Path(filename or "").suffix.lower()
+    if suffix in EXTENSIONS.values() or suffix == ".jpeg":
+        return ".jpg" if suffix == ".jpeg" else suffix
+    if content_type in EXTENSIONS:
+        return EXTENSIONS[content_type]
+    raise HTTPException(415, "Only JPEG, PNG, GIF and WebP images are accepted")
+
+
+async def _save_stream(chunks: AsyncIterator[bytes], ext: str) -> tuple[str, str, int]:
+    """Store an upload in the blob store; returns (content_hash, filename, size)."""
+    try:
+        content_hash, size = await family_blobs.put_stream(chunks, ext, settings.MAX_IMAGE_BYTES)
+    except BlobTooLarge:
+        raise HTTPException(413, f"Image larger than {settings.MAX_IMAGE_BYTES} bytes")
+    if size == 0:
+        raise HTTPException(400, "Empty upload")
+    return content_hash, f"{content_hash}{ext}", size
+
+
+async def _generate_variants(image_id: ObjectId, filename: str) -> None:
+    """Background task: build resized WebP variants and record their URLs."""
+    src = family_blobs.path(filename)
+    try:
+        variants = await run_in_threadpool(make_variants, src, src.parent, Path(filename).stem)
+    except Exception:
+        logger.exception("Could not create variants for %s", filename)
+        return
+    urls = {name: f"{BLOB_URL}/{fname}" for name, fname in variants.items()}
+    await family_images_collection.update_one({"_id": image_id}, {"$set": {"variants": urls}})
+
+
+async def _check_access(patient_id, user: dict) -> None:
+    """404 unless the user is the patient's caretaker or the patient (app/access.py)."""
+    if not await can_access(user, str(patient_id)):
+        raise HTTPException(404, "Patient not found")
+
+
+def _public(img: dict) -> FamilyImagePublic:
+    return FamilyImagePublic(
+        id=str(img["_id"]),
+        patient_id=str(img["patient_id"]),
+        uploaded_by=str(img["uploaded_by"]),
+        image_url=img["image_url"],
+        caption=img.get("caption"),
+        content_hash=img.get("content_hash"),
+        variants=img.get("variants", {}),
+        created_at=img["created_at"],
+    )
+
+
+async def _record_upload(
+    patient_id: str,
+    caption: str | None,
+    uploaded_by,
+    content_hash: str,
+    filename: str,
+    size: int,
+    background_tasks: BackgroundTasks,
+) -> FamilyImagePublic:
+    # The same photo uploaded twice for a patient is returned, not duplicated
+    existing = await family_images_collection.find_one(
+        {"patient_id": ObjectId(patient_id), "content_hash": content_hash}
+    )
+    if existing:
+        return _public(existing)
+
+    # Another patient may already reference this blob (and its variants)
+    other = await family_images_collection.find_one(
+        {"content_hash": content_hash, "variants.thumb": {"$exists": True}}, {"variants": 1}
+    )
+    doc = {
+        "patient_id": ObjectId(patient_id),
+        "uploaded_by": ObjectId(uploaded_by),
+        "image_url": f"{BLOB_URL}/{filename}",
+        "caption": caption,
+        "content_hash": content_hash,
+        "size": size,
+        "variants": other["variants"] if other else {},
+        "created_at": datetime.utcnow(),
+    }
+    await family_images_collection.insert_one(doc)
+    if not other:
+        background_tasks.add_task(_generate_variants, doc["_id"], filename)
+    return _public(doc)
 
 
 @router.post("/upload", response_model=FamilyImagePublic)
 async def upload_family_image(
+    background_tasks: BackgroundTasks,
     patient_id: str = Form(...),
     caption: str = Form(None),
     file: UploadFile = File(...),
     current_user=Depends(require_role("caretaker")),
 ):
-    # Save image locally
-    filename = f"{datetime.utcnow().timestamp()}_{file.filename}"
-    path = os.path.join(UPLOAD_DIR, filename)
-    with open(path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    await _check_access(patient_id, current_user)
+    ext = _extension(file.content_type, file.filename)
 
-    doc = {
-        "patient_id": ObjectId(patient_id),
-        "uploaded_by": ObjectId(current_user["_id"]),
-        "image_url": f"/static/family_images/{filename}",
-        "caption": caption,
-        "created_at": datetime.utcnow(),
-    }
-    result = await family_images_collection.insert_one(doc)
+    async def chunks():
+        while chunk := await file.read(CHUNK_SIZE):
+            yield chunk
 
-    return FamilyImagePublic(
-        id=str(result.inserted_id),
-        patient_id=patient_id,
-        uploaded_by=str(current_user["_id"]),
-        image_url=doc["image_url"],
-        caption=caption,
-        created_at=doc["created_at"],
+    content_hash, filename, size = await _save_stream(chunks(), ext)
+    return await _record_upload(
+        patient_id, caption, current_user["_id"], content_hash, filename, size, background_tasks
+    )
+
+
+@router.post("/upload/stream", response_model=FamilyImagePublic)
+async def upload_family_image_stream(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    patient_id: str,
+    caption: str | None = None,
+    current_user=Depends(require_role("caretaker")),
+):
+    """Upload the raw image as the request body (Content-Type: image/...).
+
+    Unlike the multipart endpoint the body is never spooled to a temporary
+    file first: chunks go straight from the socket to the image store.
+    """
+    await _check_access(patient_id, current_user)
+    ext = _extension(request.headers.get("content-type", "").split(";")[0].strip())
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > settings.MAX_IMAGE_BYTES:
+        raise HTTPException(413, f"Image larger than {settings.MAX_IMAGE_BYTES} bytes")
+
+    content_hash, filename, size = await _save_stream(request.stream(), ext)
+    return await _record_upload(
+        patient_id, caption, current_user["_id"], content_hash, filename, size, background_tasks
     )
 
 
+@router.get("/blobs/{name}")
+async def get_blob(name: str, request: Request):
+    """Serve an image or variant by content-addressed name.
+
+    The bytes behind a name never change, so clients may cache forever and
+    revalidation is answered from the ETag without reading the file.
+    """
+    match = BLOB_NAME.match(name)
+    if not match:
+        raise HTTPException(404, "Not found")
+    path = family_blobs.path(name)
+    if not path.exists():
+        raise HTTPException(404, "Not found")
+    etag = f'"{Path(name).stem}"'
+    headers = {"ETag": etag, "Cache-Control": BLOB_CACHE_CONTROL}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, headers=headers)
+
+
+@router.delete("/{image_id}")
+async def delete_family_image(image_id: str, current_user=Depends(require_role("caretaker"))):
+    img = await family_images_collection.find_one({"_id": ObjectId(image_id)}, {"patient_id": 1})
+    if not img:
+        raise HTTPException(404, "Image not found")
+    try:
+        await _check_access(img["patient_id"], current_user)
+    except HTTPException:
+        raise HTTPException(404, "Image not found")
+    img = await family_images_collection.find_one_and_delete({"_id": img["_id"]})
+    if not img:
+        raise HTTPException(404, "Image not found")
+    # the blob stays until `python -m app.blobstore gc` finds it unreferenced
+    return {"ok": True}
+
+
 @router.get("/{patient_id}", response_model=list[FamilyImagePublic])
 async def list_family_images(patient_id: str, current_user=Depends(get_current_user)):
+    await _check_access(patient_id, current_user)
     cursor = family_images_collection.find({"patient_id": ObjectId(patient_id)}).sort(
         "created_at", -1
     )
     images = []
     async for img in cursor:
-        images.append(
-            FamilyImagePublic(
-                id=str(img["_id"]),
-                patient_id=str(img["patient_id"]),
-                uploaded_by=str(img["uploaded_by"]),
-                image_url=img["image_url"],
-                caption=img.get("caption"),
-                created_at=img["created_at"],
-            )
-        )
+        images.append(_public(img))
     return images
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from datetime import datetime
 from bson import ObjectId
 from app.db import family_messages_collection
+from app import patient_state
 from app.models import FamilyMessageCreate, FamilyMessagePublic
 from app.auth import get_current_user
 
@@ -19,6 +20,7 @@ async def add_family_message(
         "created_at": datetime.utcnow(),
     }
     result = await family_messages_collection.insert_one(doc)
+    await patient_state.record("family_message", doc)
     return FamilyMessagePublic(
         id=str(result.inserted_id),
         patient_id=data.patient_id,
@@ -30,14 +32,12 @@ async def add_family_message(
 
 @router.get("/latest/{patient_id}", response_model=FamilyMessagePublic)
 async def get_latest_message(patient_id: str, current_user=Depends(get_current_user)):
-    msg = await family_messages_collection.find_one(
-        {"patient_id": ObjectId(patient_id)}, sort=[("created_at", -1)]
-    )
+    msg = await patient_state.latest(patient_id, "family_message")
     if not msg:
         raise HTTPException(status_code=404, detail="No messages found")
     return FamilyMessagePublic(
-        id=str(msg["_id"]),
-        patient_id=str(msg["patient_id"]),
+        id=str(msg["id"]),
+        patient_id=patient_id,
         from_user=str(msg["from_user"]),
         message=msg["message"],
         created_at=msg["created_at"],
@@ -0,0 +1,105 @@
+from fastapi import APIRouter, Header, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+import asyncio
+import json
+
+from app import access
+from app.auth import get_current_user
+from app.config import settings
+from app.realtime.hub import hub
+
+router = APIRouter(prefix="/live", tags=["Live updates"])
+
+
+async def _watched_patients(user: dict, requested: list[str]) -> list[str]:
+    """The user's patients (app/access.py), optionally narrowed to `requested`.
+
+    A patient account with no linked patient record is refused rather
+    than subscribed to nothing.
+    """
+    patient_ids = await access.patient_ids(user, requested)
+    if not patient_ids and user.get("role") != "caretaker":
+        raise HTTPException(status_code=403, detail="No patient linked to this account")
+    return patient_ids
+
+
+async def _drain(websocket: WebSocket) -> None:
+    # Clients do not send anything; reading only tells us when they leave
+    while True:
+        await websocket.receive_text()
+
+
+@router.websocket("/ws")
+async def live_ws(websocket: WebSocket, token: str, patient_id: list[str] = Query(default=[])):
+    """Push new pings, vitals, alerts, moods and due reminders for the caller's patients.
+
+    Connect with ?token=<JWT>; add patient_id=... to narrow the patients.
+    Messages are JSON events; {"type": "resync"} means some were dropped
+    because the client fell behind and it should reload from the REST API.
+    """
+    try:
+        user = await get_current_user(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    try:
+        patient_ids = await _watched_patients(user, patient_id)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    sub = hub.subscribe(patient_ids)
+    receiver = asyncio.create_task(_drain(websocket))
+    try:
+        await websocket.send_json({"type": "subscribed", "patient_ids": sorted(sub.patient_ids)})
+        while True:
+            getter = asyncio.ensure_future(sub.get(settings.LIVE_HEARTBEAT_SECONDS))
+            done, _ = await asyncio.wait({getter, receiver}, return_when=asyncio.FIRST_COMPLETED)
+            if receiver in done:
+                getter.cancel()
+                break
+            await websocket.send_json(getter.result() or {"type": "ping"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.unsubscribe(sub)
+        receiver.cancel()
+
+
+@router.get("/events")
+async def live_events(
+    request: Request,
+    token: str | None = None,
+    patient_id: list[str] = Query(default=[]),
+    authorization: str | None = Header(None),
+):
+    """Server-Sent Events fallback for /live/ws with the same events.
+
+    EventSource cannot set headers, so the token may be passed as ?token=.
+    """
+    if not token and authorization and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    user = await get_current_user(token)
+    patient_ids = await _watched_patients(user, patient_id)
+
+    async def stream():
+        sub = hub.subscribe(patient_ids)
+        try:
+            yield f"event: subscribed\ndata: {json.dumps({'patient_ids': sorted(sub.patient_ids)})}\n\n"
+            while not await request.is_disconnected():
+                event = await sub.get(settings.LIVE_HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            hub.unsubscribe(sub)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
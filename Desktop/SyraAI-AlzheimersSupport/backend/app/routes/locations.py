@@ -1,24 +1,29 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from bson import ObjectId
-from datetime import datetime, timezone
-from ..db import locations_col, patients_col, alerts_collection, users_col
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Literal, Optional
+import json
+from ..db import locations_col, alerts_collection, users_col
+from .. import patient_state
+from ..alerts.engine import alert_engine
+from ..config import settings
+from ..ml.anomaly import anomaly_engine
+from ..ml.features import ping_features
+from ..ml.scoring import wandering_scorer
 from ..auth import get_current_user
 from ..models import LocationPing, AlertPublic
-from ..utils.geo import haversine_m
+from ..geofence import geofence_cache
+from ..utils.pagination import encode_cursor, after_cursor
+from ..utils.trajectory import StopDetector, simplify
+from ..realtime.bus import publish_event
 
 router = APIRouter(prefix="/locations", tags=["locations"])
 
-
-async def maybe_create_alert(patient_id: str, kind: str, message: str):
-    doc = {
-        "patient_id": ObjectId(patient_id),
-        "type": kind,
-        "message": message,
-        "created_at": datetime.now(timezone.utc),
-    }
-    res = await alerts_collection.insert_one(doc)
-    # Twilio/email hook could be called here (optional no-op if not configured)
-    return str(res.inserted_id)
+# Trajectory export: longest window per request, and pings simplified
+# together (memory stays bounded however long the track is)
+MAX_TRAJECTORY_DAYS = 31
+SIMPLIFY_WINDOW = 5000
 
 
 @router.post("/ping", response_model=dict)
@@ -31,50 +36,223 @@ async def ping(loc: LocationPing, user=Depends(get_current_user)):
         "timestamp": ts,
     }
     await locations_col.insert_one(doc)
+    await patient_state.record("location", doc)
+    await publish_event("location", doc)
 
-    # Geofence check
-    pat = await patients_col.find_one({"_id": ObjectId(loc.patient_id)})
-    if pat:
-        dist_m = haversine_m(
-            pat["safe_center_lat"], pat["safe_center_lng"], loc.lat, loc.lng
+    # Geofence check: one alert per time outside, not one per ping
+    fence = await geofence_cache.get(loc.patient_id)
+    if fence:
+        outside_m = fence.outside_by_m(loc.lat, loc.lng)
+        await alert_engine.observe(
+            loc.patient_id,
+            "geofence_breach",
+            outside_m is not None,
+            f"Patient left safe zone by {int(outside_m or 0)} m",
+            {"distance_exceeded": int(outside_m or 0), "lat": loc.lat, "lng": loc.lng},
         )
-        if dist_m > pat["safe_radius_m"]:
-            await maybe_create_alert(
+
+    if settings.ANOMALY_DETECTION:
+        a = await anomaly_engine.observe(loc.patient_id, loc.lat, loc.lng, ts)
+        if a.speed_kmh is not None:
+            where = {"lat": loc.lat, "lng": loc.lng, "speed_kmh": round(a.speed_kmh, 1)}
+            await alert_engine.observe(
                 loc.patient_id,
-                "geofence_breach",
-                f"Patient left safe zone by {int(dist_m - pat['safe_radius_m'])} m",
+                "unusual_speed",
+                a.unusual_speed,
+                f"Unusual speed: {a.speed_kmh:.0f} km/h",
+                where,
             )
+            await alert_engine.observe(
+                loc.patient_id,
+                "wandering",
+                a.wandering,
+                "Patient may be wandering",
+                {**where, "heading_variance": round(a.heading_var or 0, 2)},
+            )
+            if settings.ML_WANDERING_MODEL and fence:
+                row = ping_features(loc.lat, loc.lng, ts, (fence.lat, fence.lng), a.speed_kmh, a.dwell_s)
+                score = await wandering_scorer.score(loc.patient_id, row)
+                if score is not None:
+                    await alert_engine.observe(
+                        loc.patient_id,
+                        "wandering_pattern",
+                        score < settings.ML_WANDERING_THRESHOLD,
+                        "Movement unlike the patient's usual routine",
+                        {**where, "score": round(score, 3)},
+                    )
 
     return {"ok": True}
 
 
 @router.get("/latest/{patient_id}")
 async def latest(patient_id: str, user=Depends(get_current_user)):
-    d = await locations_col.find_one(
-        {"patient_id": ObjectId(patient_id)}, sort=[("timestamp", -1)]
-    )
+    d = await patient_state.latest(patient_id, "location")
     if not d:
         raise HTTPException(404, "No locations yet")
-    d["id"] = str(d["_id"])
-    d["patient_id"] = str(d["patient_id"])
-    d.pop("_id", None)
-    return d
+    return {**d, "id": str(d["id"]), "patient_id": patient_id}
+
+
+async def _pings(patient_id: str, start: datetime, end: datetime) -> AsyncIterator[dict]:
+    cursor = locations_col.find(
+        {"patient_id": ObjectId(patient_id), "timestamp": {"$gte": start, "$lt": end}},
+        {"_id": 0, "lat": 1, "lng": 1, "timestamp": 1},
+    ).sort("timestamp", 1).batch_size(SIMPLIFY_WINDOW)
+    async for d in cursor:
+        yield d
+
+
+async def _detect_stops(pings: AsyncIterator[dict], detector: StopDetector, found: list) -> AsyncIterator[dict]:
+    """Pass pings through, appending each completed stop to `found`."""
+    async for d in pings:
+        stop = detector.feed(d["lat"], d["lng"], d["timestamp"])
+        if stop:
+            found.append(stop)
+        yield d
+    stop = detector.finish()
+    if stop:
+        found.append(stop)
+
+
+async def _simplify(pings: AsyncIterator[dict], tolerance_m: float) -> AsyncIterator[dict]:
+    """Douglas-Peucker simplification, SIMPLIFY_WINDOW pings at a time."""
+    window = []
+    async for d in pings:
+        window.append(d)
+        if len(window) >= SIMPLIFY_WINDOW:
+            kept = simplify([(p["lat"], p["lng"]) for p in window], tolerance_m)
+            for i in kept[:-1]:
+                yield window[i]
+            # the window's last ping is always kept and starts the next one
+            window = [window[-1]]
+    for i in simplify([(p["lat"], p["lng"]) for p in window], tolerance_m):
+        yield window[i]
+
+
+def _utc(dt: datetime) -> datetime:
+    # naive query parameters are UTC, like stored timestamps
+    return dt.replace(tzinfo=timezone.utc) if dt.tzinfo is None else dt
+
+
+def _stop_json(stop: dict) -> dict:
+    return {**stop, "start": stop["start"].isoformat(), "end": stop["end"].isoformat()}
+
+
+@router.get("/trajectory/{patient_id}")
+async def trajectory(
+    patient_id: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    format: Literal["ndjson", "geojson"] = "ndjson",
+    tolerance_m: float = Query(0, ge=0, le=1000),
+    stops: bool = False,
+    stop_radius_m: float = Query(50, gt=0, le=1000),
+    stop_minutes: float = Query(5, gt=0),
+    user=Depends(get_current_user),
+):
+    """Stream a patient's path between start and end (default: last 24 h).
+
+    - ndjson: a {"type": "point", ...} line per ping, and with stops=true a
+      {"type": "stop", ...} line per dwell of stop_minutes within stop_radius_m
+    - geojson: a FeatureCollection with the path as a LineString and one
+      Point feature per stop
+    tolerance_m > 0 drops pings closer than that to the simplified path;
+    stops are always found on the raw pings.
+    """
+    end = _utc(end) if end else datetime.now(timezone.utc)
+    start = _utc(start) if start else end - timedelta(hours=24)
+    if end <= start:
+        raise HTTPException(400, "end must be after start")
+    if end - start > timedelta(days=MAX_TRAJECTORY_DAYS):
+        raise HTTPException(400, f"At most {MAX_TRAJECTORY_DAYS} days per request")
+
+    found = []
+    path = _pings(patient_id, start, end)
+    if stops:
+        path = _detect_stops(path, StopDetector(stop_radius_m, timedelta(minutes=stop_minutes)), found)
+    if tolerance_m:
+        path = _simplify(path, tolerance_m)
+
+    async def ndjson():
+        async for d in path:
+            point = {"type": "point", "lat": d["lat"], "lng": d["lng"], "timestamp": d["timestamp"].isoformat()}
+            yield json.dumps(point) + "\n"
+            while found:
+                yield json.dumps({"type": "stop", **_stop_json(found.pop(0))}) + "\n"
+        for stop in found:
+            yield json.dumps({"type": "stop", **_stop_json(stop)}) + "\n"
+
+    async def geojson():
+        yield '{"type":"FeatureCollection","features":[{"type":"Feature","geometry":{"type":"LineString","coordinates":['
+        sep = ""
+        async for d in path:
+            yield f"{sep}[{d['lng']},{d['lat']}]"
+            sep = ","
+        yield "]},\"properties\":" + json.dumps({"kind": "path", "patient_id": patient_id}) + "}"
+        for stop in found:
+            props = _stop_json(stop)
+            point = {"type": "Point", "coordinates": [props.pop("lng"), props.pop("lat")]}
+            yield "," + json.dumps({"type": "Feature", "geometry": point, "properties": {"kind": "stop", **props}})
+        yield "]}"
+
+    if format == "geojson":
+        return StreamingResponse(geojson(), media_type="application/geo+json")
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+ALERT_FIELDS = {
+    "patient_id": 1,
+    "type": 1,
+    "subtype": 1,
+    "message": 1,
+    "details": 1,
+    "created_at": 1,
+    "resolved": 1,
+    "state": 1,
+    "closed_at": 1,
+}
 
 
 @router.get("/alerts/{patient_id}", response_model=list[AlertPublic])
-async def alerts(patient_id: str, user=Depends(get_current_user)):
-    cur = alerts_collection.find({"patient_id": ObjectId(patient_id)}).sort(
-        "created_at", -1
+async def alerts(
+    patient_id: str,
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    since: Optional[datetime] = None,
+    type: Optional[str] = None,
+    resolved: Optional[bool] = None,
+    user=Depends(get_current_user),
+):
+    """Newest alerts first, one page at a time.
+
+    When more alerts exist the X-Next-Cursor response header holds the
+    cursor for the following page.
+    """
+    query = {"patient_id": ObjectId(patient_id)}
+    if since:
+        query["created_at"] = {"$gte": since}
+    if type:
+        query["type"] = type
+    if resolved is not None:
+        # older alerts have no resolved field; treat them as unresolved
+        query["resolved"] = True if resolved else {"$ne": True}
+    if cursor:
+        query.update(after_cursor("created_at", cursor))
+
+    cur = (
+        alerts_collection.find(query, ALERT_FIELDS)
+        .sort([("created_at", -1), ("_id", -1)])
+        .limit(limit + 1)
     )
+    docs = await cur.to_list(length=limit + 1)
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(docs[-1]["created_at"], docs[-1]["_id"])
+
     items = []
-    async for d in cur:
-        items.append(
-            {
-                "id": str(d["_id"]),
-                "patient_id": str(d["patient_id"]),
-                "type": d["type"],
-                "message": d["message"],
-                "created_at": d["created_at"],
-            }
-        )
+    for d in docs:
+        d["id"] = str(d.pop("_id"))
+        d["patient_id"] = str(d["patient_id"])
+        d.setdefault("resolved", False)
+        items.append(d)
     return items
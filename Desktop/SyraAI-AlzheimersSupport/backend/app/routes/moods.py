@@ -4,6 +4,8 @@ from datetime import datetime, timezone, timedelta
 from ..db import moods_col, patients_col
 from ..auth import get_current_user
 from ..models import MoodCreate, MoodPublic
+from ..realtime.bus import publish_event
+from .. import patient_state
 
 router = APIRouter(prefix="/moods", tags=["moods"])
 
@@ -13,6 +15,8 @@ async def log_mood(m: MoodCreate, user=Depends(get_current_user)):
     ts = m.timestamp or datetime.now(timezone.utc)
     doc = {"patient_id": ObjectId(m.patient_id), "mood": m.mood, "note": m.note, "timestamp": ts}
     res = await moods_col.insert_one(doc)
+    await patient_state.record("mood", doc)
+    await publish_event("mood", doc)
     return {"id": str(res.inserted_id), "patient_id": m.patient_id, "mood": m.mood, "note": m.note, "timestamp": ts}
 
 @router.get("/trend/{patient_id}", response_model=list[MoodPublic])
@@ -1,11 +1,48 @@
 from fastapi import APIRouter, Depends, HTTPException
 from bson import ObjectId
-from ..db import patients_col, users_col
+from pymongo import ReturnDocument
+from datetime import datetime, timedelta, timezone
+import asyncio
+from ..db import patients_col, users_col, alerts_collection
+from .. import patient_state
 from ..auth import require_role
-from ..models import PatientCreate, PatientPublic
+from ..config import settings
+from ..geofence import geofence_cache
+from ..models import PatientCreate, PatientLink, PatientPublic, PatientOverview
+from ..reminders.due import due_reminders
+from ..utils.cache import TTLCache
 
 router = APIRouter(prefix="/patients", tags=["patients"])
 
+# Due reminders listed per patient by the overview (all are counted)
+OVERVIEW_REMINDERS = 5
+
+# caretaker id -> overview items
+_overviews = TTLCache(maxsize=1024, ttl=settings.OVERVIEW_CACHE_TTL_SECONDS)
+
+
+def _patient_public(d: dict) -> dict:
+    return {
+        "id": str(d["_id"]),
+        "name": d["name"],
+        "caretaker_id": str(d["caretaker_id"]),
+        "safe_center_lat": d["safe_center_lat"],
+        "safe_center_lng": d["safe_center_lng"],
+        "safe_radius_m": d["safe_radius_m"],
+        "user_id": str(d["user_id"]) if d.get("user_id") else None,
+    }
+
+
+async def _patient_user(user_id: str) -> ObjectId:
+    """Id of an existing patient-role account, or 404."""
+    found = ObjectId.is_valid(user_id) and await users_col.find_one(
+        {"_id": ObjectId(user_id), "role": "patient"}, {"_id": 1}
+    )
+    if not found:
+        raise HTTPException(404, "Patient user not found")
+    return found["_id"]
+
+
 @router.post("/", response_model=PatientPublic)
 async def create_patient(p: PatientCreate, user=Depends(require_role("caretaker"))):
     # Verify caretaker exists
@@ -19,27 +56,113 @@ async def create_patient(p: PatientCreate, user=Depends(require_role("caretaker"
         "safe_center_lng": p.safe_center_lng,
         "safe_radius_m": p.safe_radius_m,
     }
+    if p.user_id:
+        doc["user_id"] = await _patient_user(p.user_id)
     res = await patients_col.insert_one(doc)
-    return {
-        "id": str(res.inserted_id),
-        "name": p.name,
-        "caretaker_id": p.caretaker_id,
-        "safe_center_lat": p.safe_center_lat,
-        "safe_center_lng": p.safe_center_lng,
-        "safe_radius_m": p.safe_radius_m,
-    }
+    geofence_cache.invalidate(str(res.inserted_id))
+    _overviews.pop(p.caretaker_id)
+    return _patient_public(doc)
+
+
+@router.put("/{patient_id}/user", response_model=PatientPublic)
+async def link_patient_user(patient_id: str, link: PatientLink, user=Depends(require_role("caretaker"))):
+    """Link the patient's own account, so their devices see their data."""
+    user_id = await _patient_user(link.user_id)
+    doc = await patients_col.find_one_and_update(
+        {"_id": ObjectId(patient_id), "caretaker_id": ObjectId(user["id"])},
+        {"$set": {"user_id": user_id}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not doc:
+        raise HTTPException(404, "Patient not found")
+    _overviews.pop(user["id"])
+    return _patient_public(doc)
 
 @router.get("/", response_model=list[PatientPublic])
 async def list_patients(user=Depends(require_role("caretaker"))):
     cur = patients_col.find({"caretaker_id": ObjectId(user["id"])})
     items = []
     async for d in cur:
+        items.append(_patient_public(d))
+    return items
+
+
+async def _open_alerts(ids: list) -> dict:
+    # Open episodes only (app/alerts/engine.py): one-off alerts such as SOS
+    # are never resolved, and the partial open_episode_unique index keeps
+    # this read small however long the alert history grows
+    pipeline = [
+        {"$match": {"patient_id": {"$in": ids}, "state": "open"}},
+        {"$sort": {"patient_id": 1, "created_at": -1}},
+        {
+            "$group": {
+                "_id": "$patient_id",
+                "count": {"$sum": 1},
+                "type": {"$first": "$type"},
+                "message": {"$first": "$message"},
+                "created_at": {"$first": "$created_at"},
+            }
+        },
+    ]
+    return {d.pop("_id"): d async for d in alerts_collection.aggregate(pipeline)}
+
+
+async def _due_reminders(ids: list, now: datetime) -> dict:
+    # Same reminders and occurrences as GET /reminders/due by default
+    since = now - timedelta(hours=settings.REMINDER_DUE_WINDOW_HOURS)
+    due = await due_reminders(ids, since, now)
+    return {
+        pid: {
+            "count": len(items),
+            "items": [
+                {"id": d["_id"], "title": d["title"], "when": occurrence or d["when"]}
+                for d, occurrence in items[:OVERVIEW_REMINDERS]
+            ],
+        }
+        for pid, items in due.items()
+    }
+
+
+@router.get("/overview", response_model=list[PatientOverview])
+async def overview(user=Depends(require_role("caretaker"))):
+    """Everything the consolidated dashboard shows, for all of the caretaker's patients.
+
+    Three concurrent reads cover every patient at once, instead of five
+    requests per patient:
+    - latest location, vitals and mood from the state documents (app/patient_state.py)
+    - open alert episodes, counted in one aggregation
+    - due reminders, expanded as /reminders/due does them
+
+    Results are cached per caretaker for OVERVIEW_CACHE_TTL_SECONDS.
+    """
+    cached = _overviews.get(user["id"])
+    if cached is not None:
+        return cached
+
+    patients = await patients_col.find({"caretaker_id": ObjectId(user["id"])}).to_list(length=None)
+    ids = [p["_id"] for p in patients]
+    states, alerts, reminders = await asyncio.gather(
+        patient_state.latest_many(ids, ("location", "vitals", "mood")),
+        _open_alerts(ids),
+        _due_reminders(ids, datetime.now(timezone.utc)),
+    )
+
+    items = []
+    for p in patients:
+        pid = p["_id"]
+        state = states.get(pid, {})
+        alert = alerts.get(pid)
+        due = reminders.get(pid, {"count": 0, "items": []})
         items.append({
-            "id": str(d["_id"]),
-            "name": d["name"],
-            "caretaker_id": str(d["caretaker_id"]),
-            "safe_center_lat": d["safe_center_lat"],
-            "safe_center_lng": d["safe_center_lng"],
-            "safe_radius_m": d["safe_radius_m"],
+            **_patient_public(p),
+            "location": state.get("location"),
+            "vitals": state.get("vitals"),
+            "mood": state.get("mood"),
+            "open_alerts": alert.pop("count") if alert else 0,
+            "latest_alert": alert,
+            "due_reminders": due["count"],
+            "reminders": [{**r, "id": str(r["id"])} for r in due["items"]],
         })
+    if settings.OVERVIEW_CACHE_TTL_SECONDS > 0:
+        _overviews.set(user["id"], items)
     return items
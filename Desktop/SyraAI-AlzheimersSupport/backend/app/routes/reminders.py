@@ -1,50 +1,230 @@
 from fastapi import APIRouter, Depends, HTTPException
 from bson import ObjectId
-from datetime import datetime, timezone
-from ..db import reminders_col, patients_col
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from ..config import settings
+from ..db import reminders_col, reminder_acks_collection, patients_col
 from ..auth import require_role, get_current_user
-from ..models import ReminderCreate, ReminderPublic
+from ..models import (
+    ReminderAckBatch,
+    ReminderAckItem,
+    ReminderAckResult,
+    ReminderBatchItem,
+    ReminderBatchResult,
+    ReminderCreate,
+    ReminderPublic,
+)
+from ..reminders.due import due_reminders as find_due
+from ..reminders.recurrence import aware, is_occurrence, occurrences, previous_occurrence, stored
+from ..reminders.scheduler import reminder_scheduler
 
 router = APIRouter(prefix="/reminders", tags=["reminders"])
 
-@router.post("/", response_model=ReminderPublic)
-async def create_reminder(r: ReminderCreate, user=Depends(require_role("caretaker"))):
-    pat = await patients_col.find_one({"_id": ObjectId(r.patient_id), "caretaker_id": ObjectId(user["id"])})
-    if not pat:
-        raise HTTPException(404, "Patient not found")
-    doc = {
+# Upper bound on reminders created or acknowledged by a single batch call
+MAX_BATCH_SIZE = 500
+
+
+def _public(d: dict, occurrence: Optional[datetime] = None) -> dict:
+    return {
+        "id": str(d["_id"]),
+        "patient_id": str(d["patient_id"]),
+        "title": d["title"],
+        "when": d["when"],
+        "notes": d.get("notes"),
+        "acknowledged": d["acknowledged"],
+        "repeat": d.get("repeat"),
+        "occurrence": occurrence,
+    }
+
+
+def _new_doc(r: ReminderCreate) -> dict:
+    repeat = r.repeat.model_dump() if r.repeat else None
+    # first time the scheduler fires it (app/reminders/scheduler.py)
+    next_at = r.when
+    if repeat:
+        if next(occurrences(repeat, r.when), None) is None:
+            raise HTTPException(400, "The repeat rule has no occurrences")
+        next_at = next(occurrences(repeat, r.when, datetime.now(timezone.utc)), None)
+    return {
         "patient_id": ObjectId(r.patient_id),
         "title": r.title,
         "when": r.when,
         "notes": r.notes,
         "acknowledged": False,
+        "repeat": repeat,
+        "next_at": next_at,
     }
+
+
+def _object_id(value: str) -> Optional[ObjectId]:
+    return ObjectId(value) if ObjectId.is_valid(value) else None
+
+
+@router.post("/", response_model=ReminderPublic)
+async def create_reminder(r: ReminderCreate, user=Depends(require_role("caretaker"))):
+    pat = await patients_col.find_one({"_id": ObjectId(r.patient_id), "caretaker_id": ObjectId(user["id"])})
+    if not pat:
+        raise HTTPException(404, "Patient not found")
+    doc = _new_doc(r)
     res = await reminders_col.insert_one(doc)
-    return {"id": str(res.inserted_id), **{k: doc[k] for k in ["patient_id","title","when","notes","acknowledged"]}}
+    reminder_scheduler.schedule(res.inserted_id, doc["next_at"])
+    return _public({**doc, "_id": res.inserted_id})
+
+
+@router.post("/batch", response_model=ReminderBatchResult)
+async def create_reminders_batch(reminders: list[ReminderCreate], user=Depends(require_role("caretaker"))):
+    """Create many reminders, for any of the caretaker's patients, in one call.
+
+    Ownership of all patients is checked with one query and the reminders are
+    written with a single unordered insert_many. Each item is reported
+    separately: one the caretaker may not create does not fail the others.
+    """
+    if len(reminders) > MAX_BATCH_SIZE:
+        raise HTTPException(413, f"At most {MAX_BATCH_SIZE} reminders per batch")
+
+    requested = {oid for r in reminders if (oid := _object_id(r.patient_id))}
+    owned = {
+        p["_id"]
+        async for p in patients_col.find(
+            {"_id": {"$in": list(requested)}, "caretaker_id": ObjectId(user["id"])}, {"_id": 1}
+        )
+    }
+
+    results = [ReminderBatchItem(index=i) for i in range(len(reminders))]
+    docs, positions = [], []
+    for i, r in enumerate(reminders):
+        if _object_id(r.patient_id) not in owned:
+            results[i].error = "Patient not found"
+            continue
+        try:
+            docs.append(_new_doc(r))
+        except HTTPException as exc:
+            results[i].error = exc.detail
+            continue
+        positions.append(i)
+
+    failed = set()
+    if docs:
+        try:
+            await reminders_col.insert_many(docs, ordered=False)
+        except BulkWriteError as exc:
+            for err in exc.details.get("writeErrors", []):
+                failed.add(err["index"])
+    for n, (i, doc) in enumerate(zip(positions, docs)):
+        if n in failed:
+            results[i].error = "Not stored"
+            continue
+        # insert_many sets _id on the documents it was given
+        results[i].id = str(doc["_id"])
+        reminder_scheduler.schedule(doc["_id"], doc["next_at"])
+
+    return ReminderBatchResult(
+        received=len(reminders), created=len(docs) - len(failed), results=results
+    )
+
 
 @router.get("/due/{patient_id}", response_model=list[ReminderPublic])
-async def due_reminders(patient_id: str, user=Depends(get_current_user)):
+async def due_reminders(patient_id: str, since: Optional[datetime] = None, user=Depends(get_current_user)):
+    """Unacknowledged reminders whose time has come, oldest first.
+
+    A repeating reminder is listed once per unacknowledged occurrence since
+    `since` (default: the last REMINDER_DUE_WINDOW_HOURS), with the time in
+    `occurrence`. Occurrences are computed from the rule, not stored.
+    """
     # Patient or caretaker can fetch
-    cur = reminders_col.find({
-        "patient_id": ObjectId(patient_id),
-        "when": {"$lte": datetime.now(timezone.utc)},
-        "acknowledged": False
-    })
-    items = []
-    async for d in cur:
-        items.append({
-            "id": str(d["_id"]),
-            "patient_id": str(d["patient_id"]),
-            "title": d["title"],
-            "when": d["when"],
-            "notes": d.get("notes"),
-            "acknowledged": d["acknowledged"]
-        })
-    return items
+    now = datetime.now(timezone.utc)
+    since = aware(since) if since else now - timedelta(hours=settings.REMINDER_DUE_WINDOW_HOURS)
+    due = await find_due([ObjectId(patient_id)], since, now)
+    return [_public(d, occurrence) for d, occurrence in due.get(ObjectId(patient_id), [])]
+
 
 @router.post("/{reminder_id}/ack")
-async def ack(reminder_id: str, user=Depends(get_current_user)):
-    res = await reminders_col.update_one({"_id": ObjectId(reminder_id)}, {"$set": {"acknowledged": True}})
-    if res.matched_count == 0:
+async def ack(reminder_id: str, occurrence: Optional[datetime] = None, user=Depends(get_current_user)):
+    """Acknowledge a reminder.
+
+    For a repeating reminder this acknowledges one occurrence: `occurrence`,
+    or by default the latest one that is due.
+    """
+    res = await reminders_col.update_one(
+        {"_id": ObjectId(reminder_id), "repeat": None}, {"$set": {"acknowledged": True}}
+    )
+    if res.matched_count:
+        return {"ok": True}
+
+    d = await reminders_col.find_one({"_id": ObjectId(reminder_id)}, {"patient_id": 1, "when": 1, "repeat": 1})
+    if not d:
         raise HTTPException(404, "Reminder not found")
-    return {"ok": True}
+    now = datetime.now(timezone.utc)
+    if occurrence is None:
+        occurrence = previous_occurrence(d["repeat"], d["when"], now)
+        if occurrence is None:
+            raise HTTPException(400, "No occurrence of this reminder is due")
+    elif not is_occurrence(d["repeat"], d["when"], occurrence):
+        raise HTTPException(400, "Not an occurrence of this reminder")
+    occurrence = stored(occurrence)
+    try:
+        await reminder_acks_collection.update_one(
+            {"reminder_id": d["_id"], "occurrence": occurrence},
+            {"$setOnInsert": {"patient_id": d["patient_id"], "acked_at": now}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        pass  # acknowledged concurrently
+    return {"ok": True, "occurrence": occurrence}
+
+
+@router.post("/ack", response_model=ReminderAckResult)
+async def ack_batch(body: ReminderAckBatch, user=Depends(get_current_user)):
+    """Acknowledge many reminders in one call.
+
+    One-off reminders are acknowledged with a single update_many; repeating
+    ones have their latest due occurrence acknowledged, as /{id}/ack does
+    by default, with one bulk write.
+    """
+    if len(body.ids) > MAX_BATCH_SIZE:
+        raise HTTPException(413, f"At most {MAX_BATCH_SIZE} reminders per batch")
+
+    ids = {oid for value in body.ids if (oid := _object_id(value))}
+    found = {
+        d["_id"]: d
+        async for d in reminders_col.find({"_id": {"$in": list(ids)}}, {"patient_id": 1, "when": 1, "repeat": 1})
+    }
+
+    now = datetime.now(timezone.utc)
+    one_off, ack_ops, outcome = [], [], {}
+    for oid, d in found.items():
+        if not d.get("repeat"):
+            one_off.append(oid)
+            outcome[oid] = ReminderAckItem(id=str(oid), ok=True)
+            continue
+        occurrence = previous_occurrence(d["repeat"], d["when"], now)
+        if occurrence is None:
+            outcome[oid] = ReminderAckItem(id=str(oid), ok=False, error="No occurrence of this reminder is due")
+            continue
+        occurrence = stored(occurrence)
+        ack_ops.append(UpdateOne(
+            {"reminder_id": oid, "occurrence": occurrence},
+            {"$setOnInsert": {"patient_id": d["patient_id"], "acked_at": now}},
+            upsert=True,
+        ))
+        outcome[oid] = ReminderAckItem(id=str(oid), ok=True, occurrence=occurrence)
+
+    if one_off:
+        await reminders_col.update_many(
+            {"_id": {"$in": one_off}, "repeat": None}, {"$set": {"acknowledged": True}}
+        )
+    if ack_ops:
+        try:
+            await reminder_acks_collection.bulk_write(ack_ops, ordered=False)
+        except BulkWriteError as exc:
+            # a duplicate key means that occurrence was acknowledged concurrently
+            if any(err["code"] != 11000 for err in exc.details.get("writeErrors", [])):
+                raise
+
+    results = []
+    for value in body.ids:
+        oid = _object_id(value)
+        results.append(outcome.get(oid) or ReminderAckItem(id=value, ok=False, error="Reminder not found"))
+    return ReminderAckResult(acknowledged=sum(1 for item in outcome.values() if item.ok), results=results)
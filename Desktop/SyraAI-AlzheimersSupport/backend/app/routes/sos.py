@@ -1,8 +1,8 @@
 from fastapi import APIRouter, Depends
 from bson import ObjectId
 from datetime import datetime, timezone
-from ..db import alerts_collection
 from ..auth import get_current_user
+from ..alerts.dispatcher import alert_dispatcher
 
 router = APIRouter(prefix="/sos", tags=["sos"])
 
@@ -15,5 +15,5 @@ async def sos(patient_id: str, user=Depends(get_current_user)):
         "message": "Patient pressed SOS",
         "created_at": datetime.now(timezone.utc),
     }
-    await alerts_col.insert_one(doc)
+    await alert_dispatcher.submit(doc)
     return {"ok": True}
@@ -1,17 +1,47 @@
-from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi import APIRouter, HTTPException, Depends, Header, Query, Request
+from fastapi.exceptions import RequestValidationError
 from datetime import datetime, timedelta
 from bson import ObjectId
+from pydantic import TypeAdapter, ValidationError
+from pymongo.errors import BulkWriteError
+from typing import Literal, Optional, Union
+import re
 
-from app.db import vitals_collection, alerts_collection, devices_collection
-from app.models import VitalReading, VitalPublic
+from app.db import vitals_collection, devices_collection, vitals_rollups_collection
+from app.alerts.dispatcher import alert_dispatcher
+from app.realtime.bus import publish_event, publish_events
+from app.models import VitalReading, VitalPublic, VitalBatchResult, VitalBucket, VitalRollup
+from app.rollups import vitals_rollups, summarize
+from app import patient_state
+from app.ml.baselines import vital_baselines
+from app.utils.downsample import lttb
 
 router = APIRouter(prefix="/vitals", tags=["Vitals"])
 
-# Safety thresholds
-MAX_HEART_RATE = 120
-MIN_HEART_RATE = 40
-MAX_TEMP = 38.0
-MIN_SPO2 = 90
+# Alert per rule in app/ml/baselines.py RULES order. A rule alerts once it
+# has been broken by several readings in a row, judged against the
+# patient's own baseline (see app/ml/baselines.py).
+VITAL_RULES = [
+    ("vital_spike", "High heart rate detected: {heart_rate} bpm"),
+    ("vital_drop", "Low heart rate detected: {heart_rate} bpm"),
+    ("vital_spike", "High temperature detected: {body_temp}°C"),
+    ("vital_spike", "Low SpO₂ detected: {spo2}%"),
+]
+
+# Upper bound on readings accepted by a single /vitals/batch call
+MAX_BATCH_SIZE = 5000
+# Readings fetched per round-trip when streaming a series for ?points=
+SERIES_BATCH = 5000
+NDJSON_CONTENT_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl"}
+
+_readings_adapter = TypeAdapter(list[VitalReading])
+
+VITAL_FIELDS = ("heart_rate", "body_temp", "spo2")
+# History bucket sizes: 30s, 5m, 1h, 1d, ...
+RESOLUTION = re.compile(r"^(\d+)([smhd])$")
+UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+MAX_BUCKETS = 10000
+EPOCH = datetime(1970, 1, 1)
 
 
 async def verify_device_token(device_token: str = Header(...)):
@@ -34,29 +64,21 @@ async def record_vitals(data: VitalReading, device=Depends(verify_device_token))
     }
 
     result = await vitals_collection.insert_one(doc)
+    await patient_state.record("vitals", doc)
+    await publish_event("vitals", doc)
+    await vitals_rollups.add([doc])
 
-    # Check thresholds and trigger alert if abnormal
-    alert_type = None
-    message = None
-    if data.heart_rate > MAX_HEART_RATE:
-        alert_type = "vital_spike"
-        message = f"High heart rate detected: {data.heart_rate} bpm"
-    elif data.heart_rate < MIN_HEART_RATE:
-        alert_type = "vital_drop"
-        message = f"Low heart rate detected: {data.heart_rate} bpm"
-    elif data.body_temp > MAX_TEMP:
-        alert_type = "vital_spike"
-        message = f"High temperature detected: {data.body_temp}°C"
-    elif data.spo2 < MIN_SPO2:
-        alert_type = "vital_spike"
-        message = f"Low SpO₂ detected: {data.spo2}%"
-
-    if alert_type:
-        await alerts_collection.insert_one(
+    # Alert on rules this reading has kept broken long enough
+    evaluation = await vital_baselines.assess(
+        data.patient_id, data.heart_rate, data.body_temp, data.spo2, doc["timestamp"]
+    )
+    for rule in evaluation.fired:
+        alert_type, template = VITAL_RULES[rule]
+        await alert_dispatcher.submit(
             {
                 "patient_id": ObjectId(data.patient_id),
                 "type": alert_type,
-                "message": message,
+                "message": template.format(**doc),
                 "created_at": datetime.utcnow(),
                 "resolved": False,
             }
@@ -72,42 +94,227 @@ async def record_vitals(data: VitalReading, device=Depends(verify_device_token))
     )
 
 
+async def _parse_readings(request: Request) -> list[VitalReading]:
+    """Parse a JSON array or NDJSON (one reading per line) request body."""
+    body = await request.body()
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    try:
+        if content_type in NDJSON_CONTENT_TYPES:
+            return [
+                VitalReading.model_validate_json(line)
+                for line in body.splitlines()
+                if line.strip()
+            ]
+        return _readings_adapter.validate_json(body)
+    except ValidationError as exc:
+        raise RequestValidationError(exc.errors())
+
+
+@router.post("/batch", response_model=VitalBatchResult)
+async def record_vitals_batch(request: Request, device=Depends(verify_device_token)):
+    """Record readings buffered by a pendant while offline, in one round-trip.
+
+    The device is authenticated once, readings keep their own timestamps and
+    are written with a single unordered insert_many. Readings are assessed
+    against the patients' baselines in timestamp order; alerts are coalesced
+    to one per patient and rule and stored together by the alert
+    dispatcher, whose workers send the notifications.
+    """
+    readings = await _parse_readings(request)
+    if len(readings) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=413, detail=f"At most {MAX_BATCH_SIZE} readings per batch"
+        )
+    if not readings:
+        return VitalBatchResult(received=0, inserted=0, alerts=0)
+
+    docs = [
+        {
+            "patient_id": ObjectId(r.patient_id),
+            "heart_rate": r.heart_rate,
+            "body_temp": r.body_temp,
+            "spo2": r.spo2,
+            "timestamp": r.timestamp,
+        }
+        for r in readings
+    ]
+
+    failed = set()
+    try:
+        await vitals_collection.insert_many(docs, ordered=False)
+    except BulkWriteError as exc:
+        failed = {err["index"] for err in exc.details.get("writeErrors", [])}
+
+    # Only readings that were actually stored count towards baselines and alerts
+    stored = [doc for i, doc in enumerate(docs) if i not in failed]
+    await vitals_rollups.add(stored)
+    evaluations = await vital_baselines.assess_many(stored)
+
+    # Dashboards only need the newest stored reading per patient, not the replay
+    newest = {}
+    for doc in stored:
+        current = newest.get(doc["patient_id"])
+        if current is None or doc["timestamp"] >= current["timestamp"]:
+            newest[doc["patient_id"]] = doc
+    await patient_state.record_many("vitals", newest.values())
+    await publish_events("vitals", newest.values())
+
+    # One alert per (patient, rule) that fired: the first reading completing
+    # a streak names it, the offending readings are summarised in details.
+    coalesced = {}
+    for doc, evaluation in zip(stored, evaluations):
+        for rule in evaluation.broken:
+            key = (doc["patient_id"], rule)
+            if key not in coalesced:
+                coalesced[key] = {"fired": None, "first": doc, "last": doc, "count": 0}
+            group = coalesced[key]
+            if group["fired"] is None and rule in evaluation.fired:
+                group["fired"] = doc
+            group["last"] = doc
+            group["count"] += 1
+
+    now = datetime.utcnow()
+    alerts = []
+    for (patient_id, rule), group in coalesced.items():
+        if group["fired"] is None:
+            continue
+        alert_type, template = VITAL_RULES[rule]
+        alerts.append(
+            {
+                "patient_id": patient_id,
+                "type": alert_type,
+                "message": template.format(**group["fired"]),
+                "details": {
+                    "readings": group["count"],
+                    "first_at": group["first"]["timestamp"],
+                    "last_at": group["last"]["timestamp"],
+                },
+                "created_at": now,
+                "resolved": False,
+            }
+        )
+    await alert_dispatcher.submit_many(alerts)
+
+    return VitalBatchResult(
+        received=len(docs), inserted=len(stored), alerts=len(alerts)
+    )
+
+
+def _public(doc: dict) -> VitalPublic:
+    return VitalPublic(
+        id=str(doc["_id"]),
+        patient_id=str(doc["patient_id"]),
+        heart_rate=doc["heart_rate"],
+        body_temp=doc["body_temp"],
+        spo2=doc["spo2"],
+        timestamp=doc["timestamp"],
+    )
+
+
 @router.get("/latest/{patient_id}", response_model=VitalPublic)
 async def get_latest_vitals(patient_id: str):
     """Get latest vitals for a patient"""
-    reading = await vitals_collection.find_one(
-        {"patient_id": ObjectId(patient_id)}, sort=[("timestamp", -1)]
-    )
+    reading = await patient_state.latest(patient_id, "vitals")
     if not reading:
         raise HTTPException(status_code=404, detail="No vitals found")
-    return VitalPublic(
-        id=str(reading["_id"]),
-        patient_id=str(reading["patient_id"]),
-        heart_rate=reading["heart_rate"],
-        body_temp=reading["body_temp"],
-        spo2=reading["spo2"],
-        timestamp=reading["timestamp"],
-    )
+    return _public({**reading, "_id": reading["id"], "patient_id": patient_id})
+
+
+def _bucket_seconds(resolution: str, hours: int) -> int:
+    match = RESOLUTION.match(resolution)
+    if not match:
+        raise HTTPException(400, "resolution must look like 30s, 5m, 1h or 1d")
+    seconds = int(match.group(1)) * UNIT_SECONDS[match.group(2)]
+    if seconds < 10:
+        raise HTTPException(400, "resolution must be at least 10s")
+    if hours * 3600 / seconds > MAX_BUCKETS:
+        raise HTTPException(400, f"At most {MAX_BUCKETS} buckets per request; use a coarser resolution")
+    return seconds
+
 
+def _bucket_pipeline(match: dict, seconds: int) -> list:
+    """Aggregation folding readings into fixed-size time buckets.
 
-@router.get("/history/{patient_id}", response_model=list[VitalPublic])
-async def get_vitals_history(patient_id: str, hours: int = 24):
-    """Get vitals history for the last X hours"""
+    Buckets are aligned to the Unix epoch, so e.g. 1h buckets start on the
+    hour (UTC) and consecutive requests return the same bucket boundaries.
+    """
+    # date - date is milliseconds, date - number is a date
+    since_epoch = {"$subtract": ["$timestamp", EPOCH]}
+    group = {
+        "_id": {"$subtract": ["$timestamp", {"$mod": [since_epoch, seconds * 1000]}]},
+        "count": {"$sum": 1},
+    }
+    project = {"_id": 0, "start": "$_id", "count": 1}
+    for field in VITAL_FIELDS:
+        project[field] = {}
+        for stat, op in (("min", "$min"), ("max", "$max"), ("mean", "$avg"), ("last", "$last")):
+            group[f"{field}_{stat}"] = {op: f"${field}"}
+            project[field][stat] = f"${field}_{stat}"
+    return [
+        {"$match": match},
+        {"$sort": {"timestamp": 1}},
+        {"$group": group},
+        {"$sort": {"_id": 1}},
+        {"$project": project},
+    ]
+
+
+@router.get("/history/{patient_id}", response_model=Union[list[VitalBucket], list[VitalPublic]])
+async def get_vitals_history(
+    patient_id: str,
+    hours: int = Query(24, ge=1, le=24 * 366),
+    resolution: Optional[str] = None,
+    points: Optional[int] = Query(None, ge=3, le=5000),
+    field: Literal["heart_rate", "body_temp", "spo2"] = "heart_rate",
+):
+    """Get vitals history for the last X hours
+
+    - default: every raw reading, newest first
+    - resolution=5m: min/max/mean/last per bucket, aggregated in MongoDB
+    - points=500: at most that many raw readings, oldest first, chosen
+      with LTTB on `field` so peaks and dips survive on a chart
+    """
+    if resolution and points:
+        raise HTTPException(400, "Use either resolution or points, not both")
     cutoff = datetime.utcnow() - timedelta(hours=hours)
-    cursor = vitals_collection.find(
-        {"patient_id": ObjectId(patient_id), "timestamp": {"$gte": cutoff}}
-    ).sort("timestamp", -1)
-
-    results = []
-    async for doc in cursor:
-        results.append(
-            VitalPublic(
-                id=str(doc["_id"]),
-                patient_id=str(doc["patient_id"]),
-                heart_rate=doc["heart_rate"],
-                body_temp=doc["body_temp"],
-                spo2=doc["spo2"],
-                timestamp=doc["timestamp"],
-            )
-        )
-    return results
+    match = {"patient_id": ObjectId(patient_id), "timestamp": {"$gte": cutoff}}
+
+    if resolution:
+        seconds = _bucket_seconds(resolution, hours)
+        cursor = vitals_collection.aggregate(_bucket_pipeline(match, seconds))
+        return [VitalBucket(**b) async for b in cursor]
+
+    if points:
+        # Stream just the charted series; whole documents are only read for
+        # the readings LTTB keeps
+        ids, x, y = [], [], []
+        cursor = vitals_collection.find(match, {"timestamp": 1, field: 1}).sort("timestamp", 1)
+        async for d in cursor.batch_size(SERIES_BATCH):
+            ids.append(d["_id"])
+            x.append(d["timestamp"].timestamp())
+            y.append(d[field])
+        kept = [ids[i] for i in lttb(x, y, points)]
+        cursor = vitals_collection.find({**match, "_id": {"$in": kept}}).sort("timestamp", 1)
+        return [_public(d) async for d in cursor]
+
+    cursor = vitals_collection.find(match).sort("timestamp", -1)
+    return [_public(doc) async for doc in cursor]
+
+
+@router.get("/summary/{patient_id}", response_model=list[VitalRollup])
+async def get_vitals_summary(
+    patient_id: str,
+    resolution: Literal["minute", "hour", "day"] = "hour",
+    days: int = Query(7, ge=1, le=366),
+):
+    """Min/max/mean/std of each vital per minute, hour or day, oldest first.
+
+    Read from the rollups kept up to date at ingest, so a weekly report
+    costs one document per bucket rather than a scan of every reading.
+    The current bucket may lag by up to ROLLUP_FLUSH_SECONDS.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    cursor = vitals_rollups_collection.find(
+        {"patient_id": ObjectId(patient_id), "resolution": resolution, "start": {"$gte": cutoff}}
+    ).sort("start", 1)
+    return [VitalRollup(**summarize(doc)) async for doc in cursor]
@@ -0,0 +1,220 @@
+"""Time-series storage for locations and vitals (MongoDB 5.0+).
+
+With TIMESERIES_COLLECTIONS enabled the two sample collections are created
+as time-series collections (timeField ``timestamp``, metaField
+``patient_id``): MongoDB groups each patient's samples into compressed
+buckets instead of storing one full document per reading. Retention is
+applied through expireAfterSeconds (LOCATIONS_RETENTION_DAYS /
+VITALS_RETENTION_DAYS, 0 keeps data forever).
+
+Collections are created by ensure_indexes at startup. An existing regular
+collection is converted with:
+
+    python -m app.timeseries status
+    python -m app.timeseries migrate [--collection vitals] [--drop-legacy]
+    python -m app.indexes
+
+Migration renames the collection to ``<name>_legacy``, creates the
+time-series collection in its place (new writes land there straight away)
+and copies the old documents over in batches. Progress is recorded after
+every batch, so running migrate again continues an interrupted copy; the
+first batch of a run skips documents an interrupted run already copied.
+Documents that are not valid samples stay in the legacy collection and are
+counted, and --drop-legacy refuses to drop it while any were skipped.
+"""
+import argparse
+import asyncio
+import logging
+import sys
+from datetime import datetime
+from typing import Dict, Optional
+
+from pymongo.errors import BulkWriteError
+
+from .config import settings
+from .db import db, locations_col, vitals_collection
+
+logger = logging.getLogger(__name__)
+
+TIME_FIELD = "timestamp"
+META_FIELD = "patient_id"
+# Index MongoDB creates by itself on (metaField, timeField)
+AUTOMATIC_INDEX = f"{META_FIELD}_1_{TIME_FIELD}_1"
+# Last legacy _id copied per collection (time-series collections have no
+# unique _id, so a copy must never be repeated)
+PROGRESS_COLLECTION = "timeseries_migrations"
+
+# collection name -> retention in days (0 = keep forever)
+TIMESERIES: Dict[str, int] = {
+    locations_col.name: settings.LOCATIONS_RETENTION_DAYS,
+    vitals_collection.name: settings.VITALS_RETENTION_DAYS,
+}
+
+
+def legacy_name(name: str) -> str:
+    return f"{name}_legacy"
+
+
+async def collection_type(database, name: str) -> Optional[str]:
+    """'collection', 'timeseries', 'view' or None if it does not exist."""
+    async for info in await database.list_collections(filter={"name": name}):
+        return info.get("type", "collection")
+    return None
+
+
+async def create_timeseries(database, name: str, retention_days: int) -> None:
+    options = {"timeseries": {"timeField": TIME_FIELD, "metaField": META_FIELD, "granularity": "seconds"}}
+    if retention_days:
+        options["expireAfterSeconds"] = retention_days * 86400
+    await database.create_collection(name, **options)
+    logger.info("Created time-series collection %s", name)
+
+
+async def ensure_timeseries(database=db) -> None:
+    """Create missing time-series collections and keep their retention current.
+
+    Must run before anything writes to them: a first insert would create a
+    regular collection instead.
+    """
+    if not settings.TIMESERIES_COLLECTIONS:
+        return
+    for name, retention_days in TIMESERIES.items():
+        kind = await collection_type(database, name)
+        if kind is None:
+            await create_timeseries(database, name, retention_days)
+        elif kind == "timeseries":
+            await database.command(
+                {"collMod": name, "expireAfterSeconds": retention_days * 86400 if retention_days else "off"}
+            )
+        else:
+            logger.warning(
+                "%s is a regular collection; run `python -m app.timeseries migrate` to convert it", name
+            )
+
+
+async def migrate(
+    name: str,
+    database=db,
+    batch_size: int = 5000,
+    drop_legacy: bool = False,
+) -> int:
+    """Convert one collection to time-series; returns the documents copied."""
+    legacy = legacy_name(name)
+    kind = await collection_type(database, name)
+    if kind == "collection":
+        if await collection_type(database, legacy) is not None:
+            raise RuntimeError(f"{legacy} already exists; drop it or finish that migration first")
+        await database[name].rename(legacy)
+        kind = None
+    if kind is None:
+        await create_timeseries(database, name, TIMESERIES[name])
+    if await collection_type(database, legacy) is None:
+        return 0
+
+    progress = database[PROGRESS_COLLECTION]
+    state = await progress.find_one({"_id": name}) or {}
+    query = {"_id": {"$gt": state["last_id"]}} if state.get("last_id") else {}
+
+    copied = 0
+    batch = []
+    # Only the batch after the recorded position can have been copied
+    # already (the run stopped between its insert and its progress update)
+    first = True
+    async for doc in database[legacy].find(query).sort("_id", 1):
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            copied += await _copy_batch(database[name], progress, batch, skip_copied=first)
+            batch, first = [], False
+    if batch:
+        copied += await _copy_batch(database[name], progress, batch, skip_copied=first)
+
+    if drop_legacy:
+        skipped = ((await progress.find_one({"_id": name})) or {}).get("skipped", 0)
+        if skipped:
+            raise RuntimeError(
+                f"{skipped} document(s) could not be copied and remain in {legacy}; "
+                "not dropping it (inspect them, then drop it by hand)"
+            )
+        await database[legacy].drop()
+        await progress.delete_one({"_id": name})
+    return copied
+
+
+async def _already_copied(target, batch: list) -> set:
+    """_ids of batch documents present in the target (looked up by time range)."""
+    stamps = [d[TIME_FIELD] for d in batch if isinstance(d.get(TIME_FIELD), datetime)]
+    if not stamps:
+        return set()
+    query = {TIME_FIELD: {"$gte": min(stamps), "$lte": max(stamps)}, "_id": {"$in": [d["_id"] for d in batch]}}
+    return {d["_id"] async for d in target.find(query, {"_id": 1})}
+
+
+async def _copy_batch(target, progress, batch: list, skip_copied: bool = False) -> int:
+    last_id = batch[-1]["_id"]
+    if skip_copied:
+        present = await _already_copied(target, batch)
+        batch = [d for d in batch if d["_id"] not in present]
+    skipped = 0
+    if batch:
+        try:
+            await target.insert_many(batch, ordered=False)
+        except BulkWriteError as exc:
+            # e.g. documents without a date in timeField; they stay in the legacy collection
+            skipped = len(exc.details.get("writeErrors", []))
+            logger.warning("Skipped %d document(s) that are not valid samples", skipped)
+    await progress.update_one(
+        {"_id": target.name}, {"$set": {"last_id": last_id}, "$inc": {"skipped": skipped}}, upsert=True
+    )
+    logger.info("Copied %d document(s) to %s up to _id %s", len(batch) - skipped, target.name, last_id)
+    return len(batch) - skipped
+
+
+async def status(database=db) -> Dict[str, dict]:
+    report = {}
+    for name in TIMESERIES:
+        legacy = legacy_name(name)
+        progress = await database[PROGRESS_COLLECTION].find_one({"_id": name}) or {}
+        report[name] = {
+            "skipped": progress.get("skipped", 0),
+            "type": await collection_type(database, name),
+            "legacy": await database[legacy].estimated_document_count()
+            if await collection_type(database, legacy)
+            else None,
+        }
+    return report
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Time-series collections for locations and vitals")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("status", help="show how each collection is stored")
+    mig = sub.add_parser("migrate", help="convert regular collections to time-series")
+    mig.add_argument("--collection", choices=sorted(TIMESERIES), action="append")
+    mig.add_argument("--batch-size", type=int, default=5000)
+    mig.add_argument("--drop-legacy", action="store_true", help="drop <name>_legacy after copying")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    if args.command == "status":
+        for name, info in asyncio.run(status()).items():
+            legacy = "" if info["legacy"] is None else f", {info['legacy']} document(s) in {legacy_name(name)}"
+            skipped = f", {info['skipped']} skipped" if info["skipped"] else ""
+            print(f"{name}: {info['type'] or 'missing'}{legacy}{skipped}")
+        return 0
+
+    async def run():
+        for name in args.collection or sorted(TIMESERIES):
+            print(f"Migrating {name}")
+            copied = await migrate(name, batch_size=args.batch_size, drop_legacy=args.drop_legacy)
+            print(f"{name}: copied {copied} document(s)")
+
+    try:
+        asyncio.run(run())
+    except RuntimeError as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -8,3 +8,10 @@ def haversine_m(lat1, lon1, lat2, lon2):
     a = math.sin(dphi/2)**2 + math.cos(phi1)*math.cos(phi2)*math.sin(dl/2)**2
     c = 2*math.atan2(math.sqrt(a), math.sqrt(1-a))
     return R*c
+
+def equirectangular_m(lat1, lon1, lat2, lon2):
+    # Flat-earth approximation; within a fraction of a percent of haversine_m
+    # over a few km, and much cheaper. Use it for coarse checks only.
+    x = math.radians(lon2-lon1) * math.cos(math.radians((lat1+lat2)/2))
+    y = math.radians(lat2-lat1)
+    return 6371000.0*math.sqrt(x*x + y*y)
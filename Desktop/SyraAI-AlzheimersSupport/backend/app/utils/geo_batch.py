@@ -0,0 +1,64 @@
+"""NumPy versions of utils.geo.haversine_m and utils.more.speed_kmh.
+
+Same formulas and Earth radius as the scalar functions, applied to whole
+arrays at once; results match them to floating-point rounding (see
+bench/geo_bench.py). Use these when processing histories, the scalar
+versions for single pings.
+"""
+from datetime import datetime, timezone
+
+import numpy as np
+
+EARTH_RADIUS_M = 6371000.0
+EPOCH = datetime(1970, 1, 1)
+
+
+def haversine_m(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance in metres; arguments broadcast like NumPy ufuncs."""
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dphi = np.radians(np.subtract(lat2, lat1))
+    dl = np.radians(np.subtract(lon2, lon1))
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dl / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS_M * c
+
+
+def consecutive_distances_m(lat, lng) -> np.ndarray:
+    """Distance between each point and the next (n points -> n - 1 values)."""
+    lat = np.asarray(lat, dtype=float)
+    lng = np.asarray(lng, dtype=float)
+    return haversine_m(lat[:-1], lng[:-1], lat[1:], lng[1:])
+
+
+def distance_to_center_m(lat, lng, center_lat: float, center_lng: float) -> np.ndarray:
+    """Distance of every point from one centre, e.g. a patient's safe zone."""
+    return haversine_m(center_lat, center_lng, np.asarray(lat, dtype=float), np.asarray(lng, dtype=float))
+
+
+def to_seconds(timestamps) -> np.ndarray:
+    """Seconds since the epoch for datetimes, datetime64 or numbers."""
+    if isinstance(timestamps, np.ndarray) and timestamps.dtype.kind in "iufM":
+        if timestamps.dtype.kind == "M":
+            return timestamps.astype("datetime64[us]").astype(np.int64) / 1e6
+        return timestamps.astype(float)
+    ts = list(timestamps)
+    if not ts or not isinstance(ts[0], datetime):
+        return np.asarray(ts, dtype=float)
+    # timedelta.total_seconds, as the scalar speed_kmh uses; much faster
+    # than converting the datetimes to datetime64
+    epoch = EPOCH.replace(tzinfo=timezone.utc) if ts[0].tzinfo else EPOCH
+    return np.fromiter(((t - epoch).total_seconds() for t in ts), dtype=float, count=len(ts))
+
+
+def speed_kmh(lat, lng, timestamps) -> np.ndarray:
+    """Speed between consecutive pings (n pings -> n - 1 values).
+
+    NaN where the scalar speed_kmh returns None: time not moving forward.
+    """
+    t = to_seconds(timestamps)
+    dt = np.diff(t)
+    dist = consecutive_distances_m(lat, lng)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        kmh = (dist / 1000.0) / (dt / 3600.0)
+    return np.where(dt > 0, kmh, np.nan)
@@ -0,0 +1,41 @@
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict
+
+from PIL import Image, ImageOps
+
+# variant name -> longest side in pixels
+VARIANTS = {"thumb": 256, "medium": 1024}
+WEBP_QUALITY = 80
+
+
+def make_variants(src: Path, dest_dir: Path, stem: str) -> Dict[str, str]:
+    """Write downscaled WebP copies of src next to it; returns {variant: filename}.
+
+    CPU-bound, so call it from a worker thread. Existing variants are kept,
+    which makes re-running it for a duplicate upload cheap.
+    """
+    out = {}
+    with Image.open(src) as img:
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA" if "A" in img.getbands() else "RGB")
+        for name, size in VARIANTS.items():
+            filename = f"{stem}_{name}.webp"
+            path = dest_dir / filename
+            if not path.exists():
+                variant = img.copy()
+                variant.thumbnail((size, size))
+                # unique temp name: concurrent builds of one variant must not
+                # write the same file; the last replace wins with equal bytes
+                with tempfile.NamedTemporaryFile(dir=dest_dir, suffix=".tmp", delete=False) as tmp:
+                    try:
+                        variant.save(tmp, "WEBP", quality=WEBP_QUALITY, method=4)
+                    except BaseException:
+                        tmp.close()
+                        os.unlink(tmp.name)
+                        raise
+                os.replace(tmp.name, path)
+            out[name] = filename
+    return out
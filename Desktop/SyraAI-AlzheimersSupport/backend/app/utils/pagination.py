@@ -0,0 +1,28 @@
+import base64
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+
+
+def encode_cursor(value: datetime, _id: ObjectId) -> str:
+    """Opaque keyset cursor pointing just after (value, _id) in a descending scan."""
+    raw = json.dumps([value.isoformat(), str(_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, ObjectId]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        value, _id = json.loads(raw)
+        return datetime.fromisoformat(value), ObjectId(_id)
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(400, "Invalid cursor")
+
+
+def after_cursor(field: str, cursor: str) -> dict:
+    """Filter for documents after the cursor when sorting by (field, _id) descending."""
+    value, _id = decode_cursor(cursor)
+    return {"$or": [{field: {"$lt": value}}, {field: value, "_id": {"$lt": _id}}]}
@@ -0,0 +1,106 @@
+import math
+from datetime import datetime, timedelta
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+
+from .geo import haversine_m
+
+EARTH_RADIUS_M = 6371000.0
+
+
+def _to_metres(points: Sequence[Tuple[float, float]]) -> np.ndarray:
+    """(lat, lng) pairs as x/y metres on a plane tangent at the first point."""
+    pts = np.radians(np.asarray(points, dtype=float))
+    x = (pts[:, 1] - pts[0, 1]) * math.cos(pts[0, 0]) * EARTH_RADIUS_M
+    y = (pts[:, 0] - pts[0, 0]) * EARTH_RADIUS_M
+    return np.column_stack((x, y))
+
+
+def simplify(points: Sequence[Tuple[float, float]], tolerance_m: float) -> list:
+    """Douglas-Peucker: indices of the (lat, lng) points to keep.
+
+    Drops every point closer than tolerance_m to the line through the
+    points kept around it. First and last points are always kept.
+    """
+    n = len(points)
+    if n < 3 or tolerance_m <= 0:
+        return list(range(n))
+    xy = _to_metres(points)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        a, b = xy[first], xy[last]
+        inner = xy[first + 1:last]
+        ab = b - a
+        length2 = float(ab @ ab)
+        if length2 == 0.0:
+            dist = np.hypot(*(inner - a).T)
+        else:
+            # distance to the segment, not the infinite line
+            t = np.clip((inner - a) @ ab / length2, 0.0, 1.0)
+            dist = np.hypot(*(inner - (a + t[:, None] * ab)).T)
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance_m:
+            mid = first + 1 + i
+            keep[mid] = True
+            stack.append((first, mid))
+            stack.append((mid, last))
+    return np.flatnonzero(keep).tolist()
+
+
+class StopDetector:
+    """Finds stops (dwells) in a time-ordered stream of pings.
+
+    A stop is a run of pings all within radius_m of the run's first ping
+    lasting at least min_duration. Feed pings one by one; a stop is
+    returned once a ping leaves it, and by finish() for the final run.
+    """
+
+    def __init__(self, radius_m: float = 50.0, min_duration: timedelta = timedelta(minutes=5)):
+        self.radius_m = radius_m
+        self.min_duration = min_duration
+        self._reset(None)
+
+    def _reset(self, ping: Optional[Tuple[float, float, datetime]]) -> None:
+        if ping is None:
+            self._anchor = None
+            self._count = 0
+            return
+        lat, lng, ts = ping
+        self._anchor = (lat, lng)
+        self._sum_lat, self._sum_lng = lat, lng
+        self._count = 1
+        self._start = self._end = ts
+
+    def _stop(self) -> Optional[dict]:
+        if self._anchor is None or self._end - self._start < self.min_duration:
+            return None
+        return {
+            "lat": self._sum_lat / self._count,
+            "lng": self._sum_lng / self._count,
+            "start": self._start,
+            "end": self._end,
+            "duration_s": int((self._end - self._start).total_seconds()),
+            "points": self._count,
+        }
+
+    def feed(self, lat: float, lng: float, ts: datetime) -> Optional[dict]:
+        if self._anchor is not None and haversine_m(*self._anchor, lat, lng) <= self.radius_m:
+            self._sum_lat += lat
+            self._sum_lng += lng
+            self._count += 1
+            self._end = ts
+            return None
+        stop = self._stop()
+        self._reset((lat, lng, ts))
+        return stop
+
+    def finish(self) -> Optional[dict]:
+        stop = self._stop()
+        self._reset(None)
+        return stop
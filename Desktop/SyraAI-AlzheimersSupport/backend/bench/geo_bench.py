@@ -0,0 +1,78 @@
+"""Scalar vs NumPy geo helpers over a synthetic ping history.
+
+Times utils.geo / utils.more (one Python call per ping) against
+utils.geo_batch (one call per history) and checks both give the same
+numbers.
+
+    python -m bench.geo_bench --pings 200000
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.utils import geo, geo_batch, more
+
+
+def history(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    lat = 51.5 + np.cumsum(rng.normal(0, 1e-4, n))
+    lng = -0.12 + np.cumsum(rng.normal(0, 1e-4, n))
+    start = datetime(2024, 1, 1)
+    seconds = np.cumsum(rng.integers(0, 30, n))  # some repeated timestamps
+    times = [start + timedelta(seconds=int(s)) for s in seconds]
+    return lat.tolist(), lng.tolist(), times
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pings", type=int, default=200_000)
+    args = parser.parse_args(argv)
+    lat, lng, times = history(args.pings)
+    clat, clng = lat[0], lng[0]
+
+    cases = [
+        (
+            "consecutive distances",
+            lambda: [geo.haversine_m(lat[i], lng[i], lat[i + 1], lng[i + 1]) for i in range(len(lat) - 1)],
+            lambda: geo_batch.consecutive_distances_m(lat, lng),
+        ),
+        (
+            "distance to center",
+            lambda: [geo.haversine_m(clat, clng, la, ln) for la, ln in zip(lat, lng)],
+            lambda: geo_batch.distance_to_center_m(lat, lng, clat, clng),
+        ),
+        (
+            "speed series",
+            lambda: [
+                more.speed_kmh(lat[i], lng[i], times[i], lat[i + 1], lng[i + 1], times[i + 1])
+                for i in range(len(lat) - 1)
+            ],
+            lambda: geo_batch.speed_kmh(lat, lng, times),
+        ),
+    ]
+
+    print(f"{args.pings} pings")
+    print(f"{'':24}{'scalar':>10}{'numpy':>10}{'speedup':>9}{'max rel diff':>14}")
+    for name, scalar, batch in cases:
+        expected, t_scalar = timed(scalar)
+        got, t_batch = timed(batch)
+        expected = np.array([np.nan if v is None else v for v in expected])
+        both = ~np.isnan(expected)
+        assert np.array_equal(both, ~np.isnan(got)), f"{name}: undefined values differ"
+        rel = np.abs(got[both] - expected[both]) / np.maximum(np.abs(expected[both]), 1e-12)
+        print(
+            f"{name:24}{t_scalar * 1000:>8.1f}ms{t_batch * 1000:>8.1f}ms"
+            f"{t_scalar / t_batch:>8.0f}x{rel.max():>14.1e}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Event-loop latency while many logins verify passwords at once.
+
+Runs the bcrypt check the way the login handler does, first inline on the
+event loop (the old behaviour) and then through app.auth.hashing_pool,
+while a ticker task measures how late the loop wakes it up. A late ticker
+is exactly what a concurrent location ping or vitals upload would feel.
+
+    python -m bench.login_bench --logins 50 --rounds 12
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.auth import HashingPool, pwd_context, verify_password
+
+TICK = 0.005
+
+
+async def ticker(lags: list, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def run(mode: str, logins: int, hashed: str, pool: HashingPool) -> dict:
+    lags: list = []
+    stop = asyncio.Event()
+    tick_task = asyncio.create_task(ticker(lags, stop))
+    await asyncio.sleep(TICK * 2)
+
+    async def login_inline():
+        verify_password("correct horse", hashed)
+
+    async def login_pooled():
+        await pool.run(verify_password, "correct horse", hashed)
+
+    login = login_inline if mode == "inline" else login_pooled
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick_task
+
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    return {
+        "mode": mode,
+        "logins/s": logins / elapsed,
+        "loop lag p50 ms": statistics.median(lags_ms),
+        "loop lag p99 ms": lags_ms[int(len(lags_ms) * 0.99) - 1 if len(lags_ms) > 1 else 0],
+        "loop lag max ms": lags_ms[-1],
+        "peak queued": pool.stats()["peak_pending"] if mode == "pool" else 0,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost factor")
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    hashed = pwd_context.hash("correct horse", rounds=args.rounds)
+    pool = HashingPool(workers=args.workers, max_pending=args.logins)
+    for mode in ("inline", "pool"):
+        result = asyncio.run(run(mode, args.logins, hashed, pool))
+        print("  ".join(f"{k}={v:.1f}" if isinstance(v, float) else f"{k}={v}" for k, v in result.items()))
+    pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
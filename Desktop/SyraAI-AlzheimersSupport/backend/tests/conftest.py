@@ -0,0 +1,70 @@
+"""Shared fixtures: the app against an in-memory MongoDB (mongomock-motor).
+
+The Motor client class is replaced before ``app`` is imported, so every
+module-level collection handle points at the in-memory database. Each test
+gets an empty database.
+"""
+import os
+import tempfile
+
+import pytest
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+import motor.motor_asyncio  # noqa: E402
+
+motor.motor_asyncio.AsyncIOMotorClient = mongomock_motor.AsyncMongoMockClient
+
+_scratch = tempfile.mkdtemp(prefix="sara-tests-")
+os.environ.update(
+    CREATE_INDEXES_ON_STARTUP="false",
+    EVENT_BUS="memory",
+    BLOB_STORE_DIR=os.path.join(_scratch, "blobs"),
+    MODEL_DIR=os.path.join(_scratch, "models"),
+    BCRYPT_ROUNDS="4",
+    LIVE_HEARTBEAT_SECONDS="0.5",
+)
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.auth import clear_principal_cache  # noqa: E402
+from app.db import db  # noqa: E402
+from app.geofence import geofence_cache  # noqa: E402
+from app.main import app  # noqa: E402
+from app.routes.patients import _overviews  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    with TestClient(app) as c:
+        yield c
+        c.portal.call(db.client.drop_database, db.name)
+    clear_principal_cache()
+    geofence_cache.clear()
+    _overviews.clear()
+
+
+@pytest.fixture
+def make_user(client):
+    """make_user(email, role) -> (user id, auth headers)."""
+
+    def make(email: str, role: str = "caretaker"):
+        r = client.post("/api/auth/register", json={"email": email, "password": "pw", "name": "n", "role": role})
+        assert r.status_code == 200, r.text
+        token = client.post("/api/auth/login", json={"email": email, "password": "pw"}).json()["access_token"]
+        return r.json()["id"], {"Authorization": f"Bearer {token}"}
+
+    return make
+
+
+@pytest.fixture
+def make_patient(client):
+    """make_patient(caretaker id, headers, **fields) -> patient id."""
+
+    def make(caretaker_id: str, headers: dict, **fields):
+        body = {"name": "p", "caretaker_id": caretaker_id, "safe_center_lat": 10.0, "safe_center_lng": 10.0, **fields}
+        r = client.post("/api/patients/", json=body, headers=headers)
+        assert r.status_code == 200, r.text
+        return r.json()["id"]
+
+    return make
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+from app.alerts.engine import AlertEngine
+from app.db import alerts_collection, patient_state_collection
+
+ESCALATION = timedelta(minutes=15)
+
+
+def _open_count(call, patient_id: str) -> int:
+    return call(alerts_collection.count_documents, {"patient_id": ObjectId(patient_id), "state": "open"})
+
+
+def test_episode_opens_escalates_and_closes(client):
+    call = client.portal.call
+    engine = AlertEngine(ESCALATION)
+    pid, t0 = str(ObjectId()), datetime(2026, 4, 1, 9, tzinfo=timezone.utc)
+
+    alert_id = call(engine.observe, pid, "geofence_breach", True, "Outside", None, t0)
+    assert call(engine.observe, pid, "geofence_breach", True, "Outside", None, t0 + timedelta(minutes=1)) == alert_id
+    assert call(engine.observe, pid, "geofence_breach", True, "Outside", None, t0 + ESCALATION) == alert_id
+    doc = call(alerts_collection.find_one, {"_id": alert_id})
+    assert (doc["state"], doc["escalations"], doc["observations"]) == ("open", 1, 3)
+    assert call(patient_state_collection.find_one, {"_id": ObjectId(pid)})["open_alerts"] == 1
+
+    assert call(engine.observe, pid, "geofence_breach", False, "", None, t0 + ESCALATION * 2) is None
+    doc = call(alerts_collection.find_one, {"_id": alert_id})
+    assert (doc["state"], doc["resolved"]) == ("closed", True)
+    assert call(patient_state_collection.find_one, {"_id": ObjectId(pid)})["open_alerts"] == 0
+    assert not engine._locks
+
+
+def test_second_worker_joins_the_open_episode(client):
+    """Under the unique open-episode index a second process reuses the episode instead of opening another."""
+    call = client.portal.call
+    # mongomock has no partial indexes; with no closed episodes a plain unique index behaves the same
+    call(lambda: alerts_collection.create_index([("patient_id", 1), ("type", 1)], unique=True))
+    first, second = AlertEngine(ESCALATION), AlertEngine(ESCALATION)
+    pid, t0 = str(ObjectId()), datetime(2026, 4, 1, 9, tzinfo=timezone.utc)
+
+    # the second worker believes the patient is clear, then the first opens an episode
+    assert call(second.observe, pid, "geofence_breach", False, "", None, t0) is None
+    alert_id = call(first.observe, pid, "geofence_breach", True, "Outside", None, t0)
+    assert call(second.observe, pid, "geofence_breach", True, "Outside", None, t0) == alert_id
+    assert _open_count(call, pid) == 1
+
+
+def test_episode_closed_elsewhere_is_forgotten(client):
+    call = client.portal.call
+    first, second = AlertEngine(ESCALATION), AlertEngine(ESCALATION)
+    pid, t0 = str(ObjectId()), datetime(2026, 4, 1, 9, tzinfo=timezone.utc)
+
+    alert_id = call(first.observe, pid, "geofence_breach", True, "Outside", None, t0)
+    assert call(second.observe, pid, "geofence_breach", True, "Outside", None, t0) == alert_id
+    call(first.observe, pid, "geofence_breach", False, "", None, t0 + timedelta(minutes=1))
+
+    # the second worker's escalation finds the episode closed and drops it
+    assert call(second.observe, pid, "geofence_breach", True, "Outside", None, t0 + ESCALATION) is None
+    assert second.open_episode(pid, "geofence_breach") is None
+    # the condition persisting opens a new episode
+    new_id = call(second.observe, pid, "geofence_breach", True, "Outside", None, t0 + ESCALATION * 2)
+    assert new_id not in (None, alert_id)
+    assert _open_count(call, pid) == 1
@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app.db import alerts_collection
+from app.utils.pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trips():
+    value, _id = datetime(2026, 5, 1, 12, 30, 15, 123000), ObjectId()
+    assert decode_cursor(encode_cursor(value, _id)) == (value, _id)
+
+
+def test_alert_feed_pages_through_ties_once_each(client, make_user):
+    _, headers = make_user("carer@example.com")
+    patient = ObjectId()
+    base = datetime(2026, 5, 1, 12, 0)
+    # three alerts share one created_at: the _id breaks the tie
+    stamps = [base, base + timedelta(minutes=1), *[base + timedelta(minutes=2)] * 3, base + timedelta(minutes=3)]
+    docs = [
+        {"_id": ObjectId(), "patient_id": patient, "type": "sos", "message": str(i), "created_at": at}
+        for i, at in enumerate(stamps)
+    ]
+    docs.append({"_id": ObjectId(), "patient_id": ObjectId(), "type": "sos", "message": "other", "created_at": base})
+    client.portal.call(alerts_collection.insert_many, docs)
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        r = client.get(f"/api/locations/alerts/{patient}", params=params, headers=headers)
+        assert r.status_code == 200
+        seen += [a["id"] for a in r.json()]
+        pages += 1
+        cursor = r.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+
+    expected = sorted(docs[:-1], key=lambda d: (d["created_at"], d["_id"]), reverse=True)
+    assert seen == [str(d["_id"]) for d in expected]
+    assert pages == 3
+
+
+def test_alert_feed_rejects_bad_cursor(client, make_user):
+    _, headers = make_user("carer@example.com")
+    r = client.get(f"/api/locations/alerts/{ObjectId()}", params={"cursor": "not-a-cursor"}, headers=headers)
+    assert r.status_code == 400
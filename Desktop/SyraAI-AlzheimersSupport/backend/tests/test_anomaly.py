@@ -0,0 +1,33 @@
+from app.ml.anomaly import PatientState
+
+# about 11 m per 1e-4 degree of latitude
+STEP_DEG = 1e-4
+
+
+def walk(state, start_t, pings, lat=51.5, lng=-0.12, every=10):
+    """Walk north at ~4 km/h (11 m per 10 s); returns the assessments."""
+    out = []
+    for i in range(pings):
+        out.append(state.update(lat + i * STEP_DEG, lng, start_t + i * every))
+    return out
+
+
+def test_single_gps_outlier_does_not_report_unusual_speed():
+    state = PatientState()
+    assessments = walk(state, 0, 20)
+    # one fix 1 km off, then back on the track
+    assessments.append(state.update(51.5 + 0.009 + 20 * STEP_DEG, -0.12, 200))
+    assessments.append(state.update(51.5 + 21 * STEP_DEG, -0.12, 210))
+    assessments += walk(state, 220, 10, lat=51.5 + 22 * STEP_DEG)
+    assert not any(a.unusual_speed for a in assessments)
+
+
+def test_sustained_fast_movement_reports_unusual_speed():
+    state = PatientState()
+    walk(state, 0, 20)
+    # driven away: ~180 m per 10 s (65 km/h)
+    fast = [state.update(51.5 + 20 * STEP_DEG + i * 0.0016, -0.12, 200 + i * 10) for i in range(1, 5)]
+    assert not fast[0].unusual_speed
+    assert all(a.unusual_speed for a in fast[1:])
+    # stops: the episode can clear
+    assert not state.update(51.5 + 20 * STEP_DEG + 4 * 0.0016, -0.12, 250).unusual_speed
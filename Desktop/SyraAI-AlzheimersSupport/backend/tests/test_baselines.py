@@ -0,0 +1,77 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from app.ml.baselines import MIN_SAMPLES, RULES, VitalBaselines, VitalState  # noqa: E402
+
+HIGH_HR = RULES.index("high_heart_rate")
+NOON = datetime(2026, 3, 2, 12, tzinfo=timezone.utc).timestamp()
+
+
+def _feed(state: VitalState, heart_rates, start: float = NOON):
+    """Readings one minute apart within one hour; returns their evaluations."""
+    return [state.update(hr, 36.6, 97, start + 60 * (i % 60)) for i, hr in enumerate(heart_rates)]
+
+
+def test_population_limits_apply_until_the_baseline_warms_up():
+    state = VitalState()
+    evaluations = _feed(state, [125] * 3)
+    assert all(HIGH_HR in e.broken for e in evaluations)
+    assert [e.fired for e in evaluations] == [(), (), (HIGH_HR,)]
+
+    # a patient whose resting rate is 125 stops alerting once learned
+    evaluations = _feed(state, [125] * MIN_SAMPLES)
+    assert HIGH_HR not in evaluations[-1].broken
+    assert state.streaks[HIGH_HR] == 0
+
+
+def test_slow_drift_is_learned_but_a_jump_is_not():
+    state = VitalState()
+    _feed(state, [70] * 60)
+    drift = _feed(state, [70 + 0.1 * i for i in range(1, 501)])
+    assert not any(e.broken for e in drift)
+    learned = state.hr_hour_mean[12]
+    assert learned > 115
+
+    jump = _feed(state, [learned + 30] * 10)
+    assert jump[2].fired == (HIGH_HR,)
+    assert all(HIGH_HR in e.broken for e in jump)
+    # an alerting streak does not become the new normal
+    assert abs(state.hr_hour_mean[12] - learned) < 5
+
+
+def test_hard_limits_always_break():
+    state = VitalState()
+    _feed(state, [155] * 60)
+    assert HIGH_HR in _feed(state, [155])[0].broken
+    assert state.hr_n == 0
+
+
+def test_assess_many_in_time_order_and_checkpoint_restore():
+    async def run():
+        collection = mongomock_motor.AsyncMongoMockClient()["baselines_test"]["vital_baselines"]
+        pid = ObjectId()
+        t0 = datetime(2026, 3, 2, 12)
+        docs = [
+            {"patient_id": pid, "heart_rate": hr, "body_temp": 36.6, "spo2": 97, "timestamp": t0 + timedelta(minutes=m)}
+            for m, hr in ((2, 125), (0, 125), (1, 80))
+        ]
+        first = VitalBaselines(collection)
+        evaluations = await first.assess_many(docs)
+        # in time order the 80 bpm reading breaks the streak of 125s
+        assert [HIGH_HR in e.broken for e in evaluations] == [True, True, False]
+        assert first._states[str(pid)].streaks[HIGH_HR] == 1
+        await first.checkpoint()
+
+        restored = VitalBaselines(collection)
+        state = await restored._state(str(pid))
+        assert state.to_doc() == first._states[str(pid)].to_doc()
+        # the streak carries over a restart
+        evaluation = await restored.assess(str(pid), 125, 36.6, 97, t0 + timedelta(minutes=3))
+        assert state.streaks[HIGH_HR] == 2 and evaluation.fired == ()
+
+    asyncio.run(run())
@@ -0,0 +1,99 @@
+import asyncio
+from datetime import timedelta
+
+from bson import ObjectId
+
+from app.alerts.dispatcher import AlertDispatcher, _now
+from app.alerts.sinks import FakeSink
+from app.db import alert_outbox_collection, alerts_collection, devices_collection
+
+
+class HangingSink(FakeSink):
+    """Never finishes a send, like a process that dies mid-delivery."""
+
+    async def send(self, alert: dict) -> None:
+        await asyncio.Event().wait()
+
+
+def _dispatcher(*sinks) -> AlertDispatcher:
+    dispatcher = AlertDispatcher(workers=1, backoff_base=0.01, sweep_interval=0.02)
+    dispatcher.sinks = list(sinks)
+    return dispatcher
+
+
+async def _settled(outbox_id, timeout: float = 5.0) -> dict:
+    for _ in range(int(timeout / 0.02)):
+        entry = await alert_outbox_collection.find_one({"_id": outbox_id})
+        if entry and entry["state"] != "pending":
+            return entry
+        await asyncio.sleep(0.02)
+    raise AssertionError("outbox entry still pending")
+
+
+def test_submit_stores_then_workers_deliver_with_retries(client):
+    sink = FakeSink(fail_times=2)
+
+    async def run():
+        dispatcher = _dispatcher(sink)
+        await dispatcher.start()
+        try:
+            alert_id = await dispatcher.submit({"patient_id": ObjectId(), "type": "sos", "message": "Help"})
+            # stored before submit returns, whatever the workers do
+            assert await alerts_collection.find_one({"_id": alert_id})
+            entry = await alert_outbox_collection.find_one({"alert_id": alert_id})
+            return alert_id, await _settled(entry["_id"]), dispatcher.stats()
+        finally:
+            await dispatcher.stop()
+
+    alert_id, entry, stats = client.portal.call(run)
+    assert (entry["state"], entry["attempts"], entry["sinks_done"]) == ("sent", 2, ["fake"])
+    assert [a["_id"] for a in sink.sent] == [alert_id]
+    assert stats["delivered"] == 1
+
+
+def test_outbox_entry_is_replayed_after_a_crash(client):
+    sink = FakeSink()
+
+    async def run():
+        crashed = _dispatcher(HangingSink())
+        await crashed.start()
+        alert_id = await crashed.submit({"patient_id": ObjectId(), "type": "sos", "message": "Help"})
+        await asyncio.sleep(0.05)
+        # the process dies: tasks gone, the entry still leased to it
+        for task in crashed._tasks:
+            task.cancel()
+        await asyncio.gather(*crashed._tasks, return_exceptions=True)
+        entry = await alert_outbox_collection.find_one({"alert_id": alert_id})
+        assert entry["state"] == "pending" and entry["next_attempt_at"] > _now().replace(tzinfo=None)
+
+        # once the lease runs out another worker process delivers it
+        await alert_outbox_collection.update_one(
+            {"_id": entry["_id"]}, {"$set": {"next_attempt_at": _now() - timedelta(seconds=1)}}
+        )
+        survivor = _dispatcher(sink)
+        await survivor.start()
+        try:
+            return alert_id, await _settled(entry["_id"])
+        finally:
+            await survivor.stop()
+
+    alert_id, entry = client.portal.call(run)
+    assert entry["state"] == "sent"
+    assert [a["_id"] for a in sink.sent] == [alert_id]
+
+
+def test_vitals_batch_coalesces_alerts_per_patient_and_rule(client):
+    patient = ObjectId()
+    client.portal.call(devices_collection.insert_one, {"patient_id": patient, "device_token": "pendant"})
+    readings = [
+        {"patient_id": str(patient), "heart_rate": 190, "body_temp": 40.5, "spo2": 97, "timestamp": f"2026-01-01T00:00:{s:02d}"}
+        for s in range(6)
+    ]
+    r = client.post("/api/vitals/batch", json=readings, headers={"device-token": "pendant"})
+    assert r.status_code == 200, r.text
+    assert r.json()["alerts"] == 2
+
+    alerts = client.portal.call(lambda: alerts_collection.find({"patient_id": patient}).to_list(None))
+    assert sorted(a["message"] for a in alerts) == ["High heart rate detected: 190 bpm", "High temperature detected: 40.5°C"]
+    assert all(a["details"]["readings"] == 6 for a in alerts)
+    assert client.portal.call(alert_outbox_collection.count_documents, {"alert_id": {"$in": [a["_id"] for a in alerts]}}) == 2
@@ -0,0 +1,58 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson import ObjectId
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from app.realtime.bus import InMemoryEventBus, PollingEventBus  # noqa: E402
+
+
+def _events_collection():
+    return mongomock_motor.AsyncMongoMockClient()["bus_test"]["events"]
+
+
+def test_polling_bus_delivers_burst_larger_than_a_page():
+    """Every event of a burst bigger than batch_size, all inside the look-back, is dispatched once."""
+
+    async def run():
+        bus = PollingEventBus(_events_collection(), batch_size=100)
+        received = []
+        bus.subscribe(received.append)
+
+        since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=1)
+        await bus.publish("vitals", [{"patient_id": ObjectId(), "n": i} for i in range(250)])
+        for _ in range(3):
+            since = await bus._poll_once(since)
+        return received
+
+    received = asyncio.run(run())
+    assert sorted(e["data"]["n"] for e in received) == list(range(250))
+    assert {e["type"] for e in received} == {"vitals"}
+
+
+def test_polling_and_memory_buses_deliver_the_same_events():
+    """Updates published as events (an alert closing) reach polling subscribers like memory ones."""
+    patient_id, alert_id = ObjectId(), ObjectId()
+    published = [
+        ("alert", [{"_id": alert_id, "patient_id": patient_id, "type": "geofence", "state": "open"}]),
+        ("alert", [{"_id": alert_id, "patient_id": patient_id, "type": "geofence", "state": "closed"}]),
+        ("vitals", [{"patient_id": patient_id, "heart_rate": 70}, {"patient_id": patient_id, "heart_rate": 71}]),
+    ]
+
+    async def run(bus, poll):
+        received = []
+        bus.subscribe(received.append)
+        since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=1)
+        for kind, docs in published:
+            await bus.publish(kind, docs)
+        if poll:
+            await bus._poll_once(since)
+        return [(e["type"], e["patient_id"], e["data"].get("state"), e["data"].get("heart_rate")) for e in received]
+
+    memory = asyncio.run(run(InMemoryEventBus(), poll=False))
+    polled = asyncio.run(run(PollingEventBus(_events_collection()), poll=True))
+    assert polled == memory
+    assert [state for _, _, state, _ in memory[:2]] == ["open", "closed"]
+    assert len(memory) == 4
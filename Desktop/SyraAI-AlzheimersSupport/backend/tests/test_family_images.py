@@ -0,0 +1,70 @@
+import io
+
+from PIL import Image
+
+
+def _png() -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 48), (20, 100, 10)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def test_linked_patient_reads_own_gallery(client, make_user, make_patient):
+    caretaker_id, caretaker = make_user("carer@example.com")
+    patient_user_id, patient = make_user("patient@example.com", role="patient")
+    _, stranger = make_user("stranger@example.com", role="patient")
+    pid = make_patient(caretaker_id, caretaker, user_id=patient_user_id)
+
+    up = client.post("/api/family/upload", data={"patient_id": pid}, files={"file": ("a.png", _png(), "image/png")}, headers=caretaker)
+    assert up.status_code == 200, up.text
+
+    r = client.get(f"/api/family/{pid}", headers=patient)
+    assert r.status_code == 200
+    assert [img["id"] for img in r.json()] == [up.json()["id"]]
+    assert client.get(f"/api/family/{pid}", headers=stranger).status_code == 404
+
+
+def test_patient_linked_later_and_other_caretakers_refused(client, make_user, make_patient):
+    caretaker_id, caretaker = make_user("carer@example.com")
+    _, other = make_user("other@example.com")
+    patient_user_id, patient = make_user("patient@example.com", role="patient")
+    pid = make_patient(caretaker_id, caretaker)
+
+    assert client.get(f"/api/family/{pid}", headers=patient).status_code == 404
+    r = client.put(f"/api/patients/{pid}/user", json={"user_id": patient_user_id}, headers=caretaker)
+    assert r.status_code == 200 and r.json()["user_id"] == patient_user_id
+    assert client.get(f"/api/family/{pid}", headers=patient).status_code == 200
+
+    up = client.post("/api/family/upload", data={"patient_id": pid}, files={"file": ("a.png", _png(), "image/png")}, headers=caretaker)
+    assert client.get(f"/api/family/{pid}", headers=other).status_code == 404
+    assert client.delete(f"/api/family/{up.json()['id']}", headers=other).status_code == 404
+    assert client.delete(f"/api/family/{up.json()['id']}", headers=caretaker).status_code == 200
+
+
+def test_linking_requires_a_patient_account(client, make_user, make_patient):
+    caretaker_id, caretaker = make_user("carer@example.com")
+    pid = make_patient(caretaker_id, caretaker)
+    r = client.put(f"/api/patients/{pid}/user", json={"user_id": caretaker_id}, headers=caretaker)
+    assert r.status_code == 404
+
+
+def test_deleted_image_blob_survives_reupload_until_gc(client, make_user, make_patient):
+    from app.blobstore import collect_garbage, family_blobs
+
+    caretaker_id, caretaker = make_user("carer@example.com")
+    pid = make_patient(caretaker_id, caretaker)
+    png = _png()
+
+    first = client.post("/api/family/upload", data={"patient_id": pid}, files={"file": ("a.png", png, "image/png")}, headers=caretaker).json()
+    blob = first["image_url"].rsplit("/", 1)[1]
+    assert client.delete(f"/api/family/{first['id']}", headers=caretaker).status_code == 200
+    assert family_blobs.exists(blob)
+
+    second = client.post("/api/family/upload", data={"patient_id": pid}, files={"file": ("a.png", png, "image/png")}, headers=caretaker).json()
+    assert client.get(second["image_url"]).status_code == 200
+    assert client.portal.call(collect_garbage, False, 0) == []
+
+    client.delete(f"/api/family/{second['id']}", headers=caretaker)
+    assert client.portal.call(collect_garbage, True, 3600) == []
+    assert client.portal.call(collect_garbage, False, -1) == [blob.split(".")[0]]
+    assert client.get(second["image_url"], headers={"If-None-Match": f'"{blob.split(".")[0]}"'}).status_code == 404
@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+
+def _token(headers: dict) -> str:
+    return headers["Authorization"].split()[1]
+
+
+def _next_event(ws, kind: str, attempts: int = 20) -> dict:
+    for _ in range(attempts):
+        msg = ws.receive_json()
+        if msg["type"] == kind:
+            return msg
+    raise AssertionError(f"no {kind} event")
+
+
+def test_linked_patient_receives_scheduled_reminder(client, make_user, make_patient):
+    caretaker_id, caretaker = make_user("carer@example.com")
+    patient_user_id, patient = make_user("patient@example.com", role="patient")
+    pid = make_patient(caretaker_id, caretaker, user_id=patient_user_id)
+
+    with client.websocket_connect(f"/api/live/ws?token={_token(patient)}") as ws:
+        assert ws.receive_json() == {"type": "subscribed", "patient_ids": [pid]}
+        when = datetime.now(timezone.utc) + timedelta(seconds=1)
+        r = client.post("/api/reminders/", json={"patient_id": pid, "title": "Pills", "when": when.isoformat()}, headers=caretaker)
+        assert r.status_code == 200, r.text
+
+        event = _next_event(ws, "reminder")
+        assert event["patient_id"] == pid
+        assert event["data"]["reminder_id"] == r.json()["id"]
+        assert event["data"]["title"] == "Pills"
+
+
+def test_unlinked_patient_is_refused(client, make_user):
+    _, patient = make_user("patient@example.com", role="patient")
+    with pytest.raises(WebSocketDisconnect) as closed:
+        with client.websocket_connect(f"/api/live/ws?token={_token(patient)}") as ws:
+            ws.receive_json()
+    assert closed.value.code == 1008
+    assert client.get(f"/api/live/events?token={_token(patient)}").status_code == 403
+
+
+def test_patient_cannot_watch_other_patients(client, make_user, make_patient):
+    caretaker_id, caretaker = make_user("carer@example.com")
+    patient_user_id, patient = make_user("patient@example.com", role="patient")
+    own = make_patient(caretaker_id, caretaker, user_id=patient_user_id)
+    other = make_patient(caretaker_id, caretaker)
+
+    with client.websocket_connect(f"/api/live/ws?token={_token(patient)}&patient_id={own}&patient_id={other}") as ws:
+        assert ws.receive_json()["patient_ids"] == [own]
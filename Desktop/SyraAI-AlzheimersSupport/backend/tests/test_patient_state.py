@@ -0,0 +1,36 @@
+from datetime import datetime
+
+from bson import ObjectId
+
+from app import patient_state
+from app.db import locations_col, patient_state_collection
+
+
+def test_patient_without_history_is_looked_up_once(client):
+    call = client.portal.call
+    pid = ObjectId()
+    assert call(patient_state.latest_many, [pid], ("location",)) == {pid: {"location": None}}
+    assert call(patient_state_collection.find_one, {"_id": pid}) == {"_id": pid, "location": None}
+
+    # history written behind record()'s back is not searched for again
+    call(locations_col.insert_one, {"patient_id": pid, "lat": 1.0, "lng": 2.0, "timestamp": datetime(2026, 1, 1)})
+    assert call(patient_state.latest_many, [pid], ("location",)) == {pid: {"location": None}}
+
+    doc = {"_id": ObjectId(), "patient_id": pid, "lat": 3.0, "lng": 4.0, "timestamp": datetime(2026, 1, 2)}
+    call(locations_col.insert_one, doc)
+    call(patient_state.record, "location", doc)
+    latest = call(patient_state.latest_many, [pid], ("location",))[pid]["location"]
+    assert (latest["id"], latest["lat"]) == (doc["_id"], 3.0)
+
+
+def test_history_found_on_first_read_is_stored(client):
+    call = client.portal.call
+    with_history, without = ObjectId(), ObjectId()
+    call(locations_col.insert_many, [
+        {"patient_id": with_history, "lat": float(i), "lng": 0.0, "timestamp": datetime(2026, 1, 1, i)} for i in range(3)
+    ])
+    states = call(patient_state.latest_many, [with_history, without], ("location",))
+    assert states[with_history]["location"]["lat"] == 2.0
+    assert states[without]["location"] is None
+    stored = call(patient_state_collection.find_one, {"_id": with_history})
+    assert stored["location"]["lat"] == 2.0
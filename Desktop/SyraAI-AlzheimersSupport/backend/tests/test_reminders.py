@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+from bson import ObjectId
+
+from app.db import reminder_acks_collection, reminders_col
+from app.reminders.due import due_reminders
+from app.reminders.recurrence import is_occurrence, next_occurrence, occurrences, previous_occurrence
+
+UTC = timezone.utc
+START = datetime(2026, 3, 2, 8, 0, tzinfo=UTC)  # a Monday
+
+
+def _take(rule, since=None, n=10):
+    return list(islice(occurrences(rule, START, since), n))
+
+
+def test_daily_every_other_day_with_exdates_and_count():
+    rule = {"freq": "daily", "interval": 2, "count": 4, "exdates": [START + timedelta(days=2)]}
+    # the skipped occurrence still counts towards count
+    assert _take(rule) == [START, START + timedelta(days=4), START + timedelta(days=6)]
+
+
+def test_weekly_by_weekday_until():
+    rule = {"freq": "weekly", "byweekday": [0, 3], "until": START + timedelta(days=10)}
+    assert _take(rule) == [START, START + timedelta(days=3), START + timedelta(days=7), START + timedelta(days=10)]
+
+
+def test_jumping_to_since_matches_walking_from_start():
+    for rule in (
+        {"freq": "daily"},
+        {"freq": "daily", "interval": 3, "count": 40},
+        {"freq": "weekly", "byweekday": [1, 4, 6], "interval": 2},
+        {"freq": "weekly", "count": 9},
+    ):
+        walked = _take(rule, n=60)
+        for since in (START + timedelta(days=11, hours=3), START + timedelta(days=30)):
+            assert _take(rule, since, n=5) == [o for o in walked if o >= since][:5]
+
+
+def test_next_previous_and_membership():
+    rule = {"freq": "daily"}
+    at = START + timedelta(days=5, hours=1)
+    assert next_occurrence(rule, START, at) == START + timedelta(days=6)
+    assert previous_occurrence(rule, START, at) == START + timedelta(days=5)
+    assert is_occurrence(rule, START, START + timedelta(days=5))
+    assert not is_occurrence(rule, START, at)
+    assert next_occurrence({"freq": "daily", "count": 2}, START, START + timedelta(days=1)) is None
+
+
+def test_due_reminders_expands_unacknowledged_occurrences(client):
+    call = client.portal.call
+    patient, other = ObjectId(), ObjectId()
+    now = START + timedelta(days=3, hours=1)
+    daily = {"_id": ObjectId(), "patient_id": patient, "title": "Pills", "when": START, "repeat": {"freq": "daily"}, "acknowledged": False}
+    one_off = {"_id": ObjectId(), "patient_id": patient, "title": "Call", "when": START + timedelta(days=2, hours=12), "acknowledged": False}
+    future = {"_id": ObjectId(), "patient_id": patient, "title": "Later", "when": now + timedelta(hours=1), "acknowledged": False}
+    done = {"_id": ObjectId(), "patient_id": other, "title": "Done", "when": START, "acknowledged": True}
+    call(reminders_col.insert_many, [daily, one_off, future, done])
+    call(reminder_acks_collection.insert_one, {"reminder_id": daily["_id"], "occurrence": START + timedelta(days=2)})
+
+    due = call(due_reminders, [patient, other], START + timedelta(days=1), now)
+    assert list(due) == [patient]
+    assert [(d["title"], occurrence) for d, occurrence in due[patient]] == [
+        ("Pills", START + timedelta(days=1)),
+        ("Call", None),
+        ("Pills", START + timedelta(days=3)),
+    ]
+
+
+def test_batch_create_reports_each_item(client, make_user, make_patient):
+    caretaker_id, caretaker = make_user("carer@example.com")
+    other_id, other = make_user("other@example.com")
+    own = make_patient(caretaker_id, caretaker)
+    foreign = make_patient(other_id, other)
+    when = (datetime.now(UTC) + timedelta(days=1)).isoformat()
+    body = [
+        {"patient_id": own, "title": "Pills", "when": when, "repeat": {"freq": "daily"}},
+        {"patient_id": foreign, "title": "Not mine", "when": when},
+        {"patient_id": "not-an-id", "title": "Bad", "when": when},
+        {"patient_id": own, "title": "Empty rule", "when": when, "repeat": {"freq": "daily", "until": START.isoformat()}},
+        {"patient_id": own, "title": "Call", "when": when},
+    ]
+    r = client.post("/api/reminders/batch", json=body, headers=caretaker)
+    assert r.status_code == 200, r.text
+    result = r.json()
+    assert (result["received"], result["created"]) == (5, 2)
+    assert [item["index"] for item in result["results"]] == list(range(5))
+    assert [item["error"] for item in result["results"]] == [
+        None, "Patient not found", "Patient not found", "The repeat rule has no occurrences", None
+    ]
+    created = [item["id"] for item in result["results"] if item["id"]]
+    titles = client.portal.call(lambda: reminders_col.distinct("title", {"_id": {"$in": [ObjectId(i) for i in created]}}))
+    assert sorted(titles) == ["Call", "Pills"]
+
+
+def test_batch_ack_reports_each_item(client, make_user, make_patient):
+    caretaker_id, caretaker = make_user("carer@example.com")
+    pid = make_patient(caretaker_id, caretaker)
+    now = datetime.now(UTC)
+    body = [
+        {"patient_id": pid, "title": "Due", "when": (now - timedelta(hours=1)).isoformat()},
+        {"patient_id": pid, "title": "Daily", "when": (now - timedelta(days=2, minutes=5)).isoformat(), "repeat": {"freq": "daily"}},
+        {"patient_id": pid, "title": "Not yet", "when": (now + timedelta(days=1)).isoformat(), "repeat": {"freq": "daily"}},
+    ]
+    one_off, daily, not_yet = [i["id"] for i in client.post("/api/reminders/batch", json=body, headers=caretaker).json()["results"]]
+    missing = str(ObjectId())
+
+    r = client.post("/api/reminders/ack", json={"ids": [one_off, daily, not_yet, missing, "junk"]}, headers=caretaker)
+    assert r.status_code == 200, r.text
+    result = r.json()
+    assert result["acknowledged"] == 2
+    assert [(i["id"], i["ok"], i["error"]) for i in result["results"]] == [
+        (one_off, True, None),
+        (daily, True, None),
+        (not_yet, False, "No occurrence of this reminder is due"),
+        (missing, False, "Reminder not found"),
+        ("junk", False, "Reminder not found"),
+    ]
+    acked = datetime.fromisoformat(result["results"][1]["occurrence"]).replace(tzinfo=UTC)
+    assert now - timedelta(days=1) < acked <= now
+
+    assert client.get(f"/api/reminders/due/{pid}", headers=caretaker).json() == []
+    # acknowledging again is harmless
+    again = client.post("/api/reminders/ack", json={"ids": [daily]}, headers=caretaker).json()
+    assert again["results"][0]["ok"] is True
@@ -0,0 +1,93 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import AutoReconnect
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from app.indexes import _retention  # noqa: E402
+from app.rollups import FLUSH_RETRIES, RollupBuffer, summarize  # noqa: E402
+
+
+class FlakyCollection:
+    """Rollups collection whose next `failures` bulk writes fail."""
+
+    def __init__(self, collection, failures: int):
+        self.collection = collection
+        self.failures = failures
+
+    async def bulk_write(self, ops, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise AutoReconnect("connection lost")
+        return await self.collection.bulk_write(ops, **kwargs)
+
+
+def _reading(patient_id, minute: int, heart_rate: int) -> dict:
+    return {
+        "patient_id": patient_id,
+        "timestamp": datetime(2026, 3, 2, 10, minute, 30),
+        "heart_rate": heart_rate,
+        "body_temp": 36.5,
+        "spo2": 97,
+    }
+
+
+async def _summary(collection, patient_id, resolution: str) -> list:
+    cursor = collection.find({"patient_id": patient_id, "resolution": resolution}).sort("start", 1)
+    return [summarize(d) async for d in cursor]
+
+
+def test_flushes_merge_into_existing_buckets():
+    async def run():
+        collection = mongomock_motor.AsyncMongoMockClient()["rollup_test"]["vitals_rollups"]
+        buffer = RollupBuffer(collection)
+        patient_id = ObjectId()
+        await buffer.add([_reading(patient_id, 0, 60), _reading(patient_id, 0, 80)])
+        await buffer.add([_reading(patient_id, 0, 100), _reading(patient_id, 1, 50)])
+        return await _summary(collection, patient_id, "minute"), await _summary(collection, patient_id, "hour")
+
+    minutes, hours = asyncio.run(run())
+    assert [m["count"] for m in minutes] == [3, 1]
+    assert minutes[0]["heart_rate"]["min"] == 60 and minutes[0]["heart_rate"]["max"] == 100
+    assert minutes[0]["heart_rate"]["mean"] == pytest.approx(80)
+    assert len(hours) == 1 and hours[0]["count"] == 4
+    assert hours[0]["heart_rate"]["min"] == 50 and hours[0]["heart_rate"]["max"] == 100
+
+
+def test_failed_flush_is_retried_with_later_readings():
+    async def run():
+        collection = mongomock_motor.AsyncMongoMockClient()["rollup_test"]["vitals_rollups"]
+        buffer = RollupBuffer(FlakyCollection(collection, failures=1))
+        patient_id = ObjectId()
+        await buffer.add([_reading(patient_id, 0, 60)])
+        assert await collection.count_documents({}) == 0
+        await buffer.add([_reading(patient_id, 0, 90)])
+        return await _summary(collection, patient_id, "minute"), buffer.stats()
+
+    minutes, stats = asyncio.run(run())
+    assert minutes[0]["count"] == 2
+    assert (minutes[0]["heart_rate"]["min"], minutes[0]["heart_rate"]["max"]) == (60, 90)
+    assert stats["pending"] == 0 and stats["dropped"] == 0
+
+
+def test_buckets_are_dropped_after_too_many_failed_flushes():
+    async def run():
+        collection = mongomock_motor.AsyncMongoMockClient()["rollup_test"]["vitals_rollups"]
+        buffer = RollupBuffer(FlakyCollection(collection, failures=FLUSH_RETRIES + 1))
+        await buffer.add([_reading(ObjectId(), 0, 60)])
+        for _ in range(FLUSH_RETRIES):
+            await buffer.flush()
+        return buffer.stats()
+
+    stats = asyncio.run(run())
+    assert stats["pending"] == 0
+    assert stats["dropped"] == 3  # minute, hour and day bucket
+
+
+def test_zero_retention_keeps_forever():
+    assert _retention("start", 0, "minute_retention") == []
+    (index,) = _retention("start", 30, "minute_retention")
+    assert index.document["expireAfterSeconds"] == 30 * 86400
@@ -0,0 +1,54 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+from app.timeseries import PROGRESS_COLLECTION, _copy_batch  # noqa: E402
+
+
+def test_rerun_after_interrupted_batch_copies_nothing_twice():
+    async def run():
+        database = mongomock_motor.AsyncMongoMockClient()["ts_test"]
+        target, progress = database["vitals"], database[PROGRESS_COLLECTION]
+        start = datetime(2026, 1, 1)
+        batch = [{"_id": ObjectId(), "patient_id": ObjectId(), "timestamp": start + timedelta(seconds=i)} for i in range(6)]
+        # an earlier run inserted part of the batch, then stopped before recording progress
+        await target.insert_many([dict(d) for d in batch[:4]])
+
+        copied = await _copy_batch(target, progress, [dict(d) for d in batch], skip_copied=True)
+        return copied, await target.count_documents({}), await progress.find_one({"_id": "vitals"})
+
+    copied, total, state = asyncio.run(run())
+    assert (copied, total) == (2, 6)
+    assert state["skipped"] == 0
+
+
+def test_drop_legacy_refused_while_documents_were_skipped(monkeypatch):
+    from app import timeseries
+
+    kinds = {}
+
+    async def collection_type(database, name):
+        return kinds.get(name, "collection") if name in await database.list_collection_names() else None
+
+    async def create_timeseries(database, name, retention_days):
+        await database.create_collection(name)
+        # stands in for time-series validation: one sample per timestamp
+        await database[name].create_index("timestamp", unique=True)
+        kinds[name] = "timeseries"
+
+    monkeypatch.setattr(timeseries, "collection_type", collection_type)
+    monkeypatch.setattr(timeseries, "create_timeseries", create_timeseries)
+
+    async def run():
+        database = mongomock_motor.AsyncMongoMockClient()["ts_test"]
+        at = datetime(2026, 1, 1)
+        await database["vitals"].insert_many([{"patient_id": ObjectId(), "timestamp": at + timedelta(seconds=i // 2)} for i in range(4)])
+        with pytest.raises(RuntimeError, match="2 document"):
+            await timeseries.migrate("vitals", database, batch_size=3, drop_legacy=True)
+        return await database.list_collection_names()
+
+    assert "vitals_legacy" in asyncio.run(run())
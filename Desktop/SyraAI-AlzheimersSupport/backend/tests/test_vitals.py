@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app.db import devices_collection, vitals_collection, vitals_rollups_collection
+from app.rollups import vitals_rollups
+from app.utils.downsample import lttb
+
+
+def _readings(patient_id: ObjectId, n: int, spike_at: int = -1) -> list:
+    start = datetime.utcnow() - timedelta(hours=1)
+    return [
+        {
+            "patient_id": patient_id,
+            "heart_rate": 150 if i == spike_at else 70 + i % 3,
+            "body_temp": 36.6,
+            "spo2": 98,
+            "timestamp": start + timedelta(seconds=i),
+        }
+        for i in range(n)
+    ]
+
+
+def test_lttb_keeps_exactly_threshold_points_with_ends_and_peaks():
+    x = list(range(1000))
+    y = [0.0] * 1000
+    y[437] = 50.0
+    kept = list(lttb(x, y, 20))
+    assert len(kept) == 20
+    assert kept[0] == 0 and kept[-1] == 999
+    assert kept == sorted(set(kept))
+    assert 437 in kept
+    assert list(lttb(x[:10], y[:10], 20)) == list(range(10))
+
+
+def test_history_points_mode(client):
+    patient, other = ObjectId(), ObjectId()
+    client.portal.call(vitals_collection.insert_many, _readings(patient, 600, spike_at=301))
+    client.portal.call(vitals_collection.insert_many, _readings(other, 600))
+
+    r = client.get(f"/api/vitals/history/{patient}", params={"points": 40})
+    assert r.status_code == 200
+    body = r.json()
+    assert len(body) == 40
+    assert {v["patient_id"] for v in body} == {str(patient)}
+    stamps = [v["timestamp"] for v in body]
+    assert stamps == sorted(stamps)
+    assert max(v["heart_rate"] for v in body) == 150
+
+    assert len(client.get(f"/api/vitals/history/{patient}", params={"points": 5000}).json()) == 600
+    assert client.get(f"/api/vitals/history/{patient}", params={"points": 40, "resolution": "5m"}).status_code == 400
+
+
+def test_batch_counts_only_stored_readings(client):
+    patient = ObjectId()
+    client.portal.call(devices_collection.insert_one, {"patient_id": patient, "device_token": "pendant"})
+    # make the repeated timestamp below fail to insert
+    client.portal.call(lambda: vitals_collection.create_index([("patient_id", 1), ("timestamp", 1)], unique=True))
+    readings = [
+        {"patient_id": str(patient), "heart_rate": hr, "body_temp": 36.6, "spo2": 97, "timestamp": f"2026-01-01T00:00:{s:02d}"}
+        for s, hr in ((0, 70), (1, 72), (1, 74), (2, 76))
+    ]
+    r = client.post("/api/vitals/batch", json=readings, headers={"device-token": "pendant"})
+    assert r.status_code == 200, r.text
+    assert r.json() == {"received": 4, "inserted": 3, "alerts": 0}
+
+    client.portal.call(vitals_rollups.flush)
+    day = client.portal.call(vitals_rollups_collection.find_one, {"patient_id": patient, "resolution": "day"})
+    assert day["count"] == 3
+    assert day["heart_rate"]["max"] == 76